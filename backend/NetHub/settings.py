@@ -13,6 +13,26 @@ SECRET_KEY = "django-insecure-^47eiw7%jclrx!9cq)d#g(b1m==ynjzr+b7jsrya26-1ar1*jp
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "scanner": {"format": "%(asctime)s - %(levelname)s - %(name)s - %(message)s"},
+    },
+    "handlers": {
+        "scanner_file": {
+            "class": "logging.FileHandler",
+            "filename": BASE_DIR / "logs/device_scanner.log",
+            "formatter": "scanner",
+            "delay": True,
+        },
+    },
+    "loggers": {
+        "util.netscanner": {"handlers": ["scanner_file"], "level": "INFO"},
+        "util.scanner_daemon": {"handlers": ["scanner_file"], "level": "INFO"},
+    },
+}
+
 ALLOWED_HOSTS = ["*"]  # "localhost", "127.0.0.1", "192.168.12.1", "0.0.0.0"]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -21,6 +41,42 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 CAPTIVE_NETWORK = "192.168.12.0/24"
 
+CAPTIVE_INTERFACE = "ap0"
+
+# Device discovery (see util/discovery)
+DISCOVERY_SOURCES = ["neighbors", "stations", "leases", "hostapd"]
+
+DNSMASQ_LEASES_FILE = "/etc/ap_manager/proc/dnsmasq.leases"
+
+HOSTAPD_CTRL_DIR = "/etc/ap_manager/proc/hostapd_ctrl"
+
+# Look up vendors missing from the local OUI index online, in the background
+VENDOR_ENRICHMENT = True
+
+# Scanner daemon (`manage.py runscanner`): adaptive cadence bounds in seconds
+SCANNER_MIN_INTERVAL = 2
+
+SCANNER_MAX_INTERVAL = 60
+
+SCANNER_METRICS_PORT = 9109
+
+# Seconds between TCP port sweeps of known devices in the scanner daemon (0 disables)
+PORT_SCAN_INTERVAL = 3600
+
+# Captive firewall (see util/firewall): "nftables", "ipset" or "auto"
+FIREWALL_BACKEND = "auto"
+
+# Socket of the privileged firewall worker (`manage.py runfirewall`)
+FIREWALL_SOCKET = BASE_DIR / "run/firewall.sock"
+
+# Seconds between kernel set/database drift checks in the worker (0 disables)
+FIREWALL_RECONCILE_INTERVAL = 30
+
+FIREWALL_METRICS_PORT = 9110
+
+# Cap each paid client's download at its plan's bandwidth (tc on CAPTIVE_INTERFACE)
+SHAPING_ENABLED = True
+
 FRONTEND_BASE_URL = "http://localhost:40099"
 
 INSTALLED_APPS = [
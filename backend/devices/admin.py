@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Device, DeviceHistory
+from .models import Device, DeviceFingerprint, DeviceHistory, DeviceSample
 
 
 @admin.register(Device)
@@ -24,3 +24,19 @@ class DeviceHistoryAdmin(admin.ModelAdmin):
     search_fields = ['device__mac_address', 'device__hostname', 'ip_address']
     readonly_fields = ['timestamp']
     date_hierarchy = 'timestamp'
+
+
+@admin.register(DeviceSample)
+class DeviceSampleAdmin(admin.ModelAdmin):
+    list_display = ['device', 'timestamp', 'rx_bytes', 'tx_bytes', 'signal', 'tx_bitrate', 'inactive_ms']
+    search_fields = ['device__mac_address']
+    readonly_fields = ['timestamp']
+    date_hierarchy = 'timestamp'
+
+
+@admin.register(DeviceFingerprint)
+class DeviceFingerprintAdmin(admin.ModelAdmin):
+    list_display = ['device', 'operating_system', 'os_confidence', 'open_ports', 'scanned_at']
+    list_filter = ['operating_system']
+    search_fields = ['device__mac_address', 'device__hostname']
+    readonly_fields = ['scanned_at', 'evidence_hash']
@@ -70,3 +70,46 @@ class DeviceHistory(models.Model):
 
     def __str__(self):
         return f"{self.device.mac_address} - {self.event_type}"
+
+
+class DeviceSample(models.Model):
+    """Per-interval wireless counters for one station (deltas since the previous sample)"""
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='samples')
+    timestamp = models.DateTimeField(auto_now_add=True)
+    rx_bytes = models.BigIntegerField(default=0)
+    tx_bytes = models.BigIntegerField(default=0)
+    rx_packets = models.IntegerField(default=0)
+    tx_packets = models.IntegerField(default=0)
+    signal = models.SmallIntegerField(null=True, blank=True)  # dBm
+    tx_bitrate = models.IntegerField(null=True, blank=True)  # kbit/s
+    rx_bitrate = models.IntegerField(null=True, blank=True)  # kbit/s
+    inactive_ms = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'device_samples'
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['device', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} @ {self.timestamp}"
+
+
+class DeviceFingerprint(models.Model):
+    """Latest port sweep of a device and the OS guessed from it (see util.osfingerprint)"""
+    device = models.OneToOneField(Device, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    open_ports = models.JSONField(default=list)
+    probed_ports = models.JSONField(default=list)
+    services = models.JSONField(default=dict)  # port -> banner or service name
+    scanned_at = models.DateTimeField(null=True, blank=True)
+    observed_ttl = models.PositiveSmallIntegerField(null=True, blank=True)
+    operating_system = models.CharField(max_length=50, default='Unknown')
+    os_confidence = models.FloatField(default=0.0)
+    evidence_hash = models.CharField(max_length=16, blank=True, default='')
+
+    class Meta:
+        db_table = 'device_fingerprints'
+
+    def __str__(self):
+        return f"{self.device_id}: {self.open_ports}"
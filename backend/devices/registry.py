@@ -0,0 +1,133 @@
+"""
+In-memory set of authenticated device MACs.
+
+Loaded once from the Device table and kept current by the receivers in
+devices/signals.py. Every change bumps a shared version counter on disk,
+so other processes (scanner daemon, other web workers) notice that their
+copy is stale and reload it. Changes are only published once the
+transaction that made them commits: a process reloading on a new version
+must find the new rows, or it would keep a stale set as current.
+"""
+import fcntl
+import os
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+
+VERSION_FILE = settings.BASE_DIR / "run/auth_macs.version"
+
+# How often membership checks look at the shared version counter
+CHECK_INTERVAL = 1.0
+
+
+class AuthenticatedMacRegistry:
+    """Versioned set of authenticated MACs with O(1) membership"""
+
+    def __init__(self, version_file=VERSION_FILE, check_interval: float = CHECK_INTERVAL):
+        self.version_file = version_file
+        self.check_interval = check_interval
+        self._macs = frozenset()
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        self.refresh_if_stale()
+        return self._version
+
+    def shared_version(self) -> int:
+        """Version counter as last published by any process"""
+        try:
+            with open(self.version_file, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _bump(self) -> tuple:
+        """Atomically increment the shared counter, returning (old, new)"""
+        os.makedirs(os.path.dirname(self.version_file), exist_ok=True)
+        with open(self.version_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    old = int(f.read().strip() or 0)
+                except ValueError:
+                    old = 0
+                f.seek(0)
+                f.truncate()
+                f.write(str(old + 1))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return old, old + 1
+
+    def load(self):
+        """(Re)load the set from the database"""
+        from devices.models import Device
+
+        version = self.shared_version()
+        macs = Device.objects.filter(is_authenticated=True).values_list('mac_address', flat=True)
+        with self._lock:
+            self._macs = frozenset(mac.lower() for mac in macs)
+            self._version = version
+            self._next_check = time.monotonic() + self.check_interval
+
+    def refresh_if_stale(self):
+        """Reload when another process published a newer version"""
+        if self._version is not None and time.monotonic() < self._next_check:
+            return
+        if self._version is None or self.shared_version() != self._version:
+            self.load()
+        else:
+            self._next_check = time.monotonic() + self.check_interval
+
+    def is_stale(self) -> bool:
+        return self._version is None or self.shared_version() != self._version
+
+    def _apply(self, mac: str, present: bool):
+        mac = mac.lower()
+        self.refresh_if_stale()
+        if (mac in self._macs) == present:
+            return
+        old, new = self._bump()
+        if old != self._version:
+            # Someone else changed the set since we loaded it
+            self.load()
+            return
+        with self._lock:
+            self._macs = self._macs | {mac} if present else self._macs - {mac}
+            self._version = new
+
+    def _invalidate(self):
+        self._bump()
+        self.load()
+
+    def invalidate(self):
+        """Publish a new version after a bulk update that bypassed the signals"""
+        transaction.on_commit(self._invalidate)
+
+    def add(self, mac: str):
+        transaction.on_commit(lambda: self._apply(mac, True))
+
+    def discard(self, mac: str):
+        transaction.on_commit(lambda: self._apply(mac, False))
+
+    def __contains__(self, mac) -> bool:
+        if not mac:
+            return False
+        self.refresh_if_stale()
+        return mac.lower() in self._macs
+
+    def __iter__(self):
+        self.refresh_if_stale()
+        return iter(self._macs)
+
+    def __len__(self) -> int:
+        self.refresh_if_stale()
+        return len(self._macs)
+
+
+authenticated_macs = AuthenticatedMacRegistry()
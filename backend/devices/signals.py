@@ -5,23 +5,24 @@ import logging
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from .models import Device
+from .registry import authenticated_macs
 
 logger = logging.getLogger(__name__)
 
 
-@receiver(post_save, sender=Device())
+@receiver(post_save, sender=Device)
 def register_device_profile(sender, instance, created, **kwargs):
-    """Automatically create user profile when a new user is created"""
-    if created:
-        '''
-        #
-        '''
+    """Keep the authenticated MAC set in line with the saved device"""
+    if instance.is_authenticated:
+        authenticated_macs.add(instance.mac_address)
+    elif not created:
+        authenticated_macs.discard(instance.mac_address)
 
 
-@receiver(pre_delete, sender=Device())
+@receiver(pre_delete, sender=Device)
 def delete_devices_profile(sender, instance, **kwargs):
-    """Automatically create user profile when a new user is created"""
-    mac = instance.mac_address
+    """Drop a deleted device from the authenticated MAC set once the delete commits"""
+    authenticated_macs.discard(instance.mac_address)
     '''
     Block the device...
     '''
@@ -11,12 +11,16 @@ import time
 from threading import Thread
 import subprocess
 from pathlib import Path
+from typing import List, Optional
 from ap_utils.config import config_manager, ConfigManager
 from lock import lock
 from netmanager import NetworkManager
 from cleanup import CleanupManager
 import tempfile
 from ap_utils.copy import cp_n_safe
+from ap_utils.leases import LeaseIndex
+from ap_utils.ruleset import Ruleset, RulesetError, apply as apply_ruleset
+from ap_utils.stations import station_dump
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -195,6 +199,7 @@ class ApManager:
                 self.config_dnsmasq()
                 self.init_wifi_iface()
                 self.enable_internet_sharing()
+                self.apply_ruleset()
                 self.start_dhcp_dns()
                 self.start_ap()
                 self.start_hostapd()
@@ -213,6 +218,55 @@ class ApManager:
             self.haveged_watchdog()
             # HAVEGED_WATCHDOG_PID =
 
+    def ap_ruleset(self) -> Ruleset:
+        """
+        NAT, DNS and DHCP rules for this instance's configuration.
+
+        Every rule lives in per-instance NETHUB-* chains (suffixed with the
+        WiFi interface) reached by one jump per hook, so instances coexist
+        and teardown is just unhooking and deleting the chains.
+        """
+        ruleset = Ruleset()
+        suffix = self.config['wifi_iface']
+        gateway_network = f"{'.'.join(self.config['gateway'].split('.')[:3])}.0/24"
+        nat = ruleset.chain('nat', f"NETHUB-NAT-{suffix}", 'POSTROUTING')
+        forward = ruleset.chain('filter', f"NETHUB-FWD-{suffix}", 'FORWARD')
+        dns = ruleset.chain('nat', f"NETHUB-DNS-{suffix}", 'PREROUTING')
+        inbound = ruleset.chain('filter', f"NETHUB-IN-{suffix}", 'INPUT')
+
+        if self.config['share_method'] == "nat":
+            # Masquerade traffic from the WiFi network
+            ruleset.add('nat', nat, '-s', gateway_network,
+                        '!', '-o', self.config['wifi_iface'], '-j', 'MASQUERADE')
+            # Allow forwarding from WiFi to internet and back
+            ruleset.add('filter', forward, '-i', self.config['wifi_iface'],
+                        '-s', gateway_network, '-j', 'ACCEPT')
+            ruleset.add('filter', forward, '-i', self.config['internet_iface'],
+                        '-d', gateway_network, '-j', 'ACCEPT')
+
+        if self.config['share_method'] != 'bridge':
+            if not self.config.get('no_dns', False):
+                dns_port = self.config.get('dns_port', 5353)
+                # Allow DNS traffic and redirect it to our port
+                for proto in ('tcp', 'udp'):
+                    ruleset.add('filter', inbound, '-p', proto, '-m', proto,
+                                '--dport', dns_port, '-j', 'ACCEPT')
+                    ruleset.add('nat', dns, '-s', gateway_network, '-d', self.config['gateway'],
+                                '-p', proto, '-m', proto, '--dport', '53',
+                                '-j', 'REDIRECT', '--to-ports', dns_port)
+            if not self.config.get('no_dnsmasq', False):
+                # Allow DHCP traffic
+                ruleset.add('filter', inbound, '-p', 'udp', '-m', 'udp', '--dport', '67', '-j', 'ACCEPT')
+
+        return ruleset
+
+    def apply_ruleset(self):
+        """Install every iptables rule of this instance in one transaction"""
+        try:
+            apply_ruleset(self.ap_ruleset())
+        except RulesetError as e:
+            self.clean.die(f"Failed to set up iptables rules: {str(e)}")
+
     def enable_internet_sharing(self):
         """Enable Internet sharing using the specified method."""
         if self.config['share_method'] != 'none':
@@ -220,33 +274,6 @@ class ApManager:
 
             if self.config['share_method'] == "nat":
                 try:
-                    # Set up NAT rules
-                    gateway_network = f"{'.'.join(self.config['gateway'].split('.')[:3])}.0/24"
-
-                    # Masquerade traffic from the WiFi network
-                    subprocess.run([
-                        'iptables', '-w', '-t', 'nat', '-I', 'POSTROUTING',
-                        '-s', gateway_network,
-                        '!', '-o', self.config['wifi_iface'],
-                        '-j', 'MASQUERADE'
-                    ], check=True)
-
-                    # Allow forwarding from WiFi to internet
-                    subprocess.run([
-                        'iptables', '-w', '-I', 'FORWARD',
-                        '-i', self.config['wifi_iface'],
-                        '-s', gateway_network,
-                        '-j', 'ACCEPT'
-                    ], check=True)
-
-                    # Allow forwarding from internet to WiFi
-                    subprocess.run([
-                        'iptables', '-w', '-I', 'FORWARD',
-                        '-i', self.config['internet_iface'],
-                        '-d', gateway_network,
-                        '-j', 'ACCEPT'
-                    ], check=True)
-
                     # Enable IP forwarding for the internet interface
                     with open(f"/proc/sys/net/ipv4/conf/{self.config['internet_iface']}/forwarding", 'w') as f:
                         f.write('1')
@@ -259,7 +286,7 @@ class ApManager:
                     subprocess.run(['modprobe', 'nf_nat_pptp'], capture_output=True)
 
                 except (subprocess.CalledProcessError, IOError) as e:
-                    self.clean.die(f"Failed to set up NAT rules: {str(e)}")
+                    self.clean.die(f"Failed to enable forwarding: {str(e)}")
 
             elif self.config['share_method'] == "bridge":
                 try:
@@ -452,63 +479,9 @@ class ApManager:
     def start_dhcp_dns(self):
         """Start DHCP and DNS services with proper error handling."""
         if self.config['share_method'] != 'bridge':
-            # Configure DNS if not disabled
-            if not self.config.get('no_dns', False):
-                dns_port = self.config.get('dns_port', 5353)
-
-                # Set up iptables rules for DNS
-                try:
-                    # Allow TCP DNS traffic
-                    subprocess.run([
-                        'iptables', '-w', '-I', 'INPUT',
-                        '-p', 'tcp', '-m', 'tcp',
-                        '--dport', str(dns_port),
-                        '-j', 'ACCEPT'
-                    ], check=True)
-
-                    # Allow UDP DNS traffic
-                    subprocess.run([
-                        'iptables', '-w', '-I', 'INPUT',
-                        '-p', 'udp', '-m', 'udp',
-                        '--dport', str(dns_port),
-                        '-j', 'ACCEPT'
-                    ], check=True)
-
-                    # Redirect TCP DNS traffic to our port
-                    gateway_network = f"{'.'.join(self.config['gateway'].split('.')[:3])}.0/24"
-                    subprocess.run([
-                        'iptables', '-w', '-t', 'nat', '-I', 'PREROUTING',
-                        '-s', gateway_network,
-                        '-d', self.config['gateway'],
-                        '-p', 'tcp', '-m', 'tcp',
-                        '--dport', '53',
-                        '-j', 'REDIRECT', '--to-ports', str(dns_port)
-                    ], check=True)
-
-                    # Redirect UDP DNS traffic to our port
-                    subprocess.run([
-                        'iptables', '-w', '-t', 'nat', '-I', 'PREROUTING',
-                        '-s', gateway_network,
-                        '-d', self.config['gateway'],
-                        '-p', 'udp', '-m', 'udp',
-                        '--dport', '53',
-                        '-j', 'REDIRECT', '--to-ports', str(dns_port)
-                    ], check=True)
-
-                except subprocess.CalledProcessError as e:
-                    self.clean.die(f"Failed to set up iptables rules for DNS: {str(e)}")
-
             # Start dnsmasq if not disabled
             if not self.config.get('no_dnsmasq', False):
                 try:
-                    # Allow DHCP traffic
-                    subprocess.run([
-                        'iptables', '-w', '-I', 'INPUT',
-                        '-p', 'udp', '-m', 'udp',
-                        '--dport', '67',
-                        '-j', 'ACCEPT'
-                    ], check=True)
-
                     # Handle AppArmor restrictions
                     complain_cmd = None
                     try:
@@ -1371,7 +1344,7 @@ class ApManager:
                             show_warn = False
                     elif not self.is_haveged_running():
                         print("Low entropy detected, starting haveged")
-                       self.mutex_lock()
+                        self.mutex_lock()
                         try:
                             # Start haveged with a specific PID file
                             subprocess.Popen(['haveged', '-w', '1024', '-p',
@@ -1440,21 +1413,14 @@ class ApManager:
         finally:
             self.mutex_unlock()
 
-    def print_client(self, mac: str) -> None:
+    def print_client(self, mac: str, leases: Optional[LeaseIndex] = None) -> None:
         """Print client information in a formatted way."""
-        ipaddr = "*"
-        hostname = "*"
-
-        # Check dnsmasq leases file
-        dnsmasq_leases = os.path.join(self.conf_dir, 'dnsmasq.leases')
-        if os.path.exists(dnsmasq_leases):
-            with open(dnsmasq_leases, 'r') as f:
-                for line in f:
-                    if mac in line:
-                        parts = line.strip().split()
-                        if len(parts) >= 4:
-                            ipaddr = parts[2]
-                            hostname = parts[3]
+        # Look the client up in the dnsmasq lease index
+        if leases is None:
+            leases = LeaseIndex(os.path.join(self.conf_dir, 'dnsmasq.leases'))
+        lease = leases.by_mac(mac)
+        ipaddr = lease.ip if lease else "*"
+        hostname = lease.hostname if lease and lease.hostname else "*"
 
         print(f"{mac:<20} {ipaddr:<18} {hostname}")
 
@@ -1492,28 +1458,19 @@ class ApManager:
         # List clients using iw if available
         if not self.config.get('use_iwconfig', False):
             try:
-                result = subprocess.run(
-                    ['iw', 'dev', wifi_iface, 'station', 'dump'],
-                    capture_output=True, text=True, check=True
-                )
-
-                # Extract MAC addresses
-                macs = []
-                for line in result.stdout.splitlines():
-                    if 'Station' in line:
-                        mac = line.split()[1]
-                        macs.append(mac)
+                stations = station_dump(wifi_iface)
 
-                if not macs:
+                if not stations:
                     print("No clients connected")
                     return
 
                 # Print header
                 print(f"{'MAC':<20} {'IP':<18} {'Hostname'}")
 
-                # Print each client
-                for mac in macs:
-                    self.print_client(mac)
+                # Print each client, parsing the lease file only once
+                with LeaseIndex(os.path.join(self.conf_dir, 'dnsmasq.leases')) as leases:
+                    for station in stations:
+                        self.print_client(station.mac, leases)
 
                 return
             except (subprocess.CalledProcessError, FileNotFoundError):
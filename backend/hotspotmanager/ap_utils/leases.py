@@ -0,0 +1,186 @@
+"""
+In-memory index of the dnsmasq lease file, keyed by MAC and by IP.
+
+The file is parsed once and re-read only when inotify reports that dnsmasq
+wrote it (IN_MODIFY/IN_CLOSE_WRITE, or a rename/create over it). Lookups
+drain the inotify descriptor without blocking, so they cost one read()
+syscall plus a dictionary lookup. Where inotify is unavailable the index
+falls back to comparing the file's (inode, size, mtime).
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+EVENT_HDR = struct.Struct("iIII")
+
+_libc = None
+
+
+def _inotify():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    return _libc
+
+
+@dataclass(frozen=True)
+class Lease:
+    expiry: int
+    mac: str
+    ip: str
+    hostname: Optional[str]
+    client_id: Optional[str] = None
+
+
+def parse_lease_line(line: str) -> Optional[Lease]:
+    """`<expiry> <mac> <ip> <hostname> <client-id>`; '*' means unknown"""
+    parts = line.split()
+    if len(parts) < 4:
+        return None
+    expiry, mac, ip, hostname = parts[:4]
+    client_id = parts[4] if len(parts) > 4 and parts[4] != '*' else None
+    return Lease(
+        expiry=int(expiry) if expiry.isdigit() else 0,
+        mac=mac.lower(), ip=ip,
+        hostname=None if hostname == '*' else hostname,
+        client_id=client_id,
+    )
+
+
+class LeaseIndex:
+    """dnsmasq leases by MAC and IP, refreshed on file change"""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._by_mac: Dict[str, Lease] = {}
+        self._by_ip: Dict[str, Lease] = {}
+        self._fd = None
+        self._stamp = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _watch(self):
+        """Watch the lease file's directory so replacements are seen too"""
+        try:
+            libc = _inotify()
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), f'cannot watch {directory}')
+            self._fd = fd
+        except (OSError, AttributeError):
+            # No inotify (non-Linux, missing directory): use stat comparison
+            self._fd = None
+
+    def _changed(self) -> bool:
+        """Drain pending inotify events; True if any concerned the lease file"""
+        if self._fd is None:
+            return self._stat() != self._stamp
+
+        name = os.path.basename(self.path).encode()
+        changed = False
+        while True:
+            try:
+                buffer = os.read(self._fd, 4096)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset + EVENT_HDR.size <= len(buffer):
+                _, _, _, length = EVENT_HDR.unpack_from(buffer, offset)
+                start = offset + EVENT_HDR.size
+                if buffer[start:start + length].rstrip(b'\0') == name:
+                    changed = True
+                offset = start + length
+        return changed
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        """Parse the whole file and swap in fresh indexes"""
+        by_mac, by_ip = {}, {}
+        stamp = self._stat()
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    lease = parse_lease_line(line)
+                    if lease:
+                        by_mac[lease.mac] = lease
+                        by_ip[lease.ip] = lease
+        except OSError:
+            pass
+        self._by_mac, self._by_ip = by_mac, by_ip
+        self._stamp = stamp
+        self._loaded = True
+
+    def refresh(self):
+        """Re-read the file if dnsmasq changed it since the last look"""
+        with self._lock:
+            if not self._loaded:
+                self._watch()
+                self.load()
+            elif self._changed():
+                self.load()
+
+    def by_mac(self, mac: str) -> Optional[Lease]:
+        if not mac:
+            return None
+        self.refresh()
+        return self._by_mac.get(mac.lower())
+
+    def by_ip(self, ip_address: str) -> Optional[Lease]:
+        self.refresh()
+        return self._by_ip.get(ip_address)
+
+    def hostname(self, mac: Optional[str] = None, ip_address: Optional[str] = None) -> Optional[str]:
+        lease = self.by_mac(mac) if mac else self.by_ip(ip_address)
+        return lease.hostname if lease else None
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._loaded = False
+
+    def __iter__(self) -> Iterator[Lease]:
+        self.refresh()
+        return iter(list(self._by_mac.values()))
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._by_mac)
+
+    def __enter__(self):
+        self.refresh()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
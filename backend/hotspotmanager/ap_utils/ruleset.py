@@ -0,0 +1,193 @@
+"""
+iptables rules expressed as one iptables-restore document.
+
+A Ruleset collects rules per table and is applied with a single
+`iptables-restore --noflush` call, so the xtables lock is taken once and
+each table is committed in one transaction instead of one rewrite per
+rule. The affected tables are saved first; if the restore fails part way
+(e.g. the second table rejects a rule after the first was committed) the
+saved tables are restored, leaving the firewall as it was.
+
+Rules normally live in the ruleset's own chains, each reached by a single
+jump from a built-in hook. Installing re-declares (and so flushes) those
+chains, which makes it idempotent; teardown deletes the jumps and then
+flushes and deletes the chains, so nothing depends on rebuilding the
+exact rule text.
+"""
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+TABLE_ORDER = ('raw', 'mangle', 'nat', 'filter')
+
+# iptables chain names are limited to 28 characters
+MAX_CHAIN_NAME = 28
+
+
+class RulesetError(Exception):
+    pass
+
+
+class Ruleset:
+    """Ordered iptables rules grouped by table"""
+
+    def __init__(self):
+        self.rules: List[Tuple[str, str, List[str]]] = []
+        # (table, chain, hook) for chains owned by this ruleset
+        self.chains: List[Tuple[str, str, str]] = []
+
+    def chain(self, table: str, name: str, hook: str) -> str:
+        """Declare an owned chain reached by one jump from `hook`"""
+        if len(name) > MAX_CHAIN_NAME:
+            raise RulesetError(f"Chain name {name!r} is longer than {MAX_CHAIN_NAME} characters")
+        self.chains.append((table, name, hook))
+        return name
+
+    def owns(self, table: str, chain: str) -> bool:
+        return any(t == table and c == chain for t, c, _ in self.chains)
+
+    def add(self, table: str, chain: str, *spec: str) -> 'Ruleset':
+        """Add a rule; `spec` is everything after the chain name"""
+        self.rules.append((table, chain, [str(part) for part in spec]))
+        return self
+
+    def extend(self, other: 'Ruleset') -> 'Ruleset':
+        self.rules.extend(other.rules)
+        self.chains.extend(other.chains)
+        return self
+
+    @property
+    def tables(self) -> List[str]:
+        present = {table for table, _, _ in self.rules} | {table for table, _, _ in self.chains}
+        return [table for table in TABLE_ORDER if table in present] + \
+            sorted(present - set(TABLE_ORDER))
+
+    def render(self, action: str = '-I', saved: Optional[Dict[str, str]] = None) -> str:
+        """
+        iptables-restore document inserting (-I), appending (-A) or deleting
+        (-D) every rule outside owned chains. For -I/-A, owned chains are
+        (re)declared and filled, and their hook jumps added unless `saved`
+        shows them in place already.
+        """
+        rules = self.rules if action != '-D' else list(reversed(self.rules))
+        lines = []
+        for table in self.tables:
+            existing = (saved or {}).get(table, '').splitlines()
+            lines.append(f"*{table}")
+            if action != '-D':
+                for chain_table, chain, _ in self.chains:
+                    if chain_table == table:
+                        lines.append(f":{chain} - [0:0]")
+            for rule_table, chain, spec in rules:
+                if rule_table == table:
+                    verb = '-A' if self.owns(table, chain) and action != '-D' else action
+                    lines.append(' '.join([verb, chain] + [_quote(part) for part in spec]))
+            if action != '-D':
+                for chain_table, chain, hook in self.chains:
+                    if chain_table == table and f"-A {hook} -j {chain}" not in existing:
+                        lines.append(f"-I {hook} -j {chain}")
+            lines.append("COMMIT")
+        return '\n'.join(lines) + '\n'
+
+    def render_teardown(self, saved: Dict[str, str]) -> str:
+        """Delete hook jumps, then flush and delete owned chains that exist"""
+        lines = []
+        for table in self.tables:
+            existing = saved.get(table, '').splitlines()
+            owned = [(chain, hook) for t, chain, hook in self.chains if t == table]
+            present = [(chain, hook) for chain, hook in owned if any(line.startswith(f":{chain} ") for line in existing)]
+            if not present:
+                continue
+            lines.append(f"*{table}")
+            for chain, hook in present:
+                # A hook may hold several jumps if an earlier teardown was skipped
+                lines += [f"-D {hook} -j {chain}"] * existing.count(f"-A {hook} -j {chain}")
+            lines += [f"-F {chain}" for chain, _ in present]
+            lines += [f"-X {chain}" for chain, _ in present]
+            lines.append("COMMIT")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def __bool__(self):
+        return bool(self.rules or self.chains)
+
+    def __len__(self):
+        return len(self.rules)
+
+
+def _quote(part: str) -> str:
+    if not part or any(c in part for c in ' "\'\t'):
+        return '"' + part.replace('"', '\\"') + '"'
+    return part
+
+
+def _run(cmd: List[str], document: Optional[str] = None) -> subprocess.CompletedProcess:
+    try:
+        return subprocess.run(cmd, input=document, capture_output=True, text=True)
+    except FileNotFoundError as e:
+        raise RulesetError(f"{cmd[0]} not found") from e
+
+
+def save_tables(tables: List[str]) -> Dict[str, str]:
+    """Current contents of the given tables, as iptables-save output"""
+    saved = {}
+    for table in tables:
+        result = _run(['iptables-save', '-t', table])
+        if result.returncode != 0:
+            raise RulesetError(f"iptables-save -t {table} failed: {result.stderr.strip()}")
+        saved[table] = result.stdout
+    return saved
+
+
+def restore(document: str, noflush: bool = True, test: bool = False) -> subprocess.CompletedProcess:
+    cmd = ['iptables-restore', '-w']
+    if noflush:
+        cmd.append('--noflush')
+    if test:
+        cmd.append('--test')
+    return _run(cmd, document)
+
+
+def apply(ruleset: Ruleset, action: str = '-I'):
+    """Apply the ruleset in one transaction, rolling back on failure"""
+    if not ruleset:
+        return
+    saved = save_tables(ruleset.tables)
+    document = ruleset.render(action, saved)
+
+    result = restore(document, test=True)
+    if result.returncode != 0:
+        raise RulesetError(f"Ruleset rejected: {result.stderr.strip()}")
+
+    result = restore(document)
+    if result.returncode != 0:
+        # Put every touched table back exactly as it was
+        rollback = restore(''.join(saved.values()), noflush=False)
+        state = "rolled back" if rollback.returncode == 0 else f"rollback failed: {rollback.stderr.strip()}"
+        raise RulesetError(f"Applying ruleset failed ({state}): {result.stderr.strip()}")
+
+
+def remove(ruleset: Ruleset):
+    """
+    Tear the ruleset down in one transaction.
+
+    Owned chains are unhooked, flushed and deleted whatever rules they
+    hold. Rules outside owned chains are deleted by spec; such a batch
+    fails as a whole if any rule is already gone, so in that case they are
+    deleted one by one, ignoring the missing ones.
+    """
+    if not ruleset:
+        return
+    if ruleset.chains:
+        saved = save_tables(ruleset.tables)
+        document = ruleset.render_teardown(saved)
+        if document:
+            result = restore(document)
+            if result.returncode != 0:
+                raise RulesetError(f"Removing ruleset chains failed: {result.stderr.strip()}")
+
+    loose = Ruleset()
+    loose.rules = [rule for rule in ruleset.rules if not ruleset.owns(rule[0], rule[1])]
+    if not loose or restore(loose.render('-D')).returncode == 0:
+        return
+    for table, chain, spec in reversed(loose.rules):
+        subprocess.run(['iptables', '-w', '-t', table, '-D', chain] + spec,
+                       capture_output=True, check=False)
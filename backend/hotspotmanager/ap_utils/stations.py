@@ -0,0 +1,72 @@
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class StationStats:
+    """Per-station counters as reported by nl80211 (`iw station dump`)"""
+    mac: str
+    rx_bytes: int = 0
+    tx_bytes: int = 0
+    rx_packets: int = 0
+    tx_packets: int = 0
+    signal: Optional[int] = None  # dBm
+    tx_bitrate: Optional[int] = None  # kbit/s
+    rx_bitrate: Optional[int] = None  # kbit/s
+    inactive_ms: int = 0
+    connected_time: int = 0  # seconds
+
+
+# `iw` field label -> (attribute, converter)
+FIELDS = {
+    'rx bytes': ('rx_bytes', int),
+    'tx bytes': ('tx_bytes', int),
+    'rx packets': ('rx_packets', int),
+    'tx packets': ('tx_packets', int),
+    'signal': ('signal', int),
+    'inactive time': ('inactive_ms', int),
+    'connected time': ('connected_time', int),
+}
+
+
+def _bitrate_kbps(value: str) -> Optional[int]:
+    # "144.4 MBit/s MCS 15 short GI" -> 144400
+    try:
+        return int(float(value.split()[0]) * 1000)
+    except (ValueError, IndexError):
+        return None
+
+
+def parse_station_dump(output: str) -> List[StationStats]:
+    """Parse the full text of `iw dev <iface> station dump`"""
+    stations = []
+    current = None
+    for line in output.splitlines():
+        if line.startswith('Station'):
+            current = StationStats(mac=line.split()[1].lower())
+            stations.append(current)
+            continue
+        if current is None or ':' not in line:
+            continue
+
+        label, value = (part.strip() for part in line.split(':', 1))
+        if label in ('tx bitrate', 'rx bitrate'):
+            setattr(current, label.replace(' ', '_'), _bitrate_kbps(value))
+        elif label in FIELDS:
+            attr, convert = FIELDS[label]
+            try:
+                # "signal: -42 [-44, -45] dBm", "inactive time: 310 ms"
+                setattr(current, attr, convert(value.split()[0]))
+            except (ValueError, IndexError):
+                pass
+    return stations
+
+
+def station_dump(iface: str) -> List[StationStats]:
+    """One `iw station dump` for every station on the interface"""
+    result = subprocess.run(
+        ['iw', 'dev', iface, 'station', 'dump'],
+        capture_output=True, text=True, check=True
+    )
+    return parse_station_dump(result.stdout)
@@ -5,6 +5,7 @@ import subprocess
 import shutil
 from typing import List, Optional
 from signals import SignalHandler
+from ap_utils.ruleset import RulesetError, remove as remove_ruleset
 
 
 class CleanupManager(SignalHandler):
@@ -124,28 +125,15 @@ class CleanupManager(SignalHandler):
                 # Remove common configuration directory
                 shutil.rmtree(self.common_conf_dir, ignore_errors=True)
 
+            # Unhook and delete this instance's NETHUB-* chains in one transaction
+            try:
+                remove_ruleset(self.ap_man.ap_ruleset())
+            except RulesetError as e:
+                print(f"Failed to remove iptables rules: {str(e)}")
+
             # Cleanup based on sharing method
             if self.share_method != 'none':
-                if self.share_method == 'nat':
-                    # Remove NAT rules
-                    subprocess.run([
-                        'iptables', '-w', '-t', 'nat', '-D', 'POSTROUTING',
-                        '-s', f"{self.gateway.split('.')[0]}.{self.gateway.split('.')[1]}.{self.gateway.split('.')[2]}.0/24",
-                        '!', '-o', self.wifi_iface, '-j', 'MASQUERADE'
-                    ], check=False)
-                    subprocess.run([
-                        'iptables', '-w', '-D', 'FORWARD',
-                        '-i', self.wifi_iface,
-                        '-s', f"{self.gateway.split('.')[0]}.{self.gateway.split('.')[1]}.{self.gateway.split('.')[2]}.0/24",
-                        '-j', 'ACCEPT'
-                    ], check=False)
-                    subprocess.run([
-                        'iptables', '-w', '-D', 'FORWARD',
-                        '-i', self.internet_iface,
-                        '-d', f"{self.gateway.split('.')[0]}.{self.gateway.split('.')[1]}.{self.gateway.split('.')[2]}.0/24",
-                        '-j', 'ACCEPT'
-                    ], check=False)
-                elif self.share_method == 'bridge':
+                if self.share_method == 'bridge':
                     # Remove bridge configuration if not already a bridge interface
                     if not self.ap_man.is_bridge_interface(self.internet_iface):
                         subprocess.run(['ip', 'link', 'set', 'dev', self.bridge_iface, 'down'], check=False)
@@ -177,38 +165,6 @@ class CleanupManager(SignalHandler):
                         # Remove from NetworkManager unmanaged list if needed
                         self.networkmanager_rm_unmanaged_if_needed(self.internet_iface)
 
-            # Cleanup DNS if not disabled
-            if self.share_method != 'bridge' and not self.no_dns:
-                subprocess.run([
-                    'iptables', '-w', '-D', 'INPUT',
-                    '-p', 'tcp', '-m', 'tcp', '--dport', str(self.dns_port), '-j', 'ACCEPT'
-                ], check=False)
-                subprocess.run([
-                    'iptables', '-w', '-D', 'INPUT',
-                    '-p', 'udp', '-m', 'udp', '--dport', str(self.dns_port), '-j', 'ACCEPT'
-                ], check=False)
-                subprocess.run([
-                    'iptables', '-w', '-t', 'nat', '-D', 'PREROUTING',
-                    '-s', f"{self.gateway.split('.')[0]}.{self.gateway.split('.')[1]}.{self.gateway.split('.')[2]}.0/24",
-                    '-d', self.gateway,
-                    '-p', 'tcp', '-m', 'tcp', '--dport', '53',
-                    '-j', 'REDIRECT', '--to-ports', str(self.dns_port)
-                ], check=False)
-                subprocess.run([
-                    'iptables', '-w', '-t', 'nat', '-D', 'PREROUTING',
-                    '-s', f"{self.gateway.split('.')[0]}.{self.gateway.split('.')[1]}.{self.gateway.split('.')[2]}.0/24",
-                    '-d', self.gateway,
-                    '-p', 'udp', '-m', 'udp', '--dport', '53',
-                    '-j', 'REDIRECT', '--to-ports', str(self.dns_port)
-                ], check=False)
-
-            # Cleanup DHCP server
-            if self.share_method != 'bridge':
-                subprocess.run([
-                    'iptables', '-w', '-D', 'INPUT',
-                    '-p', 'udp', '-m', 'udp', '--dport', '67', '-j', 'ACCEPT'
-                ], check=False)
-
             # Cleanup virtual interface if not disabled
             if not self.no_virt and self.vwifi_iface:
                 subprocess.run(['ip', 'link', 'set', 'down', 'dev', self.vwifi_iface], check=False)
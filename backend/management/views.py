@@ -1,4 +1,5 @@
 import json
+import logging
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -6,12 +7,13 @@ from django.views import View
 from django.contrib.auth.decorators import login_required
 from networks.models import Network
 from devices.models import Device, DeviceHistory
+from devices.registry import authenticated_macs
+from util.firewall import FirewallError, firewall
 from util.view_utils import BaseAPIView
 from django.utils import timezone
-from util.netscanner import NetScanner
 from .models import SystemSettings, SettingsHistory, AccessCode
 
-net_scanner = NetScanner()
+logger = logging.getLogger(__name__)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -198,7 +200,7 @@ class StatusAPIView(BaseAPIView):
     def get(self, request):
         try:
             total_devices = Device.objects.count()
-            authenticated_devices = Device.objects.filter(authenticated=True).count()
+            authenticated_devices = len(authenticated_macs)
             total_networks = Network.objects.count()
             active_networks = Network.objects.filter(status='active').count()
 
@@ -236,7 +238,13 @@ class AdminAccessAPIView(BaseAPIView):
         """Grant access to a device"""
         try:
             device = Device.objects.get(mac_address=mac_address)
-            device.authenticated = True
+            # The device row only changes once the kernel set has
+            try:
+                firewall.grant([device.mac_address])
+            except FirewallError as e:
+                logger.error(f"Firewall grant failed for {device.mac_address}: {e}")
+                return self.error_response('Could not update the firewall; access was not granted', 503)
+            device.is_authenticated = True
             device.auth_status = 'authenticated'
             device.save()
 
@@ -252,7 +260,7 @@ class AdminAccessAPIView(BaseAPIView):
                 'message': f'Access granted for device {mac_address}',
                 'device': {
                     'mac_address': device.mac_address,
-                    'authenticated': device.authenticated,
+                    'authenticated': device.mac_address in authenticated_macs,
                     'auth_status': device.auth_status
                 }
             })
@@ -265,7 +273,12 @@ class AdminAccessAPIView(BaseAPIView):
         """Revoke access from a device"""
         try:
             device = Device.objects.get(mac_address=mac_address)
-            device.authenticated = False
+            try:
+                firewall.revoke([device.mac_address])
+            except FirewallError as e:
+                logger.error(f"Firewall revoke failed for {device.mac_address}: {e}")
+                return self.error_response('Could not update the firewall; access was not revoked', 503)
+            device.is_authenticated = False
             device.auth_status = 'blocked'
             device.save()
 
@@ -281,7 +294,7 @@ class AdminAccessAPIView(BaseAPIView):
                 'message': f'Access revoked for device {mac_address}',
                 'device': {
                     'mac_address': device.mac_address,
-                    'authenticated': device.authenticated,
+                    'authenticated': device.mac_address in authenticated_macs,
                     'auth_status': device.auth_status
                 }
             })
@@ -293,15 +306,18 @@ class AdminAccessAPIView(BaseAPIView):
 
 def admin_check_access(request, mac):
     """Check access for specific MAC"""
-    # Get device info
-    device = net_scanner.get_connected_devices()
+    device = Device.objects.filter(mac_address=mac).first() if mac in authenticated_macs else None
 
     if device:
         return JsonResponse(
             {
                 "mac": mac,
-                "authenticated": device.is_authenticated,
-                "device_info": device,
+                "authenticated": True,
+                "device_info": {
+                    "ip_address": device.ip_address,
+                    "hostname": device.hostname,
+                    "last_seen": device.last_seen.isoformat(),
+                },
                 "status": device.auth_status
             }
         )
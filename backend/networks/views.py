@@ -3,9 +3,10 @@ from django.views.decorators.csrf import csrf_exempt
 from .models import Network
 from devices.models import Device
 from util.view_utils import BaseAPIView
-import subprocess
+import logging
 from django.http import JsonResponse
 from util.device_utils import meta_scanner
+from util.firewall import FirewallError, firewall
 # from util.netscanner import net_scanner
 from django.conf import settings
 
@@ -13,6 +14,8 @@ BASE_DIR = settings.BASE_DIR
 
 FRONTEND_BASE_URL = settings.__getattr__('FRONTEND_BASE_URL')
 
+logger = logging.getLogger(__name__)
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class NetworkAPIView(BaseAPIView):
@@ -81,26 +84,28 @@ def connect(request):
         client_ip = request.META.get("REMOTE_ADDR")
         client_ip = client_ip if client_ip else meta_scanner.get_client_ip(request)
 
-        client_mac = meta_scanner.get_mac_address(client_ip)
+        client_mac = meta_scanner.get_mac_address(client_ip, fresh=True)
         host_name = meta_scanner.get_hostname_from_ip(client_ip)
         network = Network.objects.first()
 
         if client_mac:
             # Update devices
-            device = Device.objects.get_or_create(
+            device, _ = Device.objects.get_or_create(
                 mac_address=client_mac,
-                ip_address=client_ip,
-                hostname=host_name,
-                network=network,
-                is_authenticated=False,
-                auth_status='pending',
-                user_agent='',
-            )
-            # Update firewall rules
-            subprocess.run(
-                ["sudo", (BASE_DIR / "scripts/update_firewall.sh").as_posix()],
-                check=False,
+                defaults={
+                    'ip_address': client_ip,
+                    'hostname': host_name,
+                    'network': network,
+                    'is_authenticated': False,
+                    'auth_status': 'pending',
+                    'user_agent': '',
+                },
             )
+            # Add the client to the kernel access set
+            try:
+                firewall.grant([client_mac])
+            except FirewallError as e:
+                logger.error(f"Firewall grant failed for {client_mac}: {e}")
 
             # Update auth status
             device.is_authenticated = True
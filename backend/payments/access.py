@@ -0,0 +1,107 @@
+"""
+Paid access in the kernel access set.
+
+A paid grant is installed with a per-element timeout equal to the time
+left on the client's latest active plan, so the kernel drops the client
+when it runs out with no sweeper involved. `expire_access` is the
+bookkeeping that follows: it marks lapsed rows expired and
+de-authenticates their devices in a few bulk queries.
+"""
+import logging
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from devices.models import Device, DeviceHistory
+from devices.registry import authenticated_macs
+from util.firewall import FirewallError, firewall
+from .models import InternetAccess
+
+logger = logging.getLogger(__name__)
+
+
+def access_timeout(mac_address: str, now=None) -> int:
+    """Seconds until the last active access of this device ends"""
+    now = now or timezone.now()
+    end_time = InternetAccess.objects.filter(
+        mac_address=mac_address, status='active', end_time__gt=now
+    ).aggregate(end=Max('end_time'))['end']
+    return max(0, int((end_time - now).total_seconds())) if end_time else 0
+
+
+def grant_access(access: InternetAccess) -> bool:
+    """Put the access's device in the kernel set until its time runs out"""
+    if not access.mac_address:
+        return False
+    # A renewal bought while time is left must not cut the older, longer grant short
+    timeout = access_timeout(access.mac_address)
+    if not timeout:
+        return False
+    try:
+        firewall.grant([access.mac_address], timeout=timeout)
+    except FirewallError as e:
+        logger.error(f"Firewall grant failed for {access.mac_address}: {e}")
+        return False
+
+    device = Device.objects.filter(mac_address=access.mac_address).first()
+    if device and not device.is_authenticated:
+        device.is_authenticated = True
+        device.auth_status = 'authenticated'
+        device.save()
+    return True
+
+
+def active_grants(now=None) -> dict:
+    """{mac: remaining seconds} for every device with active paid access"""
+    now = now or timezone.now()
+    rows = (InternetAccess.objects
+            .filter(status='active', end_time__gt=now)
+            .exclude(mac_address=None)
+            .values('mac_address')
+            .annotate(end=Max('end_time')))
+    return {row['mac_address']: int((row['end'] - now).total_seconds()) for row in rows}
+
+
+def expire_access(now=None, revoke: bool = True) -> int:
+    """
+    Mark active access past its end time as expired; returns the number of
+    rows updated. Devices left without any active access are
+    de-authenticated. The kernel has already dropped their set elements,
+    so the revoke is only a safety net for grants made without a timeout.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        lapsed = InternetAccess.objects.filter(status='active', end_time__lte=now)
+        macs = set(lapsed.exclude(mac_address=None).values_list('mac_address', flat=True))
+        count = lapsed.update(status='expired', updated_at=now)
+        if not count:
+            return 0
+
+        renewed = set(InternetAccess.objects.filter(
+            mac_address__in=macs, status='active', end_time__gt=now
+        ).values_list('mac_address', flat=True))
+        macs -= renewed
+
+        devices = list(Device.objects.filter(mac_address__in=macs, is_authenticated=True))
+        if devices:
+            Device.objects.filter(pk__in=[d.pk for d in devices]).update(
+                is_authenticated=False, auth_status='pending'
+            )
+            DeviceHistory.objects.bulk_create([
+                DeviceHistory(device=d, event_type='access_revoked', ip_address=d.ip_address,
+                              details={'reason': 'expired'})
+                for d in devices
+            ])
+
+    if devices:
+        # The bulk update skipped the post_save receivers
+        authenticated_macs.invalidate()
+    # auth_store is left alone: plans never grant through it, so anything it
+    # holds for these MACs is an independent admin or portal grant
+    if revoke and macs:
+        try:
+            firewall.revoke(macs)
+        except FirewallError as e:
+            logger.error(f"Firewall revoke failed for expired access: {e}")
+
+    logger.info(f"Expired {count} access grant(s); {len(devices)} device(s) de-authenticated")
+    return count
@@ -94,6 +94,9 @@ class PaymentTransaction(models.Model):
     card_last4 = models.CharField(max_length=4, blank=True, null=True)
     card_brand = models.CharField(max_length=50, blank=True, null=True)
 
+    # Client device the access is for, captured when the payment starts
+    mac_address = models.CharField(max_length=17, blank=True, null=True)
+
     # Queue and Processing
     queue_position = models.IntegerField(null=True, blank=True)
     retry_count = models.PositiveIntegerField(default=0)
@@ -141,6 +144,8 @@ class InternetAccess(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField()
     bandwidth_limit = models.PositiveIntegerField(help_text="Bandwidth in Mbps", default=10)
+    mac_address = models.CharField(max_length=17, blank=True, null=True,
+                                   help_text="Device granted access in the kernel set")
 
     # Usage Tracking
     data_used = models.BigIntegerField(default=0, help_text="Data used in bytes")
@@ -152,6 +157,10 @@ class InternetAccess(models.Model):
     class Meta:
         db_table = 'internet_access'
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['status', 'end_time']),
+            models.Index(fields=['mac_address']),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.plan.name} ({self.status})"
@@ -167,6 +176,12 @@ class InternetAccess(models.Model):
             return max(0, remaining.total_seconds() // 60)  # Return minutes
         return 0
 
+    @property
+    def remaining_seconds(self):
+        if self.is_active:
+            return max(0, int((self.end_time - timezone.now()).total_seconds()))
+        return 0
+
 
 class MpesaCallback(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -13,6 +13,8 @@ from .models import (
     MpesaCallback,
     InternetAccess
 )
+from .access import grant_access
+from util.device_utils import meta_scanner
 
 
 class BasePaymentView(View):
@@ -81,6 +83,9 @@ class InitiatePaymentView(BasePaymentView):
             except PricingPlan.DoesNotExist:
                 return self.error_response('Invalid pricing plan', 400)
 
+            # The device paying is the one that gets access
+            client_mac = meta_scanner.get_mac_address(meta_scanner.get_client_ip(request), fresh=True)
+
             # Create payment transaction
             transaction = PaymentTransaction.objects.create(
                 user=request.user,
@@ -88,7 +93,8 @@ class InitiatePaymentView(BasePaymentView):
                 amount=plan.price,
                 payment_method=payment_method,
                 expires_at=timezone.now() + timedelta(minutes=10),  # 10 minutes to complete payment
-                mpesa_phone=phone_number if payment_method == 'mpesa' else None
+                mpesa_phone=phone_number if payment_method == 'mpesa' else None,
+                mac_address=client_mac.lower() if client_mac else None
             )
 
             # Initiate payment based on method
@@ -290,13 +296,16 @@ class MpesaCallbackView(BasePaymentView):
         """Create internet access record for completed payment"""
         end_time = timezone.now() + timedelta(minutes=transaction.plan.duration_minutes)
 
-        InternetAccess.objects.create(
+        access = InternetAccess.objects.create(
             user=transaction.user,
             payment=transaction,
             plan=transaction.plan,
             end_time=end_time,
-            bandwidth_limit=self.get_bandwidth_for_plan(transaction.plan)
+            bandwidth_limit=self.get_bandwidth_for_plan(transaction.plan),
+            mac_address=transaction.mac_address
         )
+        # Installed with the remaining time as its kernel timeout
+        grant_access(access)
 
     def get_bandwidth_for_plan(self, plan):
         """Get bandwidth limit based on plan"""
@@ -2,6 +2,7 @@ from django.shortcuts import redirect
 from django.http import JsonResponse
 from django.conf import settings
 from util.device_utils import meta_scanner
+from devices.registry import authenticated_macs
 
 
 BASE_DIR = settings.BASE_DIR
@@ -17,4 +18,8 @@ def get_client_info(request):
     client_ip = request.META.get("REMOTE_ADDR")
     client_mac = meta_scanner.get_mac_address(client_ip)
 
-    return JsonResponse({"client_ip": client_ip, "client_mac": client_mac if client_mac else ''})
+    return JsonResponse({
+        "client_ip": client_ip,
+        "client_mac": client_mac if client_mac else '',
+        "authenticated": client_mac in authenticated_macs,
+    })
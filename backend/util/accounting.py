@@ -0,0 +1,158 @@
+"""
+Per-client traffic accounting from nftables counters.
+
+An `inet nethub_acct` table hooks the forward path and keeps two dynamic
+sets keyed by client address, one for traffic from the captive subnet
+(upload) and one for traffic to it (download). Each element carries its
+own counter, so the kernel does the accounting and userspace reads every
+client with one set dump per direction and interval.
+
+Counters are cumulative; each collection turns them into deltas against
+the previous reading, persisted so a restart neither loses nor double
+counts, and adds them to Device.upload_bytes/download_bytes and the
+data_used of the device's active InternetAccess in one transaction.
+"""
+import ipaddress
+import json
+import logging
+import os
+from typing import Dict, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from devices.models import Device
+from payments.models import InternetAccess
+from util.firewall.base import FirewallError, run
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = settings.BASE_DIR / "run/traffic_counters.json"
+DIRECTIONS = ('upload', 'download')
+SET_SIZE = 65535
+
+
+def parse_counters(output: str) -> Dict[str, int]:
+    """{ip: bytes} from `nft -j list set` output"""
+    counters = {}
+    for item in json.loads(output or '{}').get('nftables', []):
+        for element in item.get('set', {}).get('elem', []):
+            if not isinstance(element, dict):
+                continue
+            element = element.get('elem', {})
+            value, counter = element.get('val'), element.get('counter')
+            if isinstance(value, str) and counter:
+                counters[value] = int(counter.get('bytes', 0))
+    return counters
+
+
+class TrafficAccounting:
+    """Kernel byte counters per client address, read as deltas"""
+
+    def __init__(self, subnet: str, table: str = 'nethub_acct', state_file=STATE_FILE):
+        self.network = ipaddress.ip_network(subnet, strict=False)
+        self.table = table
+        self.state_file = state_file
+        self._previous: Dict[str, Dict[str, int]] = None
+        self._ready = False
+
+    def setup(self):
+        """Create the table, counter sets and forward-path rules (idempotent)"""
+        lines = [f"add table inet {self.table}"]
+        for direction in DIRECTIONS:
+            lines.append(f"add set inet {self.table} {direction} "
+                         f"{{ type ipv4_addr; size {SET_SIZE}; flags dynamic; }}")
+        lines += [
+            f"add chain inet {self.table} forward {{ type filter hook forward priority -5; policy accept; }}",
+            f"flush chain inet {self.table} forward",
+            f"add rule inet {self.table} forward ip saddr {self.network} update @upload {{ ip saddr counter }}",
+            f"add rule inet {self.table} forward ip daddr {self.network} update @download {{ ip daddr counter }}",
+        ]
+        run(['nft', '-f', '-'], input_text='\n'.join(lines) + '\n')
+        self._ready = True
+
+    def ensure(self):
+        if not self._ready:
+            self.setup()
+
+    def read(self) -> Dict[str, Dict[str, int]]:
+        """{direction: {ip: bytes}} straight from the kernel"""
+        self.ensure()
+        return {
+            direction: parse_counters(run(['nft', '-j', 'list', 'set', 'inet', self.table, direction]).stdout)
+            for direction in DIRECTIONS
+        }
+
+    def _load_state(self) -> Dict[str, Dict[str, int]]:
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            return {direction: dict(state.get(direction, {})) for direction in DIRECTIONS}
+        except (OSError, ValueError):
+            return {direction: {} for direction in DIRECTIONS}
+
+    def _save_state(self, state: Dict[str, Dict[str, int]]):
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        temp = f"{self.state_file}.tmp"
+        with open(temp, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp, self.state_file)
+
+    def deltas(self, current: Dict[str, Dict[str, int]]) -> Dict[str, Tuple[int, int]]:
+        """{ip: (upload, download)} bytes since the previous reading"""
+        if self._previous is None:
+            self._previous = self._load_state()
+        result: Dict[str, Tuple[int, int]] = {}
+        for index, direction in enumerate(DIRECTIONS):
+            before = self._previous.get(direction, {})
+            for ip, value in current[direction].items():
+                old = before.get(ip, 0)
+                # Lower than before: the table was recreated and counting restarted
+                delta = value - old if value >= old else value
+                if delta:
+                    pair = list(result.get(ip, (0, 0)))
+                    pair[index] = delta
+                    result[ip] = tuple(pair)
+        return result
+
+    def collect(self) -> Dict[str, Tuple[int, int]]:
+        """Add one interval's traffic to devices and their active access"""
+        try:
+            current = self.read()
+        except (FirewallError, ValueError) as e:
+            logger.error(f"Reading traffic counters failed: {e}")
+            return {}
+        deltas = self.deltas(current)
+
+        by_ip = {}
+        if deltas:
+            # A stale row may still hold a reassigned address; the latest seen wins
+            for device in Device.objects.filter(ip_address__in=list(deltas)).order_by('last_seen'):
+                by_ip[device.ip_address] = device
+        devices = {device.mac_address.lower(): device for device in by_ip.values()}
+        accesses = {}
+        if devices:
+            active = InternetAccess.objects.filter(
+                status='active', end_time__gt=timezone.now(), mac_address__in=list(devices)
+            ).order_by('start_time')
+            for access in active:
+                # Charge the plan that started first while several overlap
+                accesses.setdefault(access.mac_address.lower(), access)
+
+        for mac, device in devices.items():
+            upload, download = deltas[device.ip_address]
+            device.upload_bytes += upload
+            device.download_bytes += download
+            if mac in accesses:
+                accesses[mac].data_used += upload + download
+
+        with transaction.atomic():
+            if devices:
+                Device.objects.bulk_update(list(devices.values()), ['upload_bytes', 'download_bytes'])
+            if accesses:
+                InternetAccess.objects.bulk_update(list(accesses.values()), ['data_used'])
+
+        # Only move the baseline once the deltas are stored
+        self._previous = current
+        self._save_state(current)
+        logger.debug(f"Accounted traffic for {len(devices)} device(s), {len(accesses)} active plan(s)")
+        return deltas
@@ -0,0 +1,184 @@
+"""
+Concurrent ARP probing for batches of unresolved IPs.
+
+Broadcasts ARP requests for every IP on a raw AF_PACKET socket and
+collects the replies until a single deadline. Without CAP_NET_RAW (or an
+interface to send on) it falls back to parallel pings with a concurrency
+cap, then reads the answers from the kernel neighbor table in one dump;
+request handlers turn that fallback off rather than fork and wait.
+"""
+import asyncio
+import fcntl
+import ipaddress
+import logging
+import math
+import socket
+import struct
+import time
+from typing import Dict, Iterable, Optional
+from util.neighbors import NeighborTable
+
+logger = logging.getLogger(__name__)
+
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ARP_REQUEST = 1
+ARP_REPLY = 2
+SIOCGIFADDR = 0x8915
+BROADCAST = b'\xff' * 6
+
+ETH_HDR = struct.Struct("!6s6sH")
+ARP_PKT = struct.Struct("!HHBBH6s4s6s4s")
+
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_CONCURRENCY = 256
+
+
+def _interface_mac(interface: str) -> bytes:
+    with open(f"/sys/class/net/{interface}/address", 'r') as f:
+        return bytes.fromhex(f.read().strip().replace(':', ''))
+
+
+def _interface_ip(interface: str) -> bytes:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ifreq = struct.pack('256s', interface.encode()[:15])
+        return fcntl.ioctl(sock.fileno(), SIOCGIFADDR, ifreq)[20:24]
+
+
+def build_arp_request(src_mac: bytes, src_ip: bytes, target_ip: str) -> bytes:
+    """Ethernet broadcast frame carrying an ARP who-has for `target_ip`"""
+    return ETH_HDR.pack(BROADCAST, src_mac, ETH_P_ARP) + ARP_PKT.pack(
+        1, ETH_P_IP, 6, 4, ARP_REQUEST,
+        src_mac, src_ip, b'\x00' * 6, socket.inet_aton(target_ip)
+    )
+
+
+def parse_arp_reply(frame: bytes) -> Optional[tuple]:
+    """Return (ip, mac) from an ARP reply frame, or None"""
+    if len(frame) < ETH_HDR.size + ARP_PKT.size:
+        return None
+    _, _, ethertype = ETH_HDR.unpack_from(frame)
+    if ethertype != ETH_P_ARP:
+        return None
+    _, ptype, _, _, op, sha, spa, _, _ = ARP_PKT.unpack_from(frame, ETH_HDR.size)
+    if op != ARP_REPLY or ptype != ETH_P_IP:
+        return None
+    return socket.inet_ntoa(spa), ':'.join(f'{b:02x}' for b in sha)
+
+
+class ArpProber:
+    """Resolve many IPs concurrently within one deadline"""
+
+    def __init__(self, interface: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 concurrency: int = DEFAULT_CONCURRENCY, ping_fallback: bool = True):
+        self.interface = interface
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.ping_fallback = ping_fallback
+
+    def resolve(self, ip_addresses: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Blocking wrapper around probe()"""
+        return asyncio.run(self.probe(ip_addresses))
+
+    async def probe(self, ip_addresses: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Map every IP to its MAC (None when nothing answered in time)"""
+        targets = []
+        for ip in dict.fromkeys(ip_addresses):
+            try:
+                if ipaddress.ip_address(ip).version == 4:
+                    targets.append(ip)
+            except ValueError:
+                logger.warning(f"Skipping invalid IP {ip!r}")
+        if not targets:
+            return {}
+
+        results = dict.fromkeys(targets)
+        if self.interface:
+            try:
+                results.update(await self._probe_raw(targets))
+                return results
+            except OSError as e:
+                logger.debug(f"Raw ARP probing unavailable on {self.interface}: {e}")
+
+        if self.ping_fallback:
+            results.update(await self._probe_ping(targets))
+        return results
+
+    async def _probe_raw(self, targets) -> Dict[str, str]:
+        """Broadcast ARP requests and gather replies until the deadline"""
+        loop = asyncio.get_running_loop()
+        src_mac = _interface_mac(self.interface)
+        src_ip = _interface_ip(self.interface)
+        pending = set(targets)
+        found = {}
+
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        try:
+            sock.bind((self.interface, ETH_P_ARP))
+            sock.setblocking(False)
+
+            def send(ips):
+                for ip in ips:
+                    sock.send(build_arp_request(src_mac, src_ip, ip))
+
+            deadline = loop.time() + self.timeout
+            retry_at = loop.time() + self.timeout / 2
+            retried = False
+            send(targets)
+
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                if not retried and now >= retry_at:
+                    # One retransmission for requests or replies lost on air
+                    send(pending)
+                    retried = True
+                wake = deadline if retried else retry_at
+                try:
+                    frame = await asyncio.wait_for(loop.sock_recv(sock, 128), wake - now)
+                except asyncio.TimeoutError:
+                    continue
+                reply = parse_arp_reply(frame)
+                if reply and reply[0] in pending:
+                    pending.discard(reply[0])
+                    found[reply[0]] = reply[1]
+        finally:
+            sock.close()
+
+        return found
+
+    async def _probe_ping(self, targets) -> Dict[str, str]:
+        """Parallel single pings (capped), then one neighbor table dump"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        wait = str(max(1, math.ceil(self.timeout)))
+
+        async def ping(ip):
+            async with semaphore:
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        'ping', '-c', '1', '-W', wait, ip,
+                        stdout=asyncio.subprocess.DEVNULL,
+                        stderr=asyncio.subprocess.DEVNULL,
+                    )
+                except OSError as e:
+                    logger.error(f"Could not ping {ip}: {e}")
+                    return
+                try:
+                    await proc.wait()
+                except asyncio.CancelledError:
+                    proc.kill()
+                    raise
+
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(ping(ip)) for ip in targets]
+        # Batches beyond the concurrency cap need extra ping rounds
+        rounds = math.ceil(len(targets) / self.concurrency)
+        _, still_running = await asyncio.wait(tasks, timeout=self.timeout * rounds + 0.5)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+        logger.debug(f"Pinged {len(targets)} hosts in {time.monotonic() - started:.2f}s")
+
+        wanted = set(targets)
+        return {n.ip: n.mac for n in NeighborTable(interface=self.interface).dump() if n.ip in wanted}
@@ -0,0 +1,511 @@
+"""
+Indexed store of authenticated MAC addresses.
+
+MACs are kept as a sorted array of 48-bit big-endian integers in a small
+binary file that is mmap'd read-only, so a membership check is a binary
+search over the mapping (O(log n), no parsing). The index is only
+re-mapped when the file is replaced, which is checked at most once per
+`check_interval`.
+
+Changes go to an append-only journal of grant/revoke records that is
+replayed on top of the snapshot into an in-memory set; compaction folds
+the journal back into a new snapshot. See AuthStore.
+
+The legacy one-MAC-per-line `auth/authenticated_macs` file is migrated
+automatically: entries found in it that are not in the store (including
+lines appended later by scripts or by hand) are imported as grants. The
+file is kept current for the firewall shell scripts: grants are appended
+to it, and every revoke and compaction rewrites it, so a revoked MAC is
+never left in it to be imported again.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+BASE_DIR = Path(__file__).parent.parent.resolve()
+
+FLAT_FILE = BASE_DIR / "auth/authenticated_macs"
+INDEX_FILE = BASE_DIR / "auth/authenticated_macs.idx"
+
+MAGIC = b'NHMI'
+HEADER = struct.Struct("!4sHHI")  # magic, format version, record size, count
+FORMAT_VERSION = 1
+RECORD_SIZE = 6
+
+JOURNAL_FILE = BASE_DIR / "auth/authenticated_macs.journal"
+LOCK_FILE = BASE_DIR / "auth/.authenticated_macs.lock"
+
+# Journal record: operation, padding, MAC
+RECORD = struct.Struct("!cx6s")
+GRANT = b'G'
+REVOKE = b'R'
+
+CHECK_INTERVAL = 1.0
+COMPACT_THRESHOLD = 10000
+
+logger = logging.getLogger(__name__)
+
+
+def mac_to_int(mac: str) -> int:
+    """'AA:bb-cc:dd:ee:ff' -> 0xaabbccddeeff"""
+    digits = mac.strip().replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        raise ValueError(f"Invalid MAC address: {mac!r}")
+    return int(digits, 16)
+
+
+def int_to_mac(value: int) -> str:
+    raw = value.to_bytes(RECORD_SIZE, 'big')
+    return ':'.join(f'{b:02x}' for b in raw)
+
+
+def read_flat_file(path) -> List[int]:
+    """Parse a one-MAC-per-line file, skipping blanks and malformed lines"""
+    macs = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    macs.append(mac_to_int(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return macs
+
+
+def write_index(path, macs: Iterable[int]):
+    """Atomically replace the index with the sorted, de-duplicated MACs"""
+    values = sorted(set(macs))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE, len(values)))
+        f.write(b''.join(value.to_bytes(RECORD_SIZE, 'big') for value in values))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class MacIndex:
+    """Read-only view of an index file, re-mapped when the file is replaced"""
+
+    def __init__(self, path, check_interval: float = CHECK_INTERVAL):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._map: Optional[mmap.mmap] = None
+        self._count = 0
+        self._stamp = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _open(self, stamp):
+        if self._map is not None:
+            self._map.close()
+        self._map, self._count = None, 0
+        self._stamp = stamp
+        if stamp is None or stamp[2] < HEADER.size:
+            return
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size, count = HEADER.unpack_from(mapped)
+        if magic != MAGIC or version != FORMAT_VERSION or size != RECORD_SIZE \
+                or len(mapped) < HEADER.size + count * RECORD_SIZE:
+            mapped.close()
+            raise ValueError(f"Corrupt MAC index {self.path}")
+        self._map, self._count = mapped, count
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            self._next_check = now + self.check_interval
+            stamp = self._stat()
+            if force or stamp != self._stamp:
+                self._open(stamp)
+
+    def _at(self, i: int) -> int:
+        offset = HEADER.size + i * RECORD_SIZE
+        return int.from_bytes(self._map[offset:offset + RECORD_SIZE], 'big')
+
+    def contains_int(self, value: int) -> bool:
+        self.refresh()
+        # Big-endian records compare as bytes in numeric order
+        target = value.to_bytes(RECORD_SIZE, 'big')
+        mapped = self._map
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD_SIZE
+            current = mapped[offset:offset + RECORD_SIZE]
+            if current == target:
+                return True
+            if current < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return False
+
+    def __contains__(self, mac) -> bool:
+        if not mac:
+            return False
+        try:
+            return self.contains_int(mac_to_int(mac))
+        except ValueError:
+            return False
+
+    def __iter__(self) -> Iterator[int]:
+        self.refresh()
+        return (self._at(i) for i in range(self._count))
+
+    def __len__(self) -> int:
+        self.refresh()
+        return self._count
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            self._map, self._count, self._stamp = None, 0, None
+
+
+class AuthStore:
+    """
+    Authenticated MACs: snapshot index + append-only journal + in-memory set.
+
+    Grants and revokes append one fixed-size record to the journal and
+    update the set, so both are O(1) regardless of how many MACs exist.
+    Concurrent writers share fsyncs (group commit): whoever syncs first
+    covers every record written before it started. Revokes rewrite the flat
+    file, so a burst of them should go through revoke_many(). Once the
+    journal holds `compact_threshold` records a background thread folds it
+    into a fresh snapshot index and re-exports the flat file.
+    """
+
+    def __init__(self, index_file=INDEX_FILE, flat_file=FLAT_FILE, journal_file=JOURNAL_FILE,
+                 lock_file=LOCK_FILE, check_interval: float = CHECK_INTERVAL,
+                 compact_threshold: int = COMPACT_THRESHOLD):
+        self.index_file = Path(index_file)
+        self.flat_file = Path(flat_file)
+        self.journal_file = Path(journal_file)
+        self.lock_file = Path(lock_file)
+        self.check_interval = check_interval
+        self.compact_threshold = compact_threshold
+        self.index = MacIndex(index_file, check_interval=check_interval)
+
+        self._macs = set()
+        self._loaded = False
+        self._next_check = 0.0
+        self._journal_ino = None
+        self._journal_offset = 0
+        self._flat_offset = 0
+        self._fd = None
+        self._cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._compacting = False
+
+    def _flock(self, mode):
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.lock_file, 'a')
+        fcntl.flock(f, mode)
+        return f
+
+    def _apply_records(self, data: bytes) -> int:
+        """Replay whole journal records; returns the bytes consumed"""
+        usable = len(data) - len(data) % RECORD.size
+        for op, raw in RECORD.iter_unpack(data[:usable]):
+            value = int.from_bytes(raw, 'big')
+            if op == GRANT:
+                self._macs.add(value)
+            elif op == REVOKE:
+                self._macs.discard(value)
+        return usable
+
+    def _read_journal(self):
+        try:
+            with open(self.journal_file, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self._journal_ino:
+                    return False
+                f.seek(self._journal_offset)
+                self._journal_offset += self._apply_records(f.read())
+        except FileNotFoundError:
+            return self._journal_ino is None
+        return True
+
+    def _read_flat_tail(self):
+        """Pick up MACs appended to the flat file by hand or by scripts"""
+        try:
+            with open(self.flat_file, 'r') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size < self._flat_offset:
+                    # Rewritten by a compaction; nothing new in it
+                    self._flat_offset = size
+                    return []
+                f.seek(self._flat_offset)
+                tail = f.read()
+        except FileNotFoundError:
+            return []
+        complete = tail[:tail.rfind('\n') + 1]
+        self._flat_offset += len(complete.encode())
+        added = []
+        for line in complete.splitlines():
+            try:
+                value = mac_to_int(line)
+            except ValueError:
+                continue
+            if value not in self._macs:
+                added.append(value)
+        return added
+
+    def _reload(self):
+        """Rebuild the set from the snapshot and journal; caller holds the file lock"""
+        try:
+            self.index.refresh(force=True)
+            macs = set(self.index)
+        except ValueError:
+            logger.error(f"Ignoring corrupt MAC index {self.index_file}")
+            macs = set()
+        with self._cond:
+            self._macs = macs
+            try:
+                self._journal_ino = os.stat(self.journal_file).st_ino
+            except FileNotFoundError:
+                self._journal_ino = None
+            self._journal_offset = 0
+            self._read_journal()
+            self._flat_offset = 0
+            self._loaded = True
+
+    def _catch_up(self) -> List[int]:
+        """Apply new journal records; returns MACs newly found in the flat file"""
+        with self._cond:
+            self._next_check = time.monotonic() + self.check_interval
+            current = self._loaded and self._read_journal()
+        if not current:
+            # First use, or the journal was replaced by a compaction elsewhere
+            self._reload()
+        with self._cond:
+            return self._read_flat_tail()
+
+    def refresh(self, force: bool = False):
+        """Catch up with records written by other processes"""
+        if self._loaded and not force and time.monotonic() < self._next_check:
+            return
+        lock = self._flock(fcntl.LOCK_SH)
+        try:
+            imported = self._catch_up()
+        finally:
+            lock.close()
+        if imported:
+            # Flat file entries (legacy or appended by hand) become journal grants
+            self._append([(GRANT, value) for value in imported])
+
+    def __contains__(self, mac) -> bool:
+        if not mac:
+            return False
+        try:
+            value = mac_to_int(mac)
+        except ValueError:
+            return False
+        self.refresh()
+        return value in self._macs
+
+    def __iter__(self) -> Iterator[str]:
+        self.refresh()
+        return (int_to_mac(value) for value in sorted(self._macs))
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._macs)
+
+    def _journal_fd(self):
+        """Append descriptor for the current journal, reopened after a compaction"""
+        if self._fd is not None:
+            try:
+                if os.fstat(self._fd).st_ino == os.stat(self.journal_file).st_ino:
+                    return self._fd
+            except FileNotFoundError:
+                pass
+            # Wait for an in-flight fsync before dropping the old descriptor
+            while self._syncing:
+                self._cond.wait()
+            os.close(self._fd)
+        self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _write(self, records):
+        """Append records to the journal and the set; caller holds the file lock"""
+        data = b''.join(RECORD.pack(op, value.to_bytes(RECORD_SIZE, 'big')) for op, value in records)
+        with self._cond:
+            os.write(self._journal_fd(), data)
+            for op, value in records:
+                if op == GRANT:
+                    self._macs.add(value)
+                else:
+                    self._macs.discard(value)
+            self._written += 1
+            return self._written, os.fstat(self._fd).st_size
+
+    def _durable(self, target: int, size: int):
+        """Wait for write `target` to be fsynced, then compact if due"""
+        with self._cond:
+            self._commit(target)
+        if size // RECORD.size >= self.compact_threshold:
+            self.schedule_compaction()
+
+    def _append(self, records):
+        """Write records to the journal and wait until they are durable"""
+        lock = self._flock(fcntl.LOCK_SH)
+        try:
+            target, size = self._write(records)
+        finally:
+            lock.close()
+        self._durable(target, size)
+
+    def _commit(self, target: int):
+        """Group commit: block (holding no lock) until write `target` is fsynced"""
+        while self._synced < target:
+            if self._syncing:
+                self._cond.wait()
+                continue
+            self._syncing = True
+            batch = self._written
+            fd = self._fd
+            self._cond.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._cond.acquire()
+                self._syncing = False
+                self._cond.notify_all()
+            self._synced = max(self._synced, batch)
+
+    def grant(self, mac: str) -> bool:
+        """Authenticate a MAC; returns False if it already was"""
+        value = mac_to_int(mac)
+        self.refresh()
+        if value in self._macs:
+            return False
+        lock = self._flock(fcntl.LOCK_EX)
+        try:
+            imported = self._catch_up()
+            with self._cond:
+                granted = value not in self._macs and value not in imported
+            records = [(GRANT, other) for other in imported] + ([(GRANT, value)] if granted else [])
+            if not records:
+                return False
+            target, size = self._write(records)
+            if granted:
+                # Mirror to the flat file read by the firewall shell scripts under the
+                # same lock as the journal record, so a revoke cannot land in between
+                self.flat_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.flat_file, 'a') as f:
+                    f.write(f"{int_to_mac(value)}\n")
+        finally:
+            lock.close()
+        self._durable(target, size)
+        return granted
+
+    def revoke(self, mac: str) -> bool:
+        """De-authenticate a MAC; returns False if it was not authenticated"""
+        return self.revoke_many([mac]) == 1
+
+    def revoke_many(self, macs: Iterable[str]) -> int:
+        """De-authenticate several MACs with one flat file rewrite and fsync; returns how many were"""
+        values = {mac_to_int(mac) for mac in macs}
+        self.refresh()
+        if not values & self._macs:
+            return 0
+        lock = self._flock(fcntl.LOCK_EX)
+        try:
+            imported = self._catch_up()
+            with self._cond:
+                current = self._macs | set(imported)
+                revoked = values & current
+            if revoked:
+                # The flat file is rewritten before the revokes are journaled: every
+                # process imports MACs it finds there as grants, so it must never
+                # list a MAC the journal says is revoked
+                self._write_flat(current - revoked)
+            records = [(GRANT, other) for other in imported if other not in revoked]
+            records += [(REVOKE, value) for value in sorted(revoked)]
+            if not records:
+                return 0
+            target, size = self._write(records)
+        finally:
+            lock.close()
+        self._durable(target, size)
+        return len(revoked)
+
+    def _write_flat(self, macs):
+        """Atomically replace the flat file; caller holds the exclusive lock"""
+        self.flat_file.parent.mkdir(parents=True, exist_ok=True)
+        flat_tmp = self.flat_file.with_name(f".{self.flat_file.name}.{os.getpid()}.tmp")
+        with open(flat_tmp, 'w') as f:
+            f.write(''.join(f"{int_to_mac(value)}\n" for value in sorted(macs)))
+        os.replace(flat_tmp, self.flat_file)
+        with self._cond:
+            self._flat_offset = os.stat(self.flat_file).st_size
+
+    def schedule_compaction(self):
+        """Compact in a background thread unless one is already running"""
+        with self._cond:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact_in_background, name='auth-compaction', daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Auth journal compaction failed: {e}")
+        finally:
+            with self._cond:
+                self._compacting = False
+
+    def compact(self):
+        """Fold the journal into a new snapshot and flat file, then start a new journal"""
+        lock = self._flock(fcntl.LOCK_EX)
+        try:
+            imported = self._catch_up()
+            with self._cond:
+                self._macs.update(imported)
+                macs = set(self._macs)
+            write_index(self.index_file, macs)
+            self._write_flat(macs)
+
+            journal_tmp = self.journal_file.with_name(f".{self.journal_file.name}.{os.getpid()}.tmp")
+            open(journal_tmp, 'wb').close()
+            os.replace(journal_tmp, self.journal_file)
+
+            with self._cond:
+                self._journal_ino = os.stat(self.journal_file).st_ino
+                self._journal_offset = 0
+            self.index.refresh(force=True)
+        finally:
+            lock.close()
+        logger.info(f"Compacted auth journal into a snapshot of {len(macs)} MACs")
+
+
+auth_store = AuthStore()
@@ -0,0 +1,22 @@
+"""
+Pluggable device discovery.
+
+Sources (neighbor table, iw station dump, dnsmasq leases, hostapd control
+socket) each report what they see; the engine merges the results per MAC.
+"""
+from .base import DiscoverySource, Observation
+from .engine import DEFAULT_SOURCES, DiscoveredDevice, DiscoveryEngine
+from .sources import HostapdSource, LeaseSource, NeighborSource, StationSource, build_sources
+
+__all__ = [
+    'DEFAULT_SOURCES',
+    'DiscoveredDevice',
+    'DiscoveryEngine',
+    'DiscoverySource',
+    'HostapdSource',
+    'LeaseSource',
+    'NeighborSource',
+    'Observation',
+    'StationSource',
+    'build_sources',
+]
@@ -0,0 +1,41 @@
+"""
+Building blocks shared by the discovery sources and engine.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Observation:
+    """What one source saw about one client"""
+    mac: str
+    source: str
+    ip: Optional[str] = None
+    hostname: Optional[str] = None
+    extra: Dict = field(default_factory=dict)
+
+
+class DiscoverySource:
+    """
+    Base class for pluggable discovery sources.
+
+    `presence` sources prove that a client is currently connected (ARP,
+    station list, hostapd). Non-presence sources such as DHCP leases only
+    enrich clients that were seen by a presence source.
+    """
+
+    name = 'base'
+    presence = True
+
+    def available(self) -> bool:
+        """Whether the source can run on this host"""
+        return True
+
+    def collect(self) -> List[Observation]:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name}>"
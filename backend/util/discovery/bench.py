@@ -0,0 +1,77 @@
+"""
+Micro-benchmark of the per-cycle cost of each discovery source.
+
+    python -m util.discovery.bench --interface ap0 --subnet 192.168.12.0/24 -n 200
+
+Run from the backend directory. Django is not required.
+"""
+import argparse
+import statistics
+import time
+from util.neighbors import NeighborTable
+from .engine import DEFAULT_SOURCES
+from .sources import build_sources
+
+
+def time_call(func, iterations: int):
+    samples = []
+    result = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def report(name: str, samples, count):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<22} {statistics.mean(samples) * 1e6:>10.1f} {samples[0] * 1e6:>10.1f} "
+          f"{p95 * 1e6:>10.1f} {count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark discovery sources')
+    parser.add_argument('--interface', default=None)
+    parser.add_argument('--subnet', default=None)
+    parser.add_argument('--leases', default='/etc/ap_manager/proc/dnsmasq.leases')
+    parser.add_argument('--hostapd-ctrl', default='/etc/ap_manager/proc/hostapd_ctrl')
+    parser.add_argument('--sources', nargs='+', default=list(DEFAULT_SOURCES))
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'source':<22} {'mean us':>10} {'min us':>10} {'p95 us':>10} {'entries':>8}")
+
+    # The neighbor source per backend, to compare netlink against the fallbacks
+    table = NeighborTable(interface=args.interface, subnet=args.subnet)
+    for backend in NeighborTable.BACKENDS:
+        dump = getattr(table, f'_dump_{backend}')
+        try:
+            samples, result = time_call(dump, args.iterations)
+        except Exception as e:
+            print(f"{'neighbors/' + backend:<22} unavailable: {e}")
+            continue
+        report(f'neighbors/{backend}', samples, len(result))
+
+    sources = [
+        source for source in build_sources(
+            args.sources, interface=args.interface, subnet=args.subnet,
+            leases_file=args.leases, hostapd_ctrl_dir=args.hostapd_ctrl,
+        )
+        if source.available()
+    ]
+    for source in sources:
+        try:
+            samples, result = time_call(source.collect, args.iterations)
+        except Exception as e:
+            print(f"{source.name:<22} failed: {e}")
+            continue
+        report(source.name, samples, len(result))
+
+    skipped = set(args.sources) - {source.name for source in sources}
+    for name in sorted(skipped):
+        print(f"{name:<22} unavailable on this host")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Discovery engine merging every source's observations per MAC.
+"""
+import asyncio
+import ipaddress
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from .base import DiscoverySource, Observation, logger
+from .sources import build_sources
+
+DEFAULT_SOURCES = ('neighbors', 'stations', 'leases', 'hostapd')
+
+
+@dataclass
+class DiscoveredDevice:
+    """A client merged from all sources that reported it"""
+    mac: str
+    ip: Optional[str] = None
+    hostname: Optional[str] = None
+    sources: Set[str] = field(default_factory=set)
+    attributes: Dict = field(default_factory=dict)
+    present: bool = False
+
+    def as_dict(self) -> Dict:
+        return {
+            'mac': self.mac,
+            'ip': self.ip,
+            'hostname': self.hostname,
+            'sources': sorted(self.sources),
+            **self.attributes,
+        }
+
+
+class DiscoveryEngine:
+    """Run a set of discovery sources and merge their results"""
+
+    def __init__(self, sources: List[DiscoverySource], subnet: Optional[str] = None):
+        self.sources = sources
+        self.network = ipaddress.ip_network(subnet, strict=False) if subnet else None
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, int] = {source.name: 0 for source in sources}
+        self.unavailable: Set[str] = set()
+
+    @classmethod
+    def for_interface(cls, interface: Optional[str], subnet: Optional[str],
+                      source_names=DEFAULT_SOURCES, leases_file=None, hostapd_ctrl_dir=None):
+        sources = build_sources(
+            source_names, interface=interface, subnet=subnet,
+            leases_file=leases_file, hostapd_ctrl_dir=hostapd_ctrl_dir,
+        )
+        return cls(sources, subnet=subnet)
+
+    @classmethod
+    def for_network(cls, network, **kwargs):
+        """Engine configured from a networks.Network record"""
+        subnet = network.subnet
+        if subnet and '/' not in subnet:
+            # Bare gateway/network address stored; assume the usual /24
+            subnet = f"{subnet}/24"
+        return cls.for_interface(network.interface, subnet, **kwargs)
+
+    def active_sources(self) -> List[DiscoverySource]:
+        """Sources that can run right now; checked every cycle so late starters are picked up"""
+        active = []
+        for source in self.sources:
+            if source.available():
+                if source.name in self.unavailable:
+                    self.unavailable.discard(source.name)
+                    logger.info(f"Discovery source {source.name} is now available")
+                active.append(source)
+            elif source.name not in self.unavailable:
+                self.unavailable.add(source.name)
+                logger.debug(f"Discovery source {source.name} unavailable, skipping")
+        return active
+
+    def collect(self, source: DiscoverySource):
+        started = time.perf_counter()
+        try:
+            return source.collect()
+        except Exception as e:
+            self.errors[source.name] = self.errors.get(source.name, 0) + 1
+            logger.error(f"Discovery source {source.name} failed: {e}")
+            return []
+        finally:
+            self.timings[source.name] = time.perf_counter() - started
+
+    def merge(self, observations: List[Tuple[bool, Observation]]) -> Dict[str, DiscoveredDevice]:
+        """Fold (presence, observation) pairs into one device per MAC"""
+        devices: Dict[str, DiscoveredDevice] = {}
+        for presence, obs in observations:
+            if not obs.mac:
+                continue
+            device = devices.setdefault(obs.mac, DiscoveredDevice(mac=obs.mac))
+            device.sources.add(obs.source)
+            device.attributes.update(obs.extra)
+            if presence:
+                device.present = True
+                # Live sources win over lease data for the current IP
+                if obs.ip:
+                    device.ip = obs.ip
+            elif obs.ip and not device.ip:
+                device.ip = obs.ip
+            if obs.hostname and not device.hostname:
+                device.hostname = obs.hostname
+        return devices
+
+    def discover(self, present_only: bool = True) -> List[DiscoveredDevice]:
+        """One discovery cycle across every source"""
+        observations = []
+        for source in self.active_sources():
+            observations += [(source.presence, obs) for obs in self.collect(source)]
+        return self._select(observations, present_only)
+
+    async def discover_async(self, present_only: bool = True) -> List[DiscoveredDevice]:
+        """Like discover(), with every source collected concurrently in worker threads"""
+        sources = self.active_sources()
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self.collect, source) for source in sources)
+        )
+        observations = []
+        for source, collected in zip(sources, results):
+            observations += [(source.presence, obs) for obs in collected]
+        return self._select(observations, present_only)
+
+    def _select(self, observations, present_only: bool) -> List[DiscoveredDevice]:
+        devices = self.merge(observations).values()
+        return [
+            device for device in devices
+            if (device.present or not present_only) and self._in_subnet(device.ip)
+        ]
+
+    def _in_subnet(self, ip: Optional[str]) -> bool:
+        if not self.network or not ip:
+            return True
+        try:
+            return ipaddress.ip_address(ip) in self.network
+        except ValueError:
+            return False
@@ -0,0 +1,129 @@
+"""
+Discovery sources: kernel neighbors, nl80211 stations, dnsmasq leases
+and the hostapd control interface.
+"""
+import os
+import shutil
+import socket
+import tempfile
+from typing import List, Optional
+from hotspotmanager.ap_utils.leases import LeaseIndex
+from hotspotmanager.ap_utils.stations import station_dump
+from util.neighbors import NeighborTable
+from .base import DiscoverySource, Observation, logger
+
+
+class NeighborSource(DiscoverySource):
+    """IPv4 neighbor table via rtnetlink (procfs/iproute fallback)"""
+
+    name = 'neighbors'
+
+    def __init__(self, interface: Optional[str] = None, subnet: Optional[str] = None):
+        self.table = NeighborTable(interface=interface, subnet=subnet)
+
+    def collect(self) -> List[Observation]:
+        return [
+            Observation(mac=n.mac, ip=n.ip, source=self.name,
+                        extra={'state': n.state, 'ifindex': n.ifindex})
+            for n in self.table.dump()
+        ]
+
+
+class StationSource(DiscoverySource):
+    """Associated wireless stations from `iw dev <iface> station dump`"""
+
+    name = 'stations'
+
+    def __init__(self, interface: str):
+        self.interface = interface
+
+    def available(self) -> bool:
+        return bool(self.interface) and shutil.which('iw') is not None
+
+    def collect(self) -> List[Observation]:
+        return [
+            Observation(mac=station.mac, source=self.name, extra={
+                'signal': station.signal,
+                'tx_bitrate': station.tx_bitrate,
+                'inactive_ms': station.inactive_ms,
+            })
+            for station in station_dump(self.interface)
+        ]
+
+
+class LeaseSource(DiscoverySource):
+    """dnsmasq lease file: `<expiry> <mac> <ip> <hostname> <client-id>`"""
+
+    name = 'leases'
+    presence = False
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = LeaseIndex(path) if path else None
+
+    def available(self) -> bool:
+        return bool(self.path) and os.path.exists(self.path)
+
+    def collect(self) -> List[Observation]:
+        return [
+            Observation(mac=lease.mac, ip=lease.ip, source=self.name, hostname=lease.hostname,
+                        extra={'lease_expiry': lease.expiry or None})
+            for lease in self.index
+        ]
+
+
+class HostapdSource(DiscoverySource):
+    """Stations known to hostapd, read over its UNIX control socket"""
+
+    name = 'hostapd'
+    TIMEOUT = 1.0
+
+    def __init__(self, ctrl_dir: str, interface: str):
+        self.ctrl_path = os.path.join(ctrl_dir, interface) if ctrl_dir and interface else ''
+
+    def available(self) -> bool:
+        return bool(self.ctrl_path) and os.path.exists(self.ctrl_path)
+
+    def _request(self, sock, command: str) -> str:
+        sock.send(command.encode())
+        return sock.recv(4096).decode(errors='replace')
+
+    def collect(self) -> List[Observation]:
+        observations = []
+        local = os.path.join(tempfile.gettempdir(), f'nethub_hostapd_{os.getpid()}')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(local)
+            try:
+                sock.settimeout(self.TIMEOUT)
+                sock.connect(self.ctrl_path)
+                reply = self._request(sock, 'STA-FIRST')
+                while reply and not reply.startswith('FAIL'):
+                    lines = reply.splitlines()
+                    mac = lines[0].strip().lower()
+                    attrs = dict(line.split('=', 1) for line in lines[1:] if '=' in line)
+                    observations.append(Observation(mac=mac, source=self.name, extra={'flags': attrs.get('flags', '')}))
+                    reply = self._request(sock, f'STA-NEXT {mac}')
+            finally:
+                os.unlink(local)
+        return observations
+
+
+def build_sources(names, interface=None, subnet=None, leases_file=None, hostapd_ctrl_dir=None):
+    """
+    Instantiate the named sources. Availability is not checked here: a lease
+    file or control socket may only appear once dnsmasq or hostapd starts,
+    so the engine asks each source on every cycle.
+    """
+    factories = {
+        'neighbors': lambda: NeighborSource(interface=interface, subnet=subnet),
+        'stations': lambda: StationSource(interface=interface),
+        'leases': lambda: LeaseSource(path=leases_file),
+        'hostapd': lambda: HostapdSource(ctrl_dir=hostapd_ctrl_dir, interface=interface),
+    }
+    sources = []
+    for name in names:
+        if name not in factories:
+            logger.warning(f"Unknown discovery source {name!r}")
+            continue
+        sources.append(factories[name]())
+    return sources
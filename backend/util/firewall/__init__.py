@@ -0,0 +1,45 @@
+"""
+Captive firewall backed by a kernel set of authenticated client MACs.
+
+    from util.firewall import firewall
+    firewall.grant([mac])
+    firewall.revoke([mac])
+
+The backend (nftables set or ipset) is chosen by settings.FIREWALL_BACKEND;
+'auto' prefers nftables. `firewall` hands commands to the privileged worker
+(`manage.py runfirewall`) over settings.FIREWALL_SOCKET and returns without
+waiting; if the worker is not running they are applied in-process.
+"""
+from django.conf import settings
+from .base import ACCESS_MARK, FirewallBackend, FirewallError, normalize_macs
+from .ipset import IpsetBackend
+from .nft import NftablesBackend
+from .worker import Command, FirewallClient, FirewallWorker
+
+BACKENDS = {
+    NftablesBackend.name: NftablesBackend,
+    IpsetBackend.name: IpsetBackend,
+}
+
+
+def get_backend(name: str = None, interface: str = None) -> FirewallBackend:
+    """Instantiate the configured backend; 'auto' picks the first available"""
+    name = name or getattr(settings, 'FIREWALL_BACKEND', 'auto')
+    interface = interface or getattr(settings, 'CAPTIVE_INTERFACE', None)
+    if name != 'auto':
+        if name not in BACKENDS:
+            raise FirewallError(f"Unknown firewall backend {name!r}")
+        return BACKENDS[name](interface=interface)
+    for backend_cls in BACKENDS.values():
+        backend = backend_cls(interface=interface)
+        if backend.available():
+            return backend
+    return NftablesBackend(interface=interface)
+
+
+firewall = FirewallClient(settings.FIREWALL_SOCKET, fallback=get_backend())
+
+__all__ = [
+    'ACCESS_MARK', 'BACKENDS', 'Command', 'FirewallBackend', 'FirewallClient', 'FirewallError',
+    'FirewallWorker', 'IpsetBackend', 'NftablesBackend', 'firewall', 'get_backend', 'normalize_macs',
+]
@@ -0,0 +1,128 @@
+"""
+Shared pieces of the firewall backends.
+"""
+import logging
+import os
+import subprocess
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Packet mark given to traffic from authenticated clients; the iptables
+# captive chains let marked packets through
+ACCESS_MARK = 0x4e48
+
+
+class FirewallError(Exception):
+    """A kernel firewall update failed"""
+
+
+def normalize_macs(macs: Iterable[str]) -> List[str]:
+    """Lower-case, colon-separated and de-duplicated, preserving order"""
+    normalized = []
+    for mac in macs:
+        if not mac:
+            continue
+        digits = mac.strip().lower().replace('-', '').replace(':', '')
+        if len(digits) != 12:
+            raise FirewallError(f"Invalid MAC address: {mac!r}")
+        normalized.append(':'.join(digits[i:i + 2] for i in range(0, 12, 2)))
+    return list(dict.fromkeys(normalized))
+
+
+def run(cmd: List[str], input_text: Optional[str] = None, check: bool = True) -> subprocess.CompletedProcess:
+    """Run a firewall tool, through `sudo -n` when not already root"""
+    if os.geteuid() != 0:
+        cmd = ['sudo', '-n'] + cmd
+    try:
+        result = subprocess.run(cmd, input=input_text, capture_output=True, text=True)
+    except FileNotFoundError as e:
+        raise FirewallError(f"{cmd[0]} not found") from e
+    if check and result.returncode != 0:
+        raise FirewallError(f"{' '.join(cmd)} failed: {result.stderr.strip()}")
+    return result
+
+
+class FirewallBackend:
+    """
+    Keeps authenticated client MACs in a kernel set.
+
+    The packet path does one hash lookup in the set regardless of how many
+    clients are allowed; granting or revoking access is a single element
+    add/delete.
+    """
+
+    name = 'base'
+
+    def __init__(self, interface: Optional[str] = None, mark: int = ACCESS_MARK):
+        self.interface = interface
+        self.mark = mark
+        self._ready = False
+
+    def available(self) -> bool:
+        return True
+
+    def setup(self):
+        """Create the set and the rules that consult it (idempotent)"""
+        raise NotImplementedError
+
+    def ensure(self):
+        if not self._ready:
+            self.setup()
+            self._ready = True
+
+    def add(self, macs: List[str], timeout: Optional[int] = None):
+        """Add elements; with `timeout` (seconds) the kernel drops them when it lapses"""
+        raise NotImplementedError
+
+    def delete(self, macs: List[str]):
+        raise NotImplementedError
+
+    def list(self) -> Set[str]:
+        """MACs currently in the kernel set"""
+        raise NotImplementedError
+
+    def update(self, grants: Dict[Optional[int], List[str]], revokes: List[str]):
+        """
+        Apply revocations and {timeout: macs} grants of normalized MACs.
+        Backends override this to make the whole batch one transaction.
+        """
+        self.ensure()
+        if revokes:
+            self.delete(revokes)
+        for timeout, macs in grants.items():
+            self.add(macs, timeout=timeout)
+
+    def grant(self, macs: Iterable[str], timeout: Optional[int] = None):
+        """
+        Allow the clients; with `timeout` (seconds) access expires in the
+        kernel without anything having to revoke it. Re-granting a client
+        replaces its remaining time.
+        """
+        macs = normalize_macs(macs)
+        if timeout is not None and timeout <= 0:
+            return
+        if macs:
+            self.ensure()
+            self.add(macs, timeout=int(timeout) if timeout is not None else None)
+            expiry = f" for {int(timeout)}s" if timeout is not None else ""
+            logger.info(f"Granted access to {len(macs)} client(s){expiry} via {self.name}")
+
+    def revoke(self, macs: Iterable[str]):
+        macs = normalize_macs(macs)
+        if macs:
+            self.ensure()
+            self.delete(macs)
+            logger.info(f"Revoked access from {len(macs)} client(s) via {self.name}")
+
+    def install_iptables_hooks(self, match: List[str]):
+        """Let matching packets past the CAPTIVE_PORTAL/AUTH_REDIRECT chains"""
+        for table, chain, target in (('filter', 'CAPTIVE_PORTAL', 'ACCEPT'), ('nat', 'AUTH_REDIRECT', 'RETURN')):
+            rule = [chain] + match + ['-j', target]
+            if run(['iptables', '-w', '-t', table, '-C'] + rule, check=False).returncode != 0:
+                result = run(['iptables', '-w', '-t', table, '-I'] + rule[:1] + ['1'] + rule[1:], check=False)
+                if result.returncode != 0:
+                    logger.warning(f"Could not hook {chain} into the access set: {result.stderr.strip()}")
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.interface}>"
@@ -0,0 +1,61 @@
+"""
+ipset backend: authenticated MACs in a `hash:mac` set matched by the
+iptables captive chains with `-m set --match-set`. Batches are applied
+with one `ipset restore`.
+
+The set is created with timeout support (default 0, i.e. permanent), so
+entries can carry their own lifetime; under -exist re-adding an entry
+resets it.
+"""
+import shutil
+from typing import Dict, List, Optional, Set
+from .base import ACCESS_MARK, FirewallBackend, run
+
+
+class IpsetBackend(FirewallBackend):
+    name = 'ipset'
+
+    def __init__(self, interface: Optional[str] = None, mark: int = ACCESS_MARK,
+                 set_name: str = 'nethub_allowed'):
+        super().__init__(interface, mark)
+        self.set_name = set_name
+
+    def available(self) -> bool:
+        return shutil.which('ipset') is not None
+
+    def restore(self, lines: List[str]):
+        run(['ipset', 'restore', '-exist'], input_text='\n'.join(lines) + '\n')
+
+    def setup(self):
+        self.restore([f"create {self.set_name} hash:mac timeout 0"])
+        self.install_iptables_hooks(['-m', 'set', '--match-set', self.set_name, 'src'])
+
+    def _add_lines(self, macs: List[str], timeout: Optional[int] = None) -> List[str]:
+        suffix = f" timeout {timeout}" if timeout is not None else ""
+        return [f"add {self.set_name} {mac}{suffix}" for mac in macs]
+
+    def _delete_lines(self, macs: List[str]) -> List[str]:
+        # -exist makes deleting an absent element a no-op
+        return [f"del {self.set_name} {mac}" for mac in macs]
+
+    def add(self, macs: List[str], timeout: Optional[int] = None):
+        self.restore(self._add_lines(macs, timeout))
+
+    def delete(self, macs: List[str]):
+        self.restore(self._delete_lines(macs))
+
+    def update(self, grants: Dict[Optional[int], List[str]], revokes: List[str]):
+        self.ensure()
+        lines = self._delete_lines(revokes)
+        for timeout, macs in grants.items():
+            lines += self._add_lines(macs, timeout)
+        if lines:
+            self.restore(lines)
+
+    def list(self) -> Set[str]:
+        output = run(['ipset', 'save', self.set_name]).stdout
+        return {
+            line.split()[2].lower()
+            for line in output.splitlines()
+            if line.startswith('add ') and len(line.split()) >= 3
+        }
@@ -0,0 +1,113 @@
+"""
+nftables backend: authenticated MACs live in a named set of an `inet`
+table. A prerouting chain (before NAT) marks packets whose source MAC is
+in the set, and the iptables captive chains accept marked packets.
+
+Commands go through libnftables (python `nftables` module) when it is
+installed and we are root, otherwise through `nft -f -`. Either way a
+whole batch of elements is one netlink transaction.
+
+The set carries the `timeout` flag, so elements may be added with their
+own lifetime and the kernel garbage-collects them when it runs out.
+Elements added without one stay until deleted. A set created before the
+flag existed has to be deleted once (`nft delete table inet nethub`) to
+pick it up.
+"""
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Set
+from .base import ACCESS_MARK, FirewallBackend, FirewallError, logger, run
+
+try:
+    import nftables
+except ImportError:
+    nftables = None
+
+
+class NftablesBackend(FirewallBackend):
+    name = 'nftables'
+
+    def __init__(self, interface: Optional[str] = None, mark: int = ACCESS_MARK,
+                 table: str = 'nethub', set_name: str = 'allowed_macs'):
+        super().__init__(interface, mark)
+        self.table = table
+        self.set_name = set_name
+        self._nft = None
+
+    def available(self) -> bool:
+        return nftables is not None or shutil.which('nft') is not None
+
+    def execute(self, script: str, json_output: bool = False) -> str:
+        """Run an nft script as one transaction; returns its output"""
+        if nftables is not None and os.geteuid() == 0:
+            if self._nft is None:
+                self._nft = nftables.Nftables()
+            self._nft.set_json_output(json_output)
+            rc, output, error = self._nft.cmd(script)
+            if rc != 0:
+                raise FirewallError(f"nft failed: {error.strip()}")
+            return output
+        if json_output:
+            # Single listing command; `-j -f` would expect a JSON script
+            return run(['nft', '-j'] + script.split()).stdout
+        return run(['nft', '-f', '-'], input_text=script).stdout
+
+    @property
+    def _set_ref(self) -> str:
+        return f"inet {self.table} {self.set_name}"
+
+    def setup(self):
+        match = f'iifname "{self.interface}" ' if self.interface else ''
+        self.execute('\n'.join([
+            f"add table inet {self.table}",
+            f"add set {self._set_ref} {{ type ether_addr; flags timeout; }}",
+            f"add chain inet {self.table} mark_access {{ type filter hook prerouting priority -150; policy accept; }}",
+            f"flush chain inet {self.table} mark_access",
+            f"add rule inet {self.table} mark_access {match}ether saddr @{self.set_name} meta mark set {self.mark:#x}",
+        ]))
+        self.install_iptables_hooks(['-m', 'mark', '--mark', f'{self.mark:#x}'])
+
+    def _add_lines(self, macs: List[str], timeout: Optional[int] = None) -> List[str]:
+        if timeout is None:
+            return [f"add element {self._set_ref} {{ {', '.join(macs)} }}"]
+        # `add` keeps an existing element's old timeout, so replace it
+        elements = ', '.join(f"{mac} timeout {timeout}s" for mac in macs)
+        return self._delete_lines(macs) + [f"add element {self._set_ref} {{ {elements} }}"]
+
+    def _delete_lines(self, macs: List[str]) -> List[str]:
+        # Deleting a missing element fails the transaction; adding first
+        # makes the delete safe whether or not the element was there
+        return [
+            f"add element {self._set_ref} {{ {', '.join(macs)} }}",
+            f"delete element {self._set_ref} {{ {', '.join(macs)} }}",
+        ]
+
+    def add(self, macs: List[str], timeout: Optional[int] = None):
+        self.execute('\n'.join(self._add_lines(macs, timeout)))
+
+    def delete(self, macs: List[str]):
+        self.execute('\n'.join(self._delete_lines(macs)))
+
+    def update(self, grants: Dict[Optional[int], List[str]], revokes: List[str]):
+        self.ensure()
+        lines = self._delete_lines(revokes) if revokes else []
+        for timeout, macs in grants.items():
+            lines += self._add_lines(macs, timeout)
+        if lines:
+            self.execute('\n'.join(lines))
+
+    def list(self) -> Set[str]:
+        output = self.execute(f"list set {self._set_ref}", json_output=True)
+        macs = set()
+        try:
+            for item in json.loads(output).get('nftables', []):
+                for element in item.get('set', {}).get('elem', []):
+                    # Plain value, or {"elem": {"val": ..., "timeout": ...}} with flags
+                    if isinstance(element, dict):
+                        element = element.get('elem', {}).get('val')
+                    if isinstance(element, str):
+                        macs.add(element.lower())
+        except ValueError as e:
+            logger.error(f"Unreadable nft set listing: {e}")
+        return macs
@@ -0,0 +1,119 @@
+"""
+Kernel/database drift reconciliation for the access set.
+
+The database says who should be allowed: authenticated, unblocked devices
+(permanently) and devices with active paid access (for the time they have
+left). The reconciler dumps the kernel set, diffs it against that in
+memory and applies only the difference as one backend update, so a
+restarted worker or a half-applied batch heals without reloading every
+client.
+
+An entry is removed only when it shows up as extra on two consecutive
+passes. A view grants before it saves the device, and a single pass
+landing in between must not revoke the client it just let in.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set
+from django.db import close_old_connections
+from devices.models import Device
+from payments.access import active_grants, expire_access
+from util.metrics import MetricsRegistry, registry
+from .base import FirewallBackend, FirewallError, normalize_macs
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL = 30
+
+
+def _normalized(mac: str) -> Optional[str]:
+    try:
+        macs = normalize_macs([mac])
+    except FirewallError:
+        logger.warning(f"Skipping invalid MAC address {mac!r}")
+        return None
+    return macs[0] if macs else None
+
+
+@dataclass
+class Drift:
+    missing: Dict[str, Optional[int]] = field(default_factory=dict)
+    extra: Set[str] = field(default_factory=set)
+    # Extra on this pass only; removed next time if still there
+    pending: Set[str] = field(default_factory=set)
+    seconds: float = 0.0
+
+    def __bool__(self):
+        return bool(self.missing or self.extra)
+
+
+class Reconciler:
+    """Bring the kernel set in line with the database, touching only the diff"""
+
+    def __init__(self, backend: FirewallBackend, metrics: MetricsRegistry = registry):
+        self.backend = backend
+        self._suspects: Set[str] = set()
+
+        self.drift = metrics.counter('nethub_firewall_drift_total', 'Access set entries repaired', ['kind'])
+        self.runs = metrics.counter('nethub_firewall_reconcile_total', 'Reconciliation passes')
+        self.errors = metrics.counter('nethub_firewall_reconcile_errors_total', 'Reconciliation passes that failed')
+        self.seconds = metrics.histogram('nethub_firewall_reconcile_seconds', 'Duration of a reconciliation pass')
+        self.apply_seconds = metrics.histogram('nethub_firewall_reconcile_apply_seconds',
+                                               'Time spent applying a reconciliation diff')
+        self.set_size = metrics.gauge('nethub_firewall_set_size', 'Entries in the kernel access set')
+
+    def desired(self) -> Dict[str, Optional[int]]:
+        """{mac: timeout or None for permanent} the kernel set should hold"""
+        # Rows whose time ran out must not be read as still authenticated
+        expire_access(revoke=False)
+        wanted: Dict[str, Optional[int]] = {}
+        # Paid access keeps its expiry even though the device is marked authenticated
+        for mac, timeout in active_grants().items():
+            mac = _normalized(mac)
+            if mac and timeout > 0:
+                wanted[mac] = timeout
+        macs = Device.objects.filter(is_authenticated=True).exclude(auth_status='blocked') \
+            .values_list('mac_address', flat=True)
+        for mac in filter(None, map(_normalized, macs)):
+            wanted.setdefault(mac, None)
+        return wanted
+
+    def diff(self, kernel: Set[str], wanted: Dict[str, Optional[int]]) -> Drift:
+        extra = kernel - set(wanted)
+        drift = Drift(
+            missing={mac: timeout for mac, timeout in wanted.items() if mac not in kernel},
+            extra=extra & self._suspects,
+            pending=extra - self._suspects,
+        )
+        self._suspects = set(drift.pending)
+        return drift
+
+    def run_once(self) -> Drift:
+        started = time.perf_counter()
+        try:
+            close_old_connections()
+            self.backend.ensure()
+            kernel = self.backend.list()
+            drift = self.diff(kernel, self.desired())
+            if drift:
+                grants: Dict[Optional[int], list] = {}
+                for mac, timeout in drift.missing.items():
+                    grants.setdefault(timeout, []).append(mac)
+                apply_started = time.perf_counter()
+                self.backend.update(grants, sorted(drift.extra))
+                self.apply_seconds.observe(time.perf_counter() - apply_started)
+        except Exception:
+            self.errors.inc()
+            raise
+
+        drift.seconds = time.perf_counter() - started
+        self.runs.inc()
+        self.seconds.observe(drift.seconds)
+        self.drift.inc(len(drift.missing), kind='missing')
+        self.drift.inc(len(drift.extra), kind='extra')
+        self.set_size.set(len(kernel) + len(drift.missing) - len(drift.extra))
+        if drift:
+            logger.warning(f"Access set drift repaired: {len(drift.missing)} missing, "
+                           f"{len(drift.extra)} extra ({drift.seconds:.3f}s)")
+        return drift
@@ -0,0 +1,296 @@
+"""
+Privileged firewall worker and the client web processes use to reach it.
+
+The worker (`manage.py runfirewall`, run as root) owns the kernel set.
+Clients send newline-delimited JSON commands over a UNIX socket:
+
+    {"id": "...", "op": "grant", "macs": ["aa:bb:..."], "timeout": 3600}
+    {"id": "...", "op": "revoke", "macs": ["aa:bb:..."]}
+
+Commands arriving within `window` seconds of the first are coalesced (the
+last command for a MAC wins) and handed to the backend as one update, so a
+burst of grants costs one kernel transaction. Every command is
+acknowledged on its connection once its batch has been applied:
+
+    {"id": "...", "ok": true}  or  {"id": "...", "ok": false, "error": "..."}
+
+Clients do not wait for the acknowledgement unless asked to, so a request
+never blocks on sudo or the netfilter lock.
+
+Given reconcilers (firewall drift, bandwidth shaping), the worker runs
+them at startup, every `reconcile_interval` seconds and straight after a
+batch with timed (paid) grants, on the same thread as the batches so
+kernel updates never interleave.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import shutil
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from util.metrics import MetricsRegistry, registry
+from .base import FirewallBackend, FirewallError, normalize_macs
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW = 0.05
+MAX_BATCH = 5000
+ACK_TIMEOUT = 5.0
+# Pending connections the socket holds while a burst is being accepted
+BACKLOG = 1024
+OPERATIONS = ('grant', 'revoke')
+
+
+@dataclass
+class Command:
+    op: str
+    macs: List[str]
+    timeout: Optional[int] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @classmethod
+    def parse(cls, line: bytes) -> 'Command':
+        try:
+            data = json.loads(line)
+            op = data['op']
+            macs = normalize_macs(data.get('macs') or [])
+            timeout = data.get('timeout')
+            timeout = int(timeout) if timeout is not None else None
+        except (ValueError, KeyError, TypeError, FirewallError) as e:
+            raise ValueError(f"Malformed command: {e}")
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown operation {op!r}")
+        if timeout is not None and timeout <= 0:
+            # It would fail the whole coalesced batch, not just this command
+            raise ValueError(f"Timeout must be positive, not {timeout}")
+        return cls(op=op, macs=macs, timeout=timeout, id=str(data.get('id') or uuid.uuid4().hex))
+
+    def encode(self) -> bytes:
+        data = {'id': self.id, 'op': self.op, 'macs': self.macs}
+        if self.timeout is not None:
+            data['timeout'] = self.timeout
+        return json.dumps(data).encode() + b'\n'
+
+
+def coalesce(commands: Iterable[Command]) -> Tuple[Dict[Optional[int], List[str]], List[str]]:
+    """Reduce commands to ({timeout: macs to grant}, macs to revoke)"""
+    final: 'OrderedDict[str, Tuple[str, Optional[int]]]' = OrderedDict()
+    for command in commands:
+        for mac in command.macs:
+            final.pop(mac, None)
+            final[mac] = (command.op, command.timeout)
+
+    grants: Dict[Optional[int], List[str]] = {}
+    revokes = []
+    for mac, (op, timeout) in final.items():
+        if op == 'grant':
+            grants.setdefault(timeout, []).append(mac)
+        else:
+            revokes.append(mac)
+    return grants, revokes
+
+
+class FirewallWorker:
+    """Serve grant/revoke commands, applying them in coalesced batches"""
+
+    def __init__(self, backend: FirewallBackend, socket_path, window: float = BATCH_WINDOW,
+                 max_batch: int = MAX_BATCH, group: Optional[str] = None,
+                 reconcilers: Iterable = (), reconcile_interval: float = 0,
+                 metrics: MetricsRegistry = registry):
+        self.backend = backend
+        self.socket_path = str(socket_path)
+        self.group = group
+        self.window = window
+        self.max_batch = max_batch
+        self.reconcilers = list(reconcilers)
+        self.reconcile_interval = reconcile_interval
+        self.queue: asyncio.Queue = None
+        self._resync: asyncio.Event = None
+        # Kernel updates run off the loop, one batch at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='firewall')
+
+        self.batch_seconds = metrics.histogram('nethub_firewall_batch_seconds', 'Time to apply a command batch')
+        self.batch_commands = metrics.counter('nethub_firewall_commands_total', 'Commands received', ['op'])
+        self.batch_errors = metrics.counter('nethub_firewall_batch_errors_total', 'Command batches that failed')
+
+    def apply(self, commands: List[Command]):
+        grants, revokes = coalesce(commands)
+        self.backend.update(grants, revokes)
+        logger.info(f"Applied {len(commands)} command(s): "
+                    f"{sum(map(len, grants.values()))} grant(s), {len(revokes)} revoke(s)")
+
+    async def _collect(self) -> List[Tuple[Command, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            error = None
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(self._executor, self.apply, [command for command, _ in batch])
+            except Exception as e:
+                self.batch_errors.inc()
+                logger.error(f"Firewall batch failed: {e}")
+                error = str(e)
+            self.batch_seconds.observe(time.perf_counter() - started)
+            if any(command.op == 'grant' and command.timeout is not None for command, _ in batch):
+                # New paid access: shape it now rather than at the next interval
+                self._resync.set()
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(error)
+
+    async def _acknowledge(self, writer: asyncio.StreamWriter, command_id: str, future: asyncio.Future):
+        error = await future
+        reply = {'id': command_id, 'ok': error is None}
+        if error is not None:
+            reply['error'] = error
+        try:
+            writer.write(json.dumps(reply).encode() + b'\n')
+            await writer.drain()
+        except (ConnectionError, RuntimeError):
+            # Fire-and-forget clients hang up without reading the ack
+            pass
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        acks = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    command = Command.parse(line)
+                except ValueError as e:
+                    writer.write(json.dumps({'ok': False, 'error': str(e)}).encode() + b'\n')
+                    continue
+                self.batch_commands.inc(op=command.op)
+                future = loop.create_future()
+                await self.queue.put((command, future))
+                acks.append(asyncio.ensure_future(self._acknowledge(writer, command.id, future)))
+            await asyncio.gather(*acks)
+        finally:
+            writer.close()
+
+    async def reconcile_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._resync.clear()
+            for reconciler in self.reconcilers:
+                try:
+                    await loop.run_in_executor(self._executor, reconciler.run_once)
+                except Exception as e:
+                    logger.error(f"{reconciler.__class__.__name__} failed: {e}")
+            try:
+                await asyncio.wait_for(self._resync.wait(), self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        self.queue = asyncio.Queue()
+        self._resync = asyncio.Event()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.backend.ensure)
+
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # Only root and the web server's group may issue commands; the umask
+        # keeps the socket closed to others from the moment it is bound
+        umask = os.umask(0o117)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path, backlog=BACKLOG)
+        finally:
+            os.umask(umask)
+        if self.group:
+            shutil.chown(self.socket_path, group=self.group)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Firewall worker ({self.backend.name}) listening on {self.socket_path}")
+        tasks = [self.flush_loop()]
+        if self.reconcilers and self.reconcile_interval:
+            tasks.append(self.reconcile_loop())
+        try:
+            async with server:
+                await asyncio.gather(*tasks)
+        finally:
+            self._executor.shutdown(wait=False)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class FirewallClient:
+    """
+    Drop-in for a backend's grant/revoke that hands commands to the worker.
+
+    When the worker is not running the command is applied in-process by
+    `fallback` (if given), which is what the views did before the worker
+    existed.
+    """
+
+    def __init__(self, socket_path, fallback: Optional[FirewallBackend] = None,
+                 ack_timeout: float = ACK_TIMEOUT):
+        self.socket_path = str(socket_path)
+        self.fallback = fallback
+        self.ack_timeout = ack_timeout
+
+    @property
+    def name(self) -> str:
+        return 'worker'
+
+    def send(self, command: Command, wait: bool = False) -> bool:
+        """Queue a command; with `wait`, block until the batch is applied"""
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.ack_timeout)
+                sock.connect(self.socket_path)
+                sock.sendall(command.encode())
+                if not wait:
+                    return True
+                sock.shutdown(socket.SHUT_WR)
+                reply = json.loads(sock.makefile('rb').readline() or b'{}')
+        except (OSError, ValueError) as e:
+            if self.fallback is None:
+                raise FirewallError(f"Firewall worker unavailable: {e}")
+            logger.warning(f"Firewall worker unavailable ({e}); applying {command.op} in-process")
+            getattr(self.fallback, command.op)(command.macs, **(
+                {'timeout': command.timeout} if command.op == 'grant' else {}))
+            return True
+        if not reply.get('ok'):
+            raise FirewallError(reply.get('error', 'No acknowledgement from the firewall worker'))
+        return True
+
+    def grant(self, macs: Iterable[str], timeout: Optional[int] = None, wait: bool = False) -> bool:
+        macs = normalize_macs(macs)
+        if not macs or (timeout is not None and timeout <= 0):
+            return False
+        # Round up: a sub-second timeout must not become 0
+        return self.send(Command('grant', macs, math.ceil(timeout) if timeout is not None else None), wait)
+
+    def revoke(self, macs: Iterable[str], wait: bool = False) -> bool:
+        macs = normalize_macs(macs)
+        if not macs:
+            return False
+        return self.send(Command('revoke', macs), wait)
+
+    def __repr__(self):
+        return f"<FirewallClient {self.socket_path}>"
@@ -0,0 +1,253 @@
+"""
+Client hostname resolution that never holds up a request.
+
+Lease hostnames from dnsmasq come first: they are what the client called
+itself and are answered from the in-memory lease index. Otherwise the
+answer comes from a TTL cache of earlier PTR lookups, positive entries
+living for the record's TTL (bounded) and failures for NEGATIVE_TTL.
+On a miss, a PTR query is sent asynchronously over UDP with a strict
+deadline; request handlers wait at most REQUEST_DEADLINE for it and get
+None otherwise, while the answer still lands in the cache for next time.
+
+Queries run on one background event loop per process, so a slow or dead
+resolver costs a pending datagram, not a blocked thread.
+"""
+import asyncio
+import concurrent.futures
+import ipaddress
+import logging
+import random
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from hotspotmanager.ap_utils.leases import LeaseIndex
+
+logger = logging.getLogger(__name__)
+
+RESOLV_CONF = "/etc/resolv.conf"
+DNS_PORT = 53
+# Whole PTR lookup, across every nameserver
+QUERY_TIMEOUT = 1.0
+# Longest a synchronous caller waits for a lookup that is not cached
+REQUEST_DEADLINE = 0.005
+POSITIVE_TTL = 3600
+MIN_POSITIVE_TTL = 60
+NEGATIVE_TTL = 300
+MAX_ENTRIES = 4096
+
+MISS = object()
+
+DNS_HEADER = struct.Struct("!HHHHHH")
+TYPE_PTR = 12
+CLASS_IN = 1
+RCODE_NXDOMAIN = 3
+
+
+def nameservers(path: str = RESOLV_CONF) -> List[str]:
+    servers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    servers.append(parts[1])
+    except OSError:
+        pass
+    return servers or ['127.0.0.1']
+
+
+def ptr_query(ip_address: str, query_id: int) -> bytes:
+    labels = ipaddress.ip_address(ip_address).reverse_pointer.split('.')
+    qname = b''.join(bytes([len(label)]) + label.encode('ascii') for label in labels) + b'\0'
+    return DNS_HEADER.pack(query_id, 0x0100, 1, 0, 0, 0) + qname + struct.pack("!HH", TYPE_PTR, CLASS_IN)
+
+
+def _read_name(packet: bytes, offset: int) -> Tuple[str, int]:
+    """Decode a possibly compressed name; returns (name, offset after it)"""
+    labels = []
+    end = None
+    for _ in range(128):
+        length = packet[offset]
+        if length & 0xc0 == 0xc0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3f) << 8) | packet[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return '.'.join(labels), end if end is not None else offset
+        labels.append(packet[offset:offset + length].decode('ascii', 'replace'))
+        offset += length
+    raise ValueError("DNS name compression loop")
+
+
+def parse_ptr_response(packet: bytes, query_id: int) -> Tuple[Optional[str], int]:
+    """(hostname or None, ttl) from a PTR response"""
+    response_id, flags, questions, answers, _, _ = DNS_HEADER.unpack_from(packet)
+    if response_id != query_id or not flags & 0x8000:
+        raise ValueError("Not a response to this query")
+    if flags & 0x000f:
+        return None, NEGATIVE_TTL
+    offset = DNS_HEADER.size
+    for _ in range(questions):
+        _, offset = _read_name(packet, offset)
+        offset += 4
+    for _ in range(answers):
+        _, offset = _read_name(packet, offset)
+        rtype, _, ttl, length = struct.unpack_from("!HHIH", packet, offset)
+        offset += 10
+        if rtype == TYPE_PTR:
+            name, _ = _read_name(packet, offset)
+            return name.rstrip('.') or None, ttl
+        offset += length
+    return None, NEGATIVE_TTL
+
+
+class _PtrProtocol(asyncio.DatagramProtocol):
+    def __init__(self, query_id: int, future: asyncio.Future):
+        self.query_id = query_id
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if self.future.done():
+            return
+        try:
+            self.future.set_result(parse_ptr_response(data, self.query_id))
+        except (ValueError, struct.error, IndexError):
+            # Stray or malformed datagram; keep waiting for the real answer
+            pass
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class PtrResolver:
+    """Minimal asynchronous PTR client over UDP"""
+
+    def __init__(self, servers: Optional[List[str]] = None, timeout: float = QUERY_TIMEOUT):
+        self.servers = servers or nameservers()
+        self.timeout = timeout
+
+    async def _ask(self, server: str, ip_address: str, timeout: float) -> Tuple[Optional[str], int]:
+        loop = asyncio.get_running_loop()
+        query_id = random.getrandbits(16)
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _PtrProtocol(query_id, future), remote_addr=(server, DNS_PORT))
+        try:
+            transport.sendto(ptr_query(ip_address, query_id))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            transport.close()
+
+    async def resolve(self, ip_address: str) -> Tuple[Optional[str], int]:
+        """(hostname or None, seconds to cache the answer)"""
+        deadline = time.monotonic() + self.timeout
+        for index, server in enumerate(self.servers):
+            # Split what is left of the deadline over the remaining servers
+            remaining = (deadline - time.monotonic()) / (len(self.servers) - index)
+            if remaining <= 0:
+                break
+            try:
+                return await self._ask(server, ip_address, remaining)
+            except (asyncio.TimeoutError, OSError):
+                continue
+        return None, NEGATIVE_TTL
+
+
+class HostnameCache:
+    """IP -> hostname with per-entry TTLs; None values are negative entries"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ip_address: str):
+        with self._lock:
+            entry = self._entries.get(ip_address)
+            if entry is None:
+                return MISS
+            hostname, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[ip_address]
+                return MISS
+            return hostname
+
+    def put(self, ip_address: str, hostname: Optional[str], ttl: float):
+        with self._lock:
+            self._entries[ip_address] = (hostname, time.monotonic() + ttl)
+            self._entries.move_to_end(ip_address)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class HostnameService:
+    """Lease hostnames first, then cached or deadline-bound PTR lookups"""
+
+    def __init__(self, leases: LeaseIndex, resolver: Optional[PtrResolver] = None,
+                 cache: Optional[HostnameCache] = None, deadline: float = REQUEST_DEADLINE):
+        self.leases = leases
+        self.resolver = resolver or PtrResolver()
+        self.cache = cache or HostnameCache()
+        self.deadline = deadline
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    def local(self, ip_address: str):
+        """Lease hostname or cached answer without any network I/O, else MISS"""
+        hostname = self.leases.hostname(ip_address=ip_address)
+        if hostname:
+            return hostname
+        return self.cache.get(ip_address)
+
+    async def resolve(self, ip_address: str) -> Optional[str]:
+        """For code already on an event loop"""
+        hostname = self.local(ip_address)
+        if hostname is not MISS:
+            return hostname
+        hostname, ttl = await self.resolver.resolve(ip_address)
+        if hostname:
+            ttl = min(max(ttl, MIN_POSITIVE_TTL), POSITIVE_TTL)
+        self.cache.put(ip_address, hostname, ttl)
+        return hostname
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='hostname-resolver', daemon=True).start()
+            self._loop = loop
+        return self._loop
+
+    def _schedule(self, ip_address: str) -> concurrent.futures.Future:
+        with self._lock:
+            future = self._inflight.get(ip_address)
+            if future is None or future.done():
+                future = asyncio.run_coroutine_threadsafe(self.resolve(ip_address), self._background_loop())
+                self._inflight[ip_address] = future
+                future.add_done_callback(lambda _: self._inflight.pop(ip_address, None))
+            return future
+
+    def lookup(self, ip_address: str, wait: Optional[float] = None) -> Optional[str]:
+        """Hostname if known within `wait` seconds (default REQUEST_DEADLINE), else None"""
+        if not ip_address:
+            return None
+        hostname = self.local(ip_address)
+        if hostname is not MISS:
+            return hostname
+        future = self._schedule(ip_address)
+        try:
+            return future.result(timeout=self.deadline if wait is None else wait)
+        except concurrent.futures.TimeoutError:
+            return None
+        except Exception as e:
+            logger.debug(f"PTR lookup for {ip_address} failed: {e}")
+            return None
+
+
+hostnames = HostnameService(LeaseIndex(settings.DNSMASQ_LEASES_FILE))
@@ -0,0 +1,175 @@
+"""
+Per-process IP -> MAC resolution cache.
+
+Every process keeps its own copy: the scanner daemon's is filled from its
+scans and neighbor events, and each web worker fills its own on a miss
+with one netlink dump of the kernel neighbor table (no fork), cached
+wholesale, so later requests from any known client are a dictionary
+lookup. The kernel table is the shared source, not this cache. Failed
+resolutions are cached for a short time as well, so a burst of requests
+from an unresolvable address does not repeat the slow path.
+
+Cached answers are for display and enrichment only. DHCP may hand an IP
+to another device well within POSITIVE_TTL, so decisions that grant
+access or bill a client use verify_mac(), which always reads the kernel
+table. Neither single-IP path forks ping: a request waits at most
+REQUEST_PROBE_TIMEOUT for a raw ARP reply.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from util.arp_probe import ArpProber
+from util.neighbors import NeighborTable
+
+POSITIVE_TTL = 300
+NEGATIVE_TTL = 10
+MAX_ENTRIES = 4096
+# Longest a request handler waits for an ARP reply on a neighbor table miss
+REQUEST_PROBE_TIMEOUT = 0.2
+
+# Returned by MacCache.get() when nothing (not even a negative entry) is cached
+MISS = object()
+
+
+class MacCache:
+    """Thread-safe, TTL-bounded IP -> MAC map with negative caching"""
+
+    def __init__(self, ttl: float = POSITIVE_TTL, negative_ttl: float = NEGATIVE_TTL,
+                 max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ip_address: str):
+        """Return the cached MAC, None for a cached miss, or MISS"""
+        with self._lock:
+            entry = self._entries.get(ip_address)
+            if entry is None:
+                return MISS
+            mac, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[ip_address]
+                return MISS
+            return mac
+
+    def put(self, ip_address: str, mac: Optional[str]):
+        """Cache a resolution; a falsy `mac` records a negative entry"""
+        ttl = self.ttl if mac else self.negative_ttl
+        with self._lock:
+            self._store(ip_address, mac.lower() if mac else None, ttl)
+
+    def update(self, mapping: Dict[str, str]):
+        """Bulk-fill positive entries, e.g. from a neighbor table dump"""
+        with self._lock:
+            for ip_address, mac in mapping.items():
+                if mac:
+                    self._store(ip_address, mac.lower(), self.ttl)
+
+    def _store(self, ip_address: str, mac: Optional[str], ttl: float):
+        self._entries[ip_address] = (mac, time.monotonic() + ttl)
+        self._entries.move_to_end(ip_address)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, ip_addresses: Optional[Iterable[str]] = None):
+        """Drop the given IPs, or everything when called without arguments"""
+        with self._lock:
+            if ip_addresses is None:
+                self._entries.clear()
+                return
+            if isinstance(ip_addresses, str):
+                ip_addresses = [ip_addresses]
+            for ip_address in ip_addresses:
+                self._entries.pop(ip_address, None)
+
+    def invalidate_mac(self, mac: str):
+        """Drop every IP currently mapped to `mac`"""
+        mac = mac.lower()
+        with self._lock:
+            for ip_address in [ip for ip, (m, _) in self._entries.items() if m == mac]:
+                del self._entries[ip_address]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+mac_cache = MacCache()
+neighbor_table = NeighborTable()
+
+
+def refresh_from_neighbors(table: NeighborTable = neighbor_table) -> Dict[str, str]:
+    """Load every resolved neighbor entry into the cache"""
+    mapping = {n.ip: n.mac for n in table.dump()}
+    mac_cache.update(mapping)
+    return mapping
+
+
+def request_prober(interface: Optional[str] = None) -> ArpProber:
+    """Raw ARP only, with a short deadline: never blocks a request on ping"""
+    return ArpProber(interface=interface, timeout=REQUEST_PROBE_TIMEOUT, ping_fallback=False)
+
+
+def resolve_macs(ip_addresses: Iterable[str], interface: Optional[str] = None,
+                 probe: bool = True, prober: Optional[ArpProber] = None) -> Dict[str, Optional[str]]:
+    """
+    Resolve a batch of IPs to MACs, reading the cache first.
+
+    Misses are answered from one kernel neighbor table dump (no fork),
+    which is cached wholesale. Whatever is still unknown is ARP-probed
+    concurrently, so the whole batch costs at most one probe timeout.
+    Every outcome, positive or negative, is cached.
+    """
+    results = {}
+    missing = []
+    for ip_address in dict.fromkeys(ip for ip in ip_addresses if ip):
+        mac = mac_cache.get(ip_address)
+        if mac is MISS:
+            missing.append(ip_address)
+        else:
+            results[ip_address] = mac
+    if not missing:
+        return results
+
+    known = refresh_from_neighbors()
+    unresolved = [ip for ip in missing if ip not in known]
+    results.update({ip: known[ip] for ip in missing if ip in known})
+
+    if unresolved and probe:
+        probed = (prober or ArpProber(interface=interface)).resolve(unresolved)
+        mac_cache.update({ip: mac for ip, mac in probed.items() if mac})
+        results.update(probed)
+
+    for ip_address in unresolved:
+        if not results.get(ip_address):
+            results[ip_address] = None
+            mac_cache.put(ip_address, None)
+    return results
+
+
+def resolve_mac(ip_address: str, interface: Optional[str] = None, probe: bool = True) -> Optional[str]:
+    """Resolve a single IP to a MAC for display; see resolve_macs()"""
+    if not ip_address:
+        return None
+    return resolve_macs([ip_address], interface=interface, probe=probe,
+                        prober=request_prober(interface)).get(ip_address)
+
+
+def verify_mac(ip_address: str, interface: Optional[str] = None) -> Optional[str]:
+    """
+    MAC currently holding `ip_address`, read from the kernel and never from
+    the cache; for granting access or recording payments. The cache is
+    corrected from the same dump on the way.
+    """
+    if not ip_address:
+        return None
+    known = refresh_from_neighbors()
+    mac = known.get(ip_address)
+    if mac is None:
+        mac_cache.invalidate(ip_address)
+        mac = request_prober(interface).resolve([ip_address]).get(ip_address)
+        if mac:
+            mac_cache.put(ip_address, mac)
+    return mac.lower() if mac else None
@@ -0,0 +1,40 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from util.oui import INDEX_FILE, SOURCES, oui_index, parse_registry, write_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the OUI vendor index from the IEEE MA-L/MA-M/MA-S registries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*',
+                            help="Registry CSVs, IEEE text dumps or Wireshark manuf files, as paths or URLs "
+                                 "(default: the IEEE CSV downloads); later sources win on conflicts")
+        parser.add_argument('--output', default=str(INDEX_FILE))
+
+    def read(self, source: str) -> str:
+        if source.startswith(('http://', 'https://')):
+            try:
+                response = requests.get(source, timeout=60)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                raise CommandError(f"Downloading {source} failed: {e}")
+            return response.content.decode('utf-8', 'replace')
+        try:
+            with open(source, encoding='utf-8', errors='replace') as f:
+                return f.read()
+        except OSError as e:
+            raise CommandError(str(e))
+
+    def handle(self, *args, **options):
+        entries = []
+        for source in options['sources'] or SOURCES:
+            rows = parse_registry(self.read(source))
+            self.stdout.write(f"{source}: {len(rows)} assignment(s)")
+            entries += rows
+        if not entries:
+            raise CommandError("No registry entries found; index left unchanged")
+
+        count = write_index(options['output'], entries)
+        oui_index.reload()
+        self.stdout.write(f"Wrote {count} prefix(es) to {options['output']}")
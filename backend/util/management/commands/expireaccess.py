@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from payments.access import expire_access
+
+
+class Command(BaseCommand):
+    help = "Mark paid access past its end time as expired (the kernel set has already dropped it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running, syncing every INTERVAL seconds")
+        parser.add_argument('--no-revoke', action='store_true',
+                            help="Only update the database; trust the kernel timeouts")
+
+    def handle(self, *args, **options):
+        while True:
+            count = expire_access(revoke=not options['no_revoke'])
+            if count or not options['interval']:
+                self.stdout.write(f"{count} access grant(s) expired")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,57 @@
+import asyncio
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from util.firewall import FirewallWorker, get_backend
+from util.firewall.reconcile import Reconciler
+from util.firewall.worker import BATCH_WINDOW
+from util.metrics import serve_metrics
+from util.shaping import Shaper, ShapingReconciler
+
+
+class Command(BaseCommand):
+    help = "Run the privileged worker that applies grant/revoke commands in coalesced batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', help="nftables, ipset or auto (default: settings.FIREWALL_BACKEND)")
+        parser.add_argument('--interface', help="Client-facing interface (default: settings.CAPTIVE_INTERFACE)")
+        parser.add_argument('--socket', default=str(settings.FIREWALL_SOCKET))
+        parser.add_argument('--group', help="Group allowed to use the socket (the web server's)")
+        parser.add_argument('--window', type=float, default=BATCH_WINDOW,
+                            help="Seconds to gather commands into one kernel update")
+        parser.add_argument('--reconcile-interval', type=float, default=settings.FIREWALL_RECONCILE_INTERVAL,
+                            help="Seconds between kernel/database drift repairs (0 disables)")
+        parser.add_argument('--no-shaping', action='store_true',
+                            help="Do not enforce plan bandwidth with tc")
+        parser.add_argument('--metrics-host', default='127.0.0.1')
+        parser.add_argument('--metrics-port', type=int, default=settings.FIREWALL_METRICS_PORT,
+                            help="Port for GET /metrics (0 disables it)")
+
+    async def serve(self, worker, options):
+        server = None
+        if options['metrics_port']:
+            server = await serve_metrics(options['metrics_host'], options['metrics_port'])
+        try:
+            await worker.run()
+        finally:
+            if server:
+                server.close()
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['backend'], options['interface'])
+        reconcilers = [Reconciler(backend)]
+        if settings.SHAPING_ENABLED and not options['no_shaping']:
+            shaper = Shaper(options['interface'] or settings.CAPTIVE_INTERFACE, settings.CAPTIVE_NETWORK)
+            reconcilers.append(ShapingReconciler(shaper))
+        worker = FirewallWorker(
+            backend,
+            options['socket'],
+            window=options['window'],
+            group=options['group'],
+            reconcilers=reconcilers,
+            reconcile_interval=options['reconcile_interval'],
+        )
+        self.stdout.write(f"Firewall worker listening on {options['socket']}")
+        try:
+            asyncio.run(self.serve(worker, options))
+        except KeyboardInterrupt:
+            self.stdout.write("Firewall worker stopped")
@@ -0,0 +1,49 @@
+import asyncio
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from networks.models import Network
+from util.netscanner import NetScanner
+from util.scanner_daemon import JITTER, ScannerDaemon
+
+
+class Command(BaseCommand):
+    help = "Run the asyncio device scanner daemon with a metrics endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interface', help="Interface to scan (default: the active network's)")
+        parser.add_argument('--min-interval', type=float, default=settings.SCANNER_MIN_INTERVAL,
+                            help="Scan interval while clients are joining or leaving")
+        parser.add_argument('--max-interval', type=float, default=settings.SCANNER_MAX_INTERVAL,
+                            help="Scan interval ceiling when the network is idle")
+        parser.add_argument('--jitter', type=float, default=JITTER,
+                            help="Random spread applied to every interval, as a fraction")
+        parser.add_argument('--port-interval', type=float, default=settings.PORT_SCAN_INTERVAL,
+                            help="Seconds between port sweeps of known devices (0 disables them)")
+        parser.add_argument('--metrics-host', default='127.0.0.1')
+        parser.add_argument('--metrics-port', type=int, default=settings.SCANNER_METRICS_PORT,
+                            help="Port for GET /metrics (0 disables it)")
+
+    def handle(self, *args, **options):
+        networks = Network.objects.exclude(interface=None)
+        if options['interface']:
+            network = networks.filter(interface=options['interface']).first()
+        else:
+            network = networks.filter(status='active').first()
+
+        if network:
+            scanner = NetScanner.for_network(network)
+        else:
+            scanner = NetScanner(interface=options['interface'])
+
+        daemon = ScannerDaemon(
+            scanner,
+            min_interval=options['min_interval'],
+            max_interval=options['max_interval'],
+            jitter=options['jitter'],
+            port_interval=options['port_interval'],
+        )
+        self.stdout.write(f"Scanning {scanner.interface} ({scanner.subnet})")
+        try:
+            asyncio.run(daemon.run(metrics_host=options['metrics_host'], metrics_port=options['metrics_port']))
+        except KeyboardInterrupt:
+            self.stdout.write("Scanner stopped")
@@ -0,0 +1,48 @@
+import asyncio
+from django.core.management.base import BaseCommand, CommandError
+from devices.models import Device
+from util.osfingerprint import observe_ttls, update_fingerprints
+from util.portscan import (CONCURRENCY, CONNECT_TIMEOUT, HOST_RATE, SWEEP_PORTS, PortScanner, device_targets,
+                           present_targets)
+
+
+class Command(BaseCommand):
+    help = "Sweep present devices for open TCP ports and store the results"
+
+    def add_arguments(self, parser):
+        parser.add_argument('ips', nargs='*', help="Scan the devices with these addresses (default: those present now)")
+        parser.add_argument('--ports', default=','.join(map(str, SWEEP_PORTS)),
+                            help="Comma-separated ports to probe")
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                            help="Simultaneous probes across all hosts")
+        parser.add_argument('--host-rate', type=float, default=HOST_RATE,
+                            help="Connection attempts per second against one host")
+        parser.add_argument('--timeout', type=float, default=CONNECT_TIMEOUT)
+        parser.add_argument('--banners', action='store_true', help="Read service banners from open ports")
+        parser.add_argument('--no-os', action='store_true', help="Skip the echo and OS guess after the sweep")
+
+    def handle(self, *args, **options):
+        try:
+            ports = [int(port) for port in options['ports'].split(',') if port.strip()]
+        except ValueError:
+            raise CommandError(f"Invalid port list: {options['ports']}")
+
+        if options['ips']:
+            targets = device_targets(Device.objects.filter(ip_address__in=options['ips']))
+        else:
+            targets = present_targets()
+
+        scanner = PortScanner(
+            ports=ports,
+            concurrency=options['concurrency'],
+            host_rate=options['host_rate'],
+            timeout=options['timeout'],
+            banners=options['banners'],
+        )
+        results = scanner.sweep(targets)
+        if targets and not options['no_os']:
+            update_fingerprints(targets, asyncio.run(observe_ttls(targets)))
+        for ip, result in sorted(results.items()):
+            services = ', '.join(f"{port}/{name}" for port, name in result.services.items())
+            self.stdout.write(f"{ip}: {services or 'no open ports'}")
+        self.stdout.write(self.style.SUCCESS(f"Scanned {len(results)} device(s)"))
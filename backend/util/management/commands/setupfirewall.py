@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from util.firewall import FirewallError, get_backend
+from util.firewall.reconcile import Reconciler
+
+
+class Command(BaseCommand):
+    help = "Create the kernel access set and add every authenticated device and paid grant missing from it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', help="nftables, ipset or auto (default: settings.FIREWALL_BACKEND)")
+        parser.add_argument('--interface', help="Client-facing interface (default: settings.CAPTIVE_INTERFACE)")
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['backend'], options['interface'])
+        try:
+            drift = Reconciler(backend).run_once()
+        except FirewallError as e:
+            raise CommandError(str(e))
+        timed = sum(1 for timeout in drift.missing.values() if timeout is not None)
+        self.stdout.write(f"{backend.name}: {len(drift.missing)} device(s) loaded, {timed} with expiring access; "
+                          f"{len(drift.pending)} unknown entr(ies) left for the worker to confirm")
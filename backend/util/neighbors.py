@@ -0,0 +1,406 @@
+"""
+Kernel neighbor (ARP) table reader.
+
+Reads the IPv4 neighbor table straight from the kernel with a single
+rtnetlink RTM_GETNEIGH dump, falling back to /proc/net/arp and finally
+to `ip neigh show` when neither is available. NeighborWatcher subscribes
+to the kernel's neighbor multicast group to report presence changes as
+they happen.
+"""
+import errno
+import ipaddress
+import logging
+import os
+import select
+import socket
+import struct
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/neighbour.h)
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+NDA_DST = 1
+NDA_LLADDR = 2
+RTMGRP_NEIGH = 0x4
+
+NLMSG_HDR = struct.Struct("=LHHLL")
+NDMSG = struct.Struct("=BBHiHBB")
+RTATTR = struct.Struct("=HH")
+
+NUD_STATES = {
+    0x01: 'INCOMPLETE',
+    0x02: 'REACHABLE',
+    0x04: 'STALE',
+    0x08: 'DELAY',
+    0x10: 'PROBE',
+    0x20: 'FAILED',
+    0x40: 'NOARP',
+    0x80: 'PERMANENT',
+}
+
+# States in which the kernel has no usable link-layer address
+UNRESOLVED_STATES = {'INCOMPLETE', 'FAILED', 'NONE'}
+
+PROC_NET_ARP = "/proc/net/arp"
+RECV_BUFSIZE = 1 << 16
+
+
+@dataclass(frozen=True)
+class Neighbor:
+    """A single neighbor table entry"""
+    ip: str
+    mac: str
+    state: str
+    ifindex: int
+
+    @property
+    def is_resolved(self) -> bool:
+        return bool(self.mac) and self.state not in UNRESOLVED_STATES
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _format_mac(raw: bytes) -> str:
+    return ':'.join(f'{b:02x}' for b in raw)
+
+
+def _nud_state(state: int) -> str:
+    return NUD_STATES.get(state, 'NONE')
+
+
+def parse_neigh_message(payload: bytes) -> Optional[Neighbor]:
+    """Parse the body of an RTM_NEWNEIGH/RTM_DELNEIGH message"""
+    if len(payload) < NDMSG.size:
+        return None
+
+    family, _, _, ifindex, state, _, _ = NDMSG.unpack_from(payload)
+    if family != socket.AF_INET:
+        return None
+
+    ip = mac = None
+    offset = NDMSG.size
+    while offset + RTATTR.size <= len(payload):
+        rta_len, rta_type = RTATTR.unpack_from(payload, offset)
+        if rta_len < RTATTR.size:
+            break
+        data = payload[offset + RTATTR.size:offset + rta_len]
+        if rta_type == NDA_DST and len(data) == 4:
+            ip = socket.inet_ntoa(data)
+        elif rta_type == NDA_LLADDR and len(data) == 6 and any(data):
+            mac = _format_mac(data)
+        offset += _align(rta_len)
+
+    if ip is None:
+        return None
+    return Neighbor(ip=ip, mac=mac or '', state=_nud_state(state), ifindex=ifindex)
+
+
+def iter_netlink_messages(buffer: bytes):
+    """Yield (msg_type, payload) pairs from a netlink receive buffer"""
+    offset = 0
+    while offset + NLMSG_HDR.size <= len(buffer):
+        msg_len, msg_type, _, _, _ = NLMSG_HDR.unpack_from(buffer, offset)
+        if msg_len < NLMSG_HDR.size:
+            break
+        yield msg_type, buffer[offset + NLMSG_HDR.size:offset + msg_len]
+        offset += _align(msg_len)
+
+
+class NeighborTable:
+    """
+    Structured access to the kernel IPv4 neighbor table.
+
+    Backends are tried in order: rtnetlink dump, /proc/net/arp, `ip neigh`.
+    The first backend that works is remembered for subsequent dumps.
+    """
+
+    BACKENDS = ('netlink', 'procfs', 'iproute')
+
+    def __init__(self, interface: Optional[str] = None, subnet: Optional[str] = None):
+        self.interface = interface
+        self.network = ipaddress.ip_network(subnet, strict=False) if subnet else None
+        self.backend = None
+        self._seq = 0
+
+    @property
+    def ifindex(self) -> int:
+        """Kernel index of the filtered interface, 0 when unfiltered/unknown"""
+        if not self.interface:
+            return 0
+        try:
+            return socket.if_nametoindex(self.interface)
+        except OSError:
+            return 0
+
+    def dump(self, resolved_only: bool = True) -> List[Neighbor]:
+        """Return the neighbor entries for the configured interface and subnet"""
+        backends = (self.backend,) if self.backend else self.BACKENDS
+        for backend in backends:
+            try:
+                entries = getattr(self, f'_dump_{backend}')()
+            except (OSError, ValueError, subprocess.SubprocessError) as e:
+                logger.debug(f"Neighbor backend {backend} unavailable: {e}")
+                if self.backend:
+                    # The remembered backend broke, retry the full chain
+                    self.backend = None
+                    return self.dump(resolved_only)
+                continue
+            self.backend = backend
+            ifindex = self.ifindex
+            return [n for n in entries if self._wanted(n, ifindex, resolved_only)]
+
+        logger.error("No neighbor table backend available")
+        return []
+
+    def lookup(self, ip_address: str) -> Optional[Neighbor]:
+        """Return the resolved neighbor entry for a single IP, if any"""
+        for neighbor in self.dump():
+            if neighbor.ip == ip_address:
+                return neighbor
+        return None
+
+    def _wanted(self, neighbor: Neighbor, ifindex: int, resolved_only: bool) -> bool:
+        if resolved_only and not neighbor.is_resolved:
+            return False
+        if ifindex and neighbor.ifindex != ifindex:
+            return False
+        if self.network and ipaddress.ip_address(neighbor.ip) not in self.network:
+            return False
+        return True
+
+    def _dump_netlink(self) -> List[Neighbor]:
+        """One RTM_GETNEIGH dump request over rtnetlink"""
+        self._seq += 1
+        request = NLMSG_HDR.pack(
+            NLMSG_HDR.size + NDMSG.size, RTM_GETNEIGH,
+            NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0
+        ) + NDMSG.pack(socket.AF_INET, 0, 0, self.ifindex, 0, 0, 0)
+
+        neighbors = []
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFSIZE * 4)
+            sock.sendto(request, (0, 0))
+            while True:
+                buffer = sock.recv(RECV_BUFSIZE)
+                if not buffer:
+                    return neighbors
+                for msg_type, payload in iter_netlink_messages(buffer):
+                    if msg_type == NLMSG_DONE:
+                        return neighbors
+                    if msg_type == NLMSG_ERROR:
+                        error = struct.unpack_from("=i", payload)[0]
+                        if error:
+                            raise OSError(-error, os.strerror(-error))
+                        continue
+                    if msg_type == RTM_NEWNEIGH:
+                        neighbor = parse_neigh_message(payload)
+                        if neighbor:
+                            neighbors.append(neighbor)
+
+    def _dump_procfs(self) -> List[Neighbor]:
+        """Parse /proc/net/arp (no per-entry NUD state is exposed there)"""
+        neighbors = []
+        ifindexes = {}
+        with open(PROC_NET_ARP, 'r') as f:
+            next(f, None)  # header
+            for line in f:
+                parts = line.split()
+                if len(parts) < 6:
+                    continue
+                ip, _, flags, mac, _, device = parts[:6]
+                flags = int(flags, 16)
+                if device not in ifindexes:
+                    try:
+                        ifindexes[device] = socket.if_nametoindex(device)
+                    except OSError:
+                        ifindexes[device] = 0
+                if flags & 0x04:
+                    state = 'PERMANENT'
+                elif flags & 0x02:
+                    state = 'REACHABLE'
+                else:
+                    state = 'INCOMPLETE'
+                mac = '' if mac == '00:00:00:00:00:00' else mac.lower()
+                neighbors.append(Neighbor(ip=ip, mac=mac, state=state, ifindex=ifindexes[device]))
+        return neighbors
+
+    def _dump_iproute(self) -> List[Neighbor]:
+        """Last resort: fork `ip neigh show` and parse its text output"""
+        cmd = ['ip', '-4', 'neigh', 'show']
+        if self.interface:
+            cmd += ['dev', self.interface]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+        neighbors = []
+        default_ifindex = self.ifindex
+        for line in result.stdout.splitlines():
+            # 192.168.12.100 [dev ap0] lladdr ab:cd:ef:12:34:56 REACHABLE
+            parts = line.split()
+            if not parts:
+                continue
+            mac = parts[parts.index('lladdr') + 1].lower() if 'lladdr' in parts else ''
+            ifindex = default_ifindex
+            if 'dev' in parts:
+                try:
+                    ifindex = socket.if_nametoindex(parts[parts.index('dev') + 1])
+                except OSError:
+                    ifindex = 0
+            neighbors.append(Neighbor(ip=parts[0], mac=mac, state=parts[-1].upper(), ifindex=ifindex))
+        return neighbors
+
+
+@dataclass(frozen=True)
+class NeighborEvent:
+    """A presence change derived from the neighbor table"""
+    kind: str  # 'connect' or 'disconnect'
+    neighbor: Neighbor
+
+
+class NeighborWatcher:
+    """
+    Event-driven view of the neighbor table.
+
+    Listens on the RTMGRP_NEIGH multicast group and turns RTM_NEWNEIGH /
+    RTM_DELNEIGH notifications into connect/disconnect events. A periodic
+    full dump reconciles anything missed (e.g. after ENOBUFS).
+    """
+
+    def __init__(self, interface: Optional[str] = None, subnet: Optional[str] = None):
+        self.table = NeighborTable(interface=interface, subnet=subnet)
+        self.known: Dict[str, Neighbor] = {}
+        self.sock = None
+        self._ifindex = 0
+
+    def open(self):
+        """Subscribe to neighbor notifications"""
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFSIZE * 4)
+            self.sock.bind((0, RTMGRP_NEIGH))
+            self.sock.setblocking(False)
+            self._ifindex = self.table.ifindex
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def fileno(self) -> int:
+        return self.open().sock.fileno()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _update(self, neighbor: Neighbor, removed: bool = False) -> List[NeighborEvent]:
+        """Apply one neighbor state change and return the resulting events"""
+        previous = self.known.get(neighbor.ip)
+        events = []
+
+        if removed or not neighbor.is_resolved:
+            # STALE/DELAY/PROBE keep the client present; only deletion or
+            # a failed resolution counts as a disconnect.
+            if previous and (removed or neighbor.state == 'FAILED'):
+                del self.known[neighbor.ip]
+                events.append(NeighborEvent('disconnect', previous))
+            return events
+
+        if previous and previous.mac != neighbor.mac:
+            events.append(NeighborEvent('disconnect', previous))
+        self.known[neighbor.ip] = neighbor
+        if not previous or previous.mac != neighbor.mac:
+            events.append(NeighborEvent('connect', neighbor))
+        return events
+
+    def read(self) -> List[NeighborEvent]:
+        """Drain pending netlink notifications without blocking"""
+        events = []
+        while True:
+            try:
+                buffer = self.open().sock.recv(RECV_BUFSIZE)
+            except BlockingIOError:
+                return events
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # Kernel dropped notifications; resync from a full dump
+                    logger.warning("Neighbor notifications overflowed, reconciling")
+                    return events + self.reconcile()
+                raise
+
+            for msg_type, payload in iter_netlink_messages(buffer):
+                if msg_type not in (RTM_NEWNEIGH, RTM_DELNEIGH):
+                    continue
+                neighbor = parse_neigh_message(payload)
+                if neighbor and self.table._wanted(neighbor, self._ifindex, False):
+                    events += self._update(neighbor, removed=msg_type == RTM_DELNEIGH)
+
+    def poll(self, timeout: Optional[float] = None) -> List[NeighborEvent]:
+        """Wait up to `timeout` seconds for notifications"""
+        ready, _, _ = select.select([self.fileno()], [], [], timeout)
+        return self.read() if ready else []
+
+    def reconcile(self) -> List[NeighborEvent]:
+        """Diff a full table dump against the tracked state"""
+        current = {n.ip: n for n in self.table.dump()}
+        events = []
+        for ip in list(self.known):
+            if ip not in current:
+                events.append(NeighborEvent('disconnect', self.known.pop(ip)))
+        for neighbor in current.values():
+            events += self._update(neighbor)
+        return events
+
+    def batches(self, reconcile_interval: float = 300,
+                heartbeat: Optional[float] = None) -> Iterator[List[NeighborEvent]]:
+        """
+        Yield non-empty lists of presence events forever.
+
+        Each list holds everything that arrived in one wakeup, so bursts of
+        joins can be written together. A full reconciliation runs every
+        `reconcile_interval` seconds. With a `heartbeat`, an empty list is
+        yielded at least that often so callers can run periodic work.
+        """
+        self.open()
+        initial = self.reconcile()
+        if initial:
+            yield initial
+        next_reconcile = time.monotonic() + reconcile_interval
+        next_beat = time.monotonic() + heartbeat if heartbeat else None
+        while True:
+            wake = min(next_reconcile, next_beat) if next_beat else next_reconcile
+            events = self.poll(max(0.0, wake - time.monotonic()))
+            now = time.monotonic()
+            if now >= next_reconcile:
+                events += self.reconcile()
+                next_reconcile = time.monotonic() + reconcile_interval
+            if next_beat and now >= next_beat:
+                next_beat = now + heartbeat
+                yield events
+            elif events:
+                yield events
+
+    def events(self, reconcile_interval: float = 300) -> Iterator[NeighborEvent]:
+        """Yield presence events one at a time; see batches()"""
+        for batch in self.batches(reconcile_interval):
+            yield from batch
+
+
+def read_neighbors(interface: Optional[str] = None, subnet: Optional[str] = None) -> List[Neighbor]:
+    """Convenience wrapper returning resolved neighbors for an interface/subnet"""
+    return NeighborTable(interface=interface, subnet=subnet).dump()
@@ -1,117 +1,189 @@
 #!/usr/bin/env python3
-import subprocess
-import re
+import asyncio
 import logging
-import time
 from datetime import datetime
-from devices.models import Device
+from django.db import transaction
+from django.utils import timezone
+from devices.models import Device, DeviceHistory
+from devices.registry import authenticated_macs
+from networks.models import Network
+from util.discovery import DiscoveryEngine
+from util.mac_cache import mac_cache, resolve_macs
 from django.conf import settings
 
 BASE_DIR = settings.BASE_DIR
 
 
 class NetScanner:
-    def __init__(self, subnet="192.168.12.0/24", interface="ap0"):
-        self.subnet = subnet
-        self.interface = interface
-        self.authenticated_devices = Device.objects.all().values('mac_address').values_list()
-        self.setup_logging()
-
-    def setup_logging(self):
-        # os.makedirs((BASE_DIR / "logs/captive").as_posix(), exist_ok=True)
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler(BASE_DIR / "logs/device_scanner.log"),
-                logging.StreamHandler(),
-            ],
+    def __init__(self, subnet=None, interface=None, engine=None):
+        self.subnet = subnet or settings.CAPTIVE_NETWORK
+        self.interface = interface or settings.CAPTIVE_INTERFACE
+        self.engine = engine or DiscoveryEngine.for_interface(
+            self.interface, self.subnet,
+            source_names=settings.DISCOVERY_SOURCES,
+            leases_file=settings.DNSMASQ_LEASES_FILE,
+            hostapd_ctrl_dir=settings.HOSTAPD_CTRL_DIR,
         )
+        # mac -> ip as of the last applied scan/event batch
+        self.snapshot = {}
+        self.authenticated_devices = authenticated_macs
         self.logger = logging.getLogger(__name__)
 
-    def get_connected_devices(self):
-        """Get all connected devices using multiple methods"""
-        devices = []
-        is_set = False
+    @classmethod
+    def for_network(cls, network):
+        """Scanner for a networks.Network record's interface and subnet"""
+        engine = DiscoveryEngine.for_network(
+            network,
+            source_names=settings.DISCOVERY_SOURCES,
+            leases_file=settings.DNSMASQ_LEASES_FILE,
+            hostapd_ctrl_dir=settings.HOSTAPD_CTRL_DIR,
+        )
+        subnet = str(engine.network) if engine.network else None
+        return cls(subnet=subnet, interface=network.interface, engine=engine)
 
+    def get_connected_devices(self):
+        """Get all connected devices from every configured discovery source"""
         try:
-            # Method 1: Use arp command
-            result = subprocess.run(
-                ["arp", "-a", "-i", self.interface],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-
-            try:
-                for line in result.stdout.split("\n"):
-                    if self.interface in line and f"{self.subnet.rsplit('.', 1)}." in line:
-                        subnet_parts = self.subnet.split('.')
-                        # Parse: ? (192.168.12.100) at ab:cd:ef:12:34:56 [ether] on wlan0
-                        ip_match = re.search(rf"\(({subnet_parts[0]}\.{subnet_parts[1]}\.{subnet_parts[2]}\.\d+)\)", line)
-                        mac_match = re.search(r"at\s+([0-9a-fA-F:]{17})", line)
-
-                        if ip_match and mac_match:
-                            is_set = True
-                            devices.append(
-                                {
-                                    "ip": ip_match.group(1),
-                                    "mac": mac_match.group(1).lower(),
-                                    "timestamp": datetime.now().isoformat(),
-                                }
-                            )
-            except Exception:
-                pass
-
-            if not is_set:
-                # Method 2: Use ip neigh (more reliable)
-                result = subprocess.run(
-                    ["ip", "neigh", "show", "dev", self.interface],
-                    capture_output=True,
-                    text=True,
-                    check=True,
-                )
-
-                for line in result.stdout.split("\n"):
-                    if self.subnet.rsplit('.', 1) in line and "REACHABLE" in line:
-                        parts = line.split()
-                        if len(parts) >= 5:
-                            devices.append(
-                                {
-                                    "ip": parts[0],
-                                    "mac": parts[4].lower(),
-                                    "timestamp": datetime.now().isoformat(),
-                                }
-                            )
-
+            return self.to_devices(self.engine.discover())
         except Exception as e:
             self.logger.error(f"Error scanning devices: {e}")
+            return []
 
+    def to_devices(self, discovered):
+        """Scan records for addressed devices, also warming the MAC cache"""
+        devices = []
+        for device in discovered:
+            if not device.ip:
+                # Associated but not yet addressed; picked up next cycle
+                continue
+            devices.append(
+                {
+                    **device.as_dict(),
+                    "timestamp": datetime.now().isoformat(),
+                }
+            )
+
+        mac_cache.update({device['ip']: device['mac'] for device in devices})
         return devices
 
+    def diff(self, current):
+        """Split a mac -> ip map into (joined, left, moved) against the snapshot"""
+        previous = self.snapshot
+        joined = {mac: ip for mac, ip in current.items() if mac not in previous}
+        left = {mac: ip for mac, ip in previous.items() if mac not in current}
+        moved = {mac: ip for mac, ip in current.items() if mac in previous and previous[mac] != ip}
+        return joined, left, moved
+
+    def apply_delta(self, joined, left, moved):
+        """
+        Write only the changed devices and their history in one transaction;
+        returns the MACs that could not be stored, which callers keep out of
+        the snapshot so they are offered again once a network exists
+        """
+        if not (joined or left or moved):
+            return set()
+
+        now = timezone.now()
+        seen = {**joined, **moved}
+        with transaction.atomic():
+            existing = Device.objects.in_bulk(list(seen))
+            for mac, device in existing.items():
+                device.ip_address = seen[mac]
+                device.last_seen = now
+            Device.objects.bulk_update(list(existing.values()), ['ip_address', 'last_seen'])
+
+            new = [mac for mac in seen if mac not in existing]
+            network = self.get_network() if new else None
+            skipped = set()
+            if new and not network:
+                self.logger.warning(f"No network configured for {self.interface}, ignoring {len(new)} new devices")
+                skipped, new = set(new), []
+            Device.objects.bulk_create(
+                [Device(mac_address=mac, ip_address=seen[mac], network=network) for mac in new],
+                ignore_conflicts=True,
+            )
+
+            known = set(existing) | set(new)
+            if left:
+                known |= set(Device.objects.filter(mac_address__in=list(left)).values_list('mac_address', flat=True))
+
+            history = []
+            for mac, ip in joined.items():
+                if mac in known:
+                    history.append(DeviceHistory(device_id=mac, event_type='connect', ip_address=ip))
+            for mac, ip in moved.items():
+                if mac in known:
+                    history.append(DeviceHistory(
+                        device_id=mac, event_type='connect', ip_address=ip,
+                        details={'previous_ip': self.snapshot.get(mac)},
+                    ))
+            for mac, ip in left.items():
+                if mac in known:
+                    history.append(DeviceHistory(device_id=mac, event_type='disconnect', ip_address=ip))
+            DeviceHistory.objects.bulk_create(history)
+
+        self.logger.info(f"Applied delta: {len(joined)} joined, {len(left)} left, {len(moved)} moved")
+        return skipped
+
+    def reconcile(self, devices):
+        """Apply a full scan against the previous snapshot; returns (joined, left, moved)"""
+        current = {device['mac']: device['ip'] for device in devices}
+        joined, left, moved = self.diff(current)
+        skipped = self.apply_delta(joined, left, moved)
+        self.snapshot = {mac: ip for mac, ip in current.items() if mac not in skipped}
+        joined = {mac: ip for mac, ip in joined.items() if mac not in skipped}
+        return joined, left, moved
+
     def scan_and_log(self):
-        """Main scanning function"""
-        self.logger.info("Starting device scan")
+        """Full scan, reconciled against the previous snapshot"""
+        self.logger.debug("Starting device scan")
 
         devices = self.get_connected_devices()
-        new_devices = []
+        joined, _, _ = self.reconcile(devices)
 
+        new_devices = []
         for device in devices:
-            if device['mac'] in self.authenticated_devices:
+            if device['mac'] in joined and device['mac'] not in self.authenticated_devices:
                 new_devices.append(device)
-                self.logger.info(
-                    f"New unauthenticated device: {device['ip']} - {device['mac']}"
-                )
-            else:
                 self.logger.debug(
-                    f"Authenticated device: {device['ip']} - {device['mac']}"
+                    f"New unauthenticated device: {device['ip']} - {device['mac']}"
                 )
 
-        self.logger.info(
+        self.logger.debug(
             f"Scan completed. Found {len(devices)} total devices, {len(new_devices)} new unauthenticated devices"
         )
         return new_devices
 
+    def resolve_macs(self, ip_addresses):
+        """Resolve a batch of IPs on the scanned interface concurrently"""
+        try:
+            return resolve_macs(ip_addresses, interface=self.interface)
+        except Exception as e:
+            self.logger.error(f"Error resolving MAC addresses: {e}")
+            return {ip: None for ip in ip_addresses}
+
+    def get_network(self):
+        """Network record served by this scanner's interface"""
+        return (Network.objects.filter(interface=self.interface).first()
+                or Network.objects.first())
+
+    def handle_events(self, events):
+        """Fold a batch of neighbor watcher events into one delta and apply it"""
+        current = dict(self.snapshot)
+        for event in events:
+            neighbor = event.neighbor
+            if event.kind == 'connect':
+                mac_cache.put(neighbor.ip, neighbor.mac)
+                current[neighbor.mac] = neighbor.ip
+            else:
+                mac_cache.invalidate(neighbor.ip)
+                if current.get(neighbor.mac) == neighbor.ip:
+                    del current[neighbor.mac]
+
+        joined, left, moved = self.diff(current)
+        skipped = self.apply_delta(joined, left, moved)
+        self.snapshot = {mac: ip for mac, ip in current.items() if mac not in skipped}
+
     def get_all_devices(self):
         return Device.objects.all().values('mac_address').values_list()
 
@@ -123,16 +195,14 @@ net_scanner = NetScanner()
 
 
 def main():
-    # Run continuous scanning
-    while True:
-        try:
-            net_scanner.scan_and_log()
-            time.sleep(3)  # Scan every 30 seconds
-        except KeyboardInterrupt:
-            break
-        except Exception as e:
-            logging.error(f"Scanner error: {e}")
-            time.sleep(60)
+    from util.scanner_daemon import ScannerDaemon
+
+    network = Network.objects.filter(status='active').exclude(interface=None).first()
+    scanner = NetScanner.for_network(network) if network else net_scanner
+    try:
+        asyncio.run(ScannerDaemon(scanner).run())
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""
+Passive operating system guesses from TTLs and open ports.
+
+Stacks start IP TTLs at a fixed value (64 for Linux, macOS and iOS, 128 for
+Windows, 255 for most routers), and every hop only decrements it, so the
+smallest standard value at or above an observed TTL names the sender's
+initial TTL. That is combined with how many of an OS's characteristic ports
+the last port sweep probed and found open (sweeps always include
+FINGERPRINT_PORTS); the best-scoring OS is the guess, and its
+confidence shrinks when the runner-up scores close to it.
+
+The evidence (initial TTL, open and probed ports) is hashed per device and the
+guess is only recomputed and written when the hash changes. A TTL comes
+from one ICMP echo per device, or from any packet sample passed in;
+without a new one the last observed TTL is reused.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+OS_FINGERPRINTS = {
+    'Windows': {
+        'ttl_range': (128, 128),
+        'tcp_flags': ['SYN', 'ACK'],
+        'common_ports': [135, 139, 445, 3389]
+    },
+    'Linux': {
+        'ttl_range': (64, 64),
+        'tcp_flags': ['SYN', 'ACK'],
+        'common_ports': [22, 111, 631]
+    },
+    'macOS': {
+        'ttl_range': (64, 64),
+        'tcp_flags': ['SYN', 'ACK'],
+        'common_ports': [22, 548, 62078]
+    },
+    'Router': {
+        'ttl_range': (255, 255),
+        'tcp_flags': ['SYN', 'ACK'],
+        'common_ports': [23, 80, 443, 8291]
+    }
+}
+
+# Every port some fingerprint relies on; port sweeps must probe these
+FINGERPRINT_PORTS = tuple(sorted({port for fingerprint in OS_FINGERPRINTS.values()
+                                  for port in fingerprint['common_ports']}))
+
+INITIAL_TTLS = (32, 64, 128, 255)
+TTL_WEIGHT = 0.6
+PORT_WEIGHT = 0.4
+PING_TIMEOUT = 1
+PING_CONCURRENCY = 64
+UNKNOWN_OS = 'Unknown'
+
+
+@dataclass
+class OsGuess:
+    operating_system: str
+    confidence: float
+    evidence_hash: str
+
+
+def initial_ttl(observed: Optional[int]) -> Optional[int]:
+    """Initial TTL the sender most likely used"""
+    if not observed or observed <= 0:
+        return None
+    for value in INITIAL_TTLS:
+        if observed <= value:
+            return value
+    return None
+
+
+def _ports(ports: Iterable[int]) -> str:
+    return ','.join(map(str, sorted(set(ports))))
+
+
+def evidence_hash(ttl: Optional[int], open_ports: Iterable[int], probed_ports: Optional[Iterable[int]] = None) -> str:
+    probed = _ports(probed_ports) if probed_ports is not None else '*'
+    evidence = f"{initial_ttl(ttl)}|{_ports(open_ports)}|{probed}"
+    return hashlib.sha1(evidence.encode()).hexdigest()[:16]
+
+
+def classify(ttl: Optional[int], open_ports: Iterable[int], probed_ports: Optional[Iterable[int]] = None,
+             fingerprints: Dict = OS_FINGERPRINTS) -> OsGuess:
+    """
+    Best OS for the evidence, with a confidence between 0 and 1.
+
+    Only ports in `probed_ports` (default: all) count towards an OS's port
+    score, so a port that was never scanned is not taken as closed. When
+    several OSes score the same they are all named, e.g. "Linux/macOS".
+    """
+    ports = set(open_ports)
+    probed = set(probed_ports) if probed_ports is not None else None
+    start = initial_ttl(ttl)
+    digest = evidence_hash(ttl, ports, probed)
+    scores = []
+    for name, fingerprint in fingerprints.items():
+        low, high = fingerprint['ttl_range']
+        score = TTL_WEIGHT if start is not None and low <= start <= high else 0.0
+        common = [port for port in fingerprint['common_ports'] if probed is None or port in probed]
+        if common:
+            score += PORT_WEIGHT * len(ports.intersection(common)) / len(common)
+        scores.append((score, name))
+    scores.sort(key=lambda item: item[0], reverse=True)
+    if not scores or scores[0][0] == 0:
+        return OsGuess(UNKNOWN_OS, 0.0, digest)
+    best = scores[0][0]
+    tied = [name for score, name in scores if score == best]
+    runner_up = next((score for score, _ in scores if score < best), 0.0)
+    # Evidence that cannot separate the leaders is split between them
+    confidence = best / len(tied) if len(tied) > 1 else best * best / (best + runner_up)
+    return OsGuess('/'.join(tied), round(confidence, 2), digest)
+
+
+async def ping_ttl(ip: str, timeout: int = PING_TIMEOUT) -> Optional[int]:
+    """TTL of the reply to one ICMP echo, or None"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'ping', '-n', '-c', '1', '-W', str(timeout), ip,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        output, _ = await process.communicate()
+    except OSError:
+        return None
+    match = re.search(rb'ttl=(\d+)', output, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+async def observe_ttls(ips: Iterable[str], concurrency: int = PING_CONCURRENCY) -> Dict[str, int]:
+    """{ip: ttl} for the hosts that answered an echo"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(ip):
+        async with slots:
+            return ip, await ping_ttl(ip)
+
+    results = await asyncio.gather(*(one(ip) for ip in dict.fromkeys(ips)))
+    return {ip: ttl for ip, ttl in results if ttl}
+
+
+def update_fingerprints(by_ip: Dict[str, object], ttls: Dict[str, int]) -> int:
+    """Reclassify devices whose evidence changed; returns how many were updated"""
+    from devices.models import DeviceFingerprint
+
+    close_old_connections()
+    existing = {
+        fingerprint.device_id: fingerprint
+        for fingerprint in DeviceFingerprint.objects.filter(device__in=list(by_ip.values()))
+    }
+    created, changed = [], []
+    for ip, device in by_ip.items():
+        fingerprint = existing.get(device.mac_address)
+        if fingerprint is None:
+            fingerprint = DeviceFingerprint(device=device)
+        ttl = ttls.get(ip) or fingerprint.observed_ttl
+        if evidence_hash(ttl, fingerprint.open_ports, fingerprint.probed_ports) == fingerprint.evidence_hash:
+            continue
+        guess = classify(ttl, fingerprint.open_ports, fingerprint.probed_ports)
+        fingerprint.observed_ttl = ttl
+        fingerprint.operating_system = guess.operating_system
+        fingerprint.os_confidence = guess.confidence
+        fingerprint.evidence_hash = guess.evidence_hash
+        (changed if fingerprint.device_id in existing else created).append(fingerprint)
+
+    if created:
+        DeviceFingerprint.objects.bulk_create(created)
+    if changed:
+        DeviceFingerprint.objects.bulk_update(
+            changed, ['observed_ttl', 'operating_system', 'os_confidence', 'evidence_hash']
+        )
+    if created or changed:
+        logger.info(f"Reclassified the OS of {len(created) + len(changed)} device(s)")
+    return len(created) + len(changed)
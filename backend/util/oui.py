@@ -0,0 +1,290 @@
+"""
+IEEE OUI registry as a compact binary index.
+
+The index holds one section per assignment size: MA-S (36-bit prefixes,
+including the old IAB blocks), MA-M (28-bit) and MA-L (24-bit). Each
+section is a sorted array of fixed-size big-endian prefix keys with an
+offset into a shared table of organization names, plus a directory of
+where each value of the top 12 prefix bits starts, which narrows every
+search to a handful of records. The file is mmap'd on
+first use and searched in place, longest prefix first, so a lookup is a
+few binary searches with no parsing and the pages stay shared with the
+page cache instead of living on the heap.
+
+`manage.py buildoui` rebuilds the packaged index from the registry CSVs
+(or the IEEE text dumps, or a Wireshark `manuf` file, which carries all
+three block sizes).
+"""
+import csv
+import io
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = Path(__file__).parent / "data/oui.idx"
+
+MAGIC = b'NHOU'
+FORMAT_VERSION = 1
+HEADER = struct.Struct("!4sHHI")  # magic, format version, section count, names offset
+SECTION = struct.Struct("!BBIII")  # prefix bits, key size, record count, records offset, directory offset
+DIRECTORY_BITS = 12
+BOUNDS = struct.Struct("!II")
+NAME_OFFSET = struct.Struct("!I")
+NAME_LENGTH = struct.Struct("!H")
+
+# Registry CSV name -> prefix length in bits
+REGISTRIES = {'MA-S': 36, 'IAB': 36, 'MA-M': 28, 'MA-L': 24}
+SOURCES = [
+    "https://standards-oui.ieee.org/oui/oui.csv",
+    "https://standards-oui.ieee.org/oui28/mam.csv",
+    "https://standards-oui.ieee.org/oui36/oui36.csv",
+    "https://standards-oui.ieee.org/iab/iab.csv",
+]
+
+UNKNOWN = 'UNKNOWN'
+
+
+def _key_size(bits: int) -> int:
+    return (bits + 7) // 8
+
+
+def mac_to_int(mac: str) -> int:
+    digits = mac.strip().replace(':', '').replace('-', '').replace('.', '')
+    if len(digits) != 12:
+        raise ValueError(f"Invalid MAC address: {mac!r}")
+    return int(digits, 16)
+
+
+def parse_registry_csv(text: str) -> List[Tuple[int, int, str]]:
+    """(prefix bits, prefix value, organization) rows of an IEEE registry CSV"""
+    entries = []
+    for row in csv.DictReader(io.StringIO(text)):
+        bits = REGISTRIES.get((row.get('Registry') or '').strip())
+        assignment = (row.get('Assignment') or '').strip()
+        name = ' '.join((row.get('Organization Name') or '').split())
+        if not bits or not assignment or not name:
+            continue
+        try:
+            # Assignments are the prefix in hex (6, 7 or 9 digits)
+            entries.append((bits, int(assignment, 16), name))
+        except ValueError:
+            continue
+    return entries
+
+
+IEEE_TEXT_LINE = re.compile(r'^\s*([0-9A-F]{6}(?:-[0-9A-F]{6})?)\s+\(base 16\)\s*(.*)$', re.IGNORECASE)
+IEEE_HEX_LINE = re.compile(r'^\s*([0-9A-F]{2}-[0-9A-F]{2}-[0-9A-F]{2})\s+\(hex\)', re.IGNORECASE)
+
+
+def parse_registry_text(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Rows of an IEEE text dump (oui.txt, mam.txt, oui36.txt, iab.txt).
+
+    MA-L entries carry the whole prefix on the "(base 16)" line; the
+    smaller blocks give the MA-L they sit in on the "(hex)" line and the
+    range of the low 24 bits on the "(base 16)" line, whose width sets
+    the prefix length.
+    """
+    entries = []
+    block = None
+    for line in text.splitlines():
+        match = IEEE_HEX_LINE.match(line)
+        if match:
+            block = int(match.group(1).replace('-', ''), 16)
+            continue
+        match = IEEE_TEXT_LINE.match(line)
+        if not match:
+            continue
+        name = ' '.join(match.group(2).split())
+        assignment = match.group(1)
+        if not name:
+            continue
+        if '-' not in assignment:
+            entries.append((24, int(assignment, 16), name))
+            continue
+        if block is None:
+            continue
+        start, end = (int(part, 16) for part in assignment.split('-'))
+        bits = 48 - (end - start).bit_length()
+        if bits in (28, 36):
+            entries.append((bits, ((block << 24) | start) >> (48 - bits), name))
+    return entries
+
+
+def parse_manuf(text: str) -> List[Tuple[int, int, str]]:
+    """Rows of a Wireshark `manuf` file, keeping only IEEE block sizes"""
+    entries = []
+    for line in text.splitlines():
+        fields = line.split('\t')
+        if len(fields) < 2 or line.startswith('#'):
+            continue
+        address, _, mask = fields[0].strip().partition('/')
+        bits = int(mask) if mask else 24
+        if bits not in (24, 28, 36):
+            continue
+        digits = address.replace(':', '').replace('-', '').replace('.', '')
+        name = ' '.join((fields[2] if len(fields) > 2 else fields[1]).split())
+        try:
+            value = int(digits.ljust(12, '0')[:12], 16)
+        except ValueError:
+            continue
+        if name:
+            entries.append((bits, value >> (48 - bits), name))
+    return entries
+
+
+def parse_registry(text: str) -> List[Tuple[int, int, str]]:
+    """Rows of any supported registry format"""
+    if text.lstrip().startswith('Registry,'):
+        return parse_registry_csv(text)
+    if '(base 16)' in text:
+        return parse_registry_text(text)
+    return parse_manuf(text)
+
+
+def write_index(path, entries: Iterable[Tuple[int, int, str]]):
+    """Atomically write an index from (prefix bits, prefix value, organization); later rows win"""
+    sections: Dict[int, Dict[int, str]] = {}
+    for bits, prefix, name in entries:
+        sections.setdefault(bits, {})[prefix] = name
+
+    names: Dict[str, int] = {}
+    name_table = bytearray()
+    for bits in sorted(sections, reverse=True):
+        for name in sections[bits].values():
+            if name not in names:
+                encoded = name.encode('utf-8')[:0xffff]
+                names[name] = len(name_table)
+                name_table += NAME_LENGTH.pack(len(encoded)) + encoded
+
+    order = sorted(sections, reverse=True)
+    offset = HEADER.size + SECTION.size * len(order)
+    headers, bodies = [], []
+    for bits in order:
+        size = _key_size(bits)
+        items = sorted(sections[bits].items())
+        records = b''.join(prefix.to_bytes(size, 'big') + NAME_OFFSET.pack(names[name]) for prefix, name in items)
+        # starts[b]: index of the first record whose top bits are >= b
+        starts = [0] * ((1 << DIRECTORY_BITS) + 1)
+        for prefix, _ in items:
+            starts[(prefix >> (bits - DIRECTORY_BITS)) + 1] += 1
+        for bucket in range(1, len(starts)):
+            starts[bucket] += starts[bucket - 1]
+        directory = struct.pack(f"!{len(starts)}I", *starts)
+        headers.append(SECTION.pack(bits, size, len(items), offset, offset + len(records)))
+        bodies.append(records + directory)
+        offset += len(records) + len(directory)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(order), offset))
+        f.write(b''.join(headers))
+        f.write(b''.join(bodies))
+        f.write(name_table)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return sum(len(section) for section in sections.values())
+
+
+class OuiIndex:
+    """Longest-prefix vendor lookup over an mmap'd index, loaded on first use"""
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = Path(path)
+        self._map: Optional[mmap.mmap] = None
+        # (prefix bits, key size, count, records offset, directory offset), longest prefix first
+        self._sections: List[Tuple[int, int, int, int, int]] = []
+        self._names_offset = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _ensure(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._open()
+
+    def reload(self):
+        """Map the index again, e.g. after it was rebuilt"""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        self._close()
+        self._loaded = True
+        try:
+            with open(self.path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        magic, version, count, names_offset = HEADER.unpack_from(mapped)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            mapped.close()
+            logger.error(f"Ignoring corrupt OUI index {self.path}")
+            return
+        self._sections = [SECTION.unpack_from(mapped, HEADER.size + i * SECTION.size)
+                          for i in range(count)]
+        self._names_offset = names_offset
+        self._map = mapped
+
+    def _name(self, offset: int) -> str:
+        start = self._names_offset + offset
+        (length,) = NAME_LENGTH.unpack_from(self._map, start)
+        start += NAME_LENGTH.size
+        return self._map[start:start + length].decode('utf-8', 'replace')
+
+    def lookup_int(self, value: int) -> Optional[str]:
+        self._ensure()
+        mapped = self._map
+        if mapped is None:
+            return None
+        for bits, size, _, offset, directory in self._sections:
+            prefix = value >> (48 - bits)
+            target = prefix.to_bytes(size, 'big')
+            record = size + NAME_OFFSET.size
+            lo, hi = BOUNDS.unpack_from(mapped, directory + (prefix >> (bits - DIRECTORY_BITS)) * 4)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                start = offset + mid * record
+                current = mapped[start:start + size]
+                if current == target:
+                    return self._name(NAME_OFFSET.unpack_from(mapped, start + size)[0])
+                if current < target:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return None
+
+    def lookup(self, mac: str, default: Optional[str] = UNKNOWN) -> Optional[str]:
+        """Organization that registered the MAC's prefix"""
+        try:
+            return self.lookup_int(mac_to_int(mac)) or default
+        except ValueError:
+            return default
+
+    def __len__(self) -> int:
+        self._ensure()
+        return sum(section[2] for section in self._sections)
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+        self._map, self._sections = None, []
+
+    def close(self):
+        with self._lock:
+            self._close()
+            self._loaded = False
+
+
+oui_index = OuiIndex()
@@ -0,0 +1,203 @@
+"""
+Asyncio TCP connect scanner for client devices.
+
+Every (host, port) probe is a coroutine, so a sweep of a few hundred
+clients runs as one batch bounded by a global semaphore (open sockets)
+rather than host after host. Each host additionally has its own rate
+limit, so no client sees more than `host_rate` connection attempts per
+second however many probes are queued for it. Ports that neither accept
+nor refuse within `timeout` count as closed.
+
+With banners enabled, an open port is given a moment to announce itself
+(SSH, FTP, SMTP, telnet); HTTP ports are sent a HEAD request and report
+their Server header. Results are stored per device as a sorted list of
+open ports, the ports probed and a {port: banner} map on DeviceFingerprint.
+"""
+import asyncio
+import logging
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+from django.db import close_old_connections
+from django.utils import timezone
+from util.osfingerprint import FINGERPRINT_PORTS
+
+logger = logging.getLogger(__name__)
+
+COMMON_PORTS = (21, 22, 23, 25, 53, 80, 110, 443, 993, 995, 3389, 8080)
+# What a sweep probes by default: the common services plus the ports OS guesses rely on
+SWEEP_PORTS = tuple(sorted(set(COMMON_PORTS).union(FINGERPRINT_PORTS)))
+HTTP_PORTS = frozenset({80, 8000, 8008, 8080, 8291})
+# Simultaneous probes across all hosts (each holds one socket)
+CONCURRENCY = 256
+# Connection attempts per second against any one host
+HOST_RATE = 50.0
+CONNECT_TIMEOUT = 0.5
+BANNER_TIMEOUT = 0.5
+BANNER_BYTES = 256
+MAX_BANNER = 80
+
+
+@dataclass
+class HostScan:
+    ip: str
+    probed_ports: List[int] = field(default_factory=list)
+    open_ports: List[int] = field(default_factory=list)
+    services: Dict[str, str] = field(default_factory=dict)
+    seconds: float = 0.0
+
+
+class _HostLimiter:
+    """Spaces connection attempts to one host at least `interval` apart"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def service_name(port: int) -> str:
+    try:
+        return socket.getservbyport(port, 'tcp')
+    except OSError:
+        return 'unknown'
+
+
+def summarize_banner(port: int, data: bytes) -> Optional[str]:
+    """First meaningful line of a banner (the Server header for HTTP)"""
+    text = data.decode('latin-1', 'replace')
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return None
+    if port in HTTP_PORTS or lines[0].startswith('HTTP/'):
+        for line in lines[1:]:
+            if line.lower().startswith('server:'):
+                return line.split(':', 1)[1].strip()[:MAX_BANNER] or None
+        return None
+    # Telnet negotiation and other binary preambles are not worth keeping
+    printable = ''.join(ch for ch in lines[0] if ch.isprintable())
+    return printable[:MAX_BANNER] or None
+
+
+class PortScanner:
+    """Concurrent connect scan of many hosts with global and per-host limits"""
+
+    def __init__(self, ports: Sequence[int] = SWEEP_PORTS, concurrency: int = CONCURRENCY,
+                 host_rate: float = HOST_RATE, timeout: float = CONNECT_TIMEOUT, banners: bool = False,
+                 banner_timeout: float = BANNER_TIMEOUT):
+        self.ports = sorted(set(ports))
+        self.concurrency = concurrency
+        self.host_rate = host_rate
+        self.timeout = timeout
+        self.banners = banners
+        self.banner_timeout = banner_timeout
+
+    async def _banner(self, port: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[str]:
+        try:
+            if port in HTTP_PORTS:
+                writer.write(b"HEAD / HTTP/1.0\r\n\r\n")
+                await writer.drain()
+            data = await asyncio.wait_for(reader.read(BANNER_BYTES), self.banner_timeout)
+        except (asyncio.TimeoutError, OSError):
+            return None
+        return summarize_banner(port, data)
+
+    async def probe(self, ip: str, port: int, limiter: _HostLimiter, slots: asyncio.Semaphore):
+        """(open, banner or None) for one port"""
+        async with slots:
+            await limiter.wait()
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), self.timeout)
+            except (asyncio.TimeoutError, OSError):
+                return False, None
+            try:
+                banner = await self._banner(port, reader, writer) if self.banners else None
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+            return True, banner
+
+    async def scan_host(self, ip: str, slots: asyncio.Semaphore) -> HostScan:
+        started = time.perf_counter()
+        limiter = _HostLimiter(self.host_rate)
+        outcomes = await asyncio.gather(*(self.probe(ip, port, limiter, slots) for port in self.ports))
+        result = HostScan(ip, probed_ports=list(self.ports))
+        for port, (is_open, banner) in zip(self.ports, outcomes):
+            if is_open:
+                result.open_ports.append(port)
+                result.services[str(port)] = banner or service_name(port)
+        result.seconds = time.perf_counter() - started
+        return result
+
+    async def scan(self, ips: Iterable[str]) -> Dict[str, HostScan]:
+        """{ip: HostScan} for every address, all scanned concurrently"""
+        slots = asyncio.Semaphore(self.concurrency)
+        hosts = list(dict.fromkeys(ips))
+        results = await asyncio.gather(*(self.scan_host(ip, slots) for ip in hosts))
+        return {result.ip: result for result in results}
+
+    def sweep(self, targets: Optional[Dict[str, object]] = None) -> Dict[str, HostScan]:
+        """Scan {ip: Device} (default: the clients present now) and store the results"""
+        if targets is None:
+            targets = present_targets()
+        if not targets:
+            return {}
+        started = time.perf_counter()
+        results = asyncio.run(self.scan(targets))
+        save_results(results, targets)
+        logger.info(f"Port sweep of {len(results)} host(s) took {time.perf_counter() - started:.1f}s")
+        return results
+
+
+def snapshot_targets(snapshot: Dict[str, str]) -> Dict[str, object]:
+    """{ip: Device} for the clients in a scanner snapshot (mac -> ip)"""
+    from devices.models import Device
+
+    devices = Device.objects.in_bulk(list(snapshot))
+    return {ip: devices[mac] for mac, ip in snapshot.items() if mac in devices}
+
+
+def present_targets() -> Dict[str, object]:
+    """{ip: Device} for the clients discovery sees right now; offline devices would only time out"""
+    from util.netscanner import NetScanner
+
+    devices = NetScanner().get_connected_devices()
+    return snapshot_targets({device['mac']: device['ip'] for device in devices})
+
+
+def device_targets(devices) -> Dict[str, object]:
+    """{ip: Device} for explicit devices; a stale row may still hold a reassigned address, the latest seen wins"""
+    by_ip = {}
+    for device in sorted(devices, key=lambda device: device.last_seen):
+        by_ip[device.ip_address] = device
+    return by_ip
+
+
+def save_results(results: Dict[str, HostScan], by_ip: Dict[str, object]):
+    """Upsert one DeviceFingerprint per scanned device"""
+    from devices.models import DeviceFingerprint
+
+    close_old_connections()
+    now = timezone.now()
+    rows = [
+        DeviceFingerprint(device=by_ip[ip], open_ports=result.open_ports, probed_ports=result.probed_ports,
+                          services=result.services, scanned_at=now)
+        for ip, result in results.items() if ip in by_ip
+    ]
+    DeviceFingerprint.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['device'],
+        update_fields=['open_ports', 'probed_ports', 'services', 'scanned_at'],
+    )
@@ -0,0 +1,217 @@
+"""
+Asyncio scanner daemon.
+
+Runs full discovery cycles with every source collected concurrently and
+an adaptive cadence: the interval drops to `min_interval` whenever a
+cycle (or a kernel neighbor event) shows clients joining or leaving, and
+backs off geometrically towards `max_interval` while the network is idle.
+Each sleep is jittered so several gateways do not scan in lockstep.
+
+All database work runs on one dedicated thread, so the ORM never touches
+the event loop and deltas are applied in order. Per-cycle latency, device
+counts and error counters are published through util.metrics.
+
+Every `port_interval` seconds the present devices also get a TCP port sweep
+(util.portscan) and one ICMP echo each, run on the same loop as the
+discovery cycles; devices whose evidence changed get a new OS guess
+(util.osfingerprint).
+"""
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from util.accounting import TrafficAccounting
+from util.metrics import MetricsRegistry, registry, serve_metrics
+from util.neighbors import NeighborWatcher
+from util.osfingerprint import observe_ttls, update_fingerprints
+from util.portscan import PortScanner, save_results, snapshot_targets
+from util.station_stats import STATS_INTERVAL, StationStatsCollector
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 2.0
+MAX_INTERVAL = 60.0
+BACKOFF = 1.5
+JITTER = 0.1
+RETRY_DELAY = 5
+# Full neighbor dump diffed against the watcher's state, as NeighborWatcher.batches() does
+RECONCILE_INTERVAL = 300
+
+
+class ScannerDaemon:
+    """Drive a NetScanner from an event loop"""
+
+    def __init__(self, scanner, min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL,
+                 backoff: float = BACKOFF, jitter: float = JITTER, stats_interval: float = STATS_INTERVAL,
+                 port_interval: float = 0, port_scanner: Optional[PortScanner] = None,
+                 metrics: MetricsRegistry = registry):
+        self.scanner = scanner
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.jitter = jitter
+        self.stats_interval = stats_interval
+        self.interval = min_interval
+        self.stats = StationStatsCollector(scanner.interface) if stats_interval else None
+        self.traffic = TrafficAccounting(scanner.subnet) if stats_interval else None
+        self.port_interval = port_interval
+        self.port_scanner = port_scanner or PortScanner()
+        self._wake = asyncio.Event()
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scanner-db')
+
+        self.cycle_seconds = metrics.histogram('nethub_scan_cycle_seconds', 'Duration of a full scan cycle')
+        self.source_seconds = metrics.gauge('nethub_scan_source_seconds', 'Last collection time per source', ['source'])
+        self.source_errors = metrics.counter('nethub_scan_source_errors_total', 'Failed collections per source', ['source'])
+        self.cycle_errors = metrics.counter('nethub_scan_errors_total', 'Scan cycles that raised')
+        self.cycles = metrics.counter('nethub_scan_cycles_total', 'Completed scan cycles')
+        self.devices = metrics.gauge('nethub_devices_present', 'Devices seen in the last cycle')
+        self.changes = metrics.counter('nethub_device_changes_total', 'Device presence changes', ['kind'])
+        self.interval_gauge = metrics.gauge('nethub_scan_interval_seconds', 'Current scan interval before jitter')
+        self.events = metrics.counter('nethub_neighbor_events_total', 'Kernel neighbor events handled', ['kind'])
+        self.traffic_bytes = metrics.counter('nethub_client_bytes_total', 'Client traffic accounted', ['direction'])
+        self.port_seconds = metrics.histogram('nethub_port_sweep_seconds', 'Duration of a port sweep of all devices')
+        self.open_ports = metrics.gauge('nethub_open_ports', 'Open ports found in the last sweep')
+
+    async def _db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, func, *args)
+
+    def next_interval(self, churn: int) -> float:
+        """Adapt the base interval to recent churn and return a jittered sleep"""
+        if churn:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        self.interval_gauge.set(self.interval)
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+    async def scan_once(self) -> int:
+        """One discovery cycle; returns the number of presence changes"""
+        engine = self.scanner.engine
+        errors_before = dict(engine.errors)
+        started = time.perf_counter()
+
+        discovered = await engine.discover_async()
+        devices = self.scanner.to_devices(discovered)
+        joined, left, moved = await self._db(self.scanner.reconcile, devices)
+
+        self.cycle_seconds.observe(time.perf_counter() - started)
+        self.cycles.inc()
+        self.devices.set(len(devices))
+        for name, seconds in engine.timings.items():
+            self.source_seconds.set(seconds, source=name)
+        for name, count in engine.errors.items():
+            if count > errors_before.get(name, 0):
+                self.source_errors.inc(count - errors_before.get(name, 0), source=name)
+        self.changes.inc(len(joined), kind='joined')
+        self.changes.inc(len(left), kind='left')
+        self.changes.inc(len(moved), kind='moved')
+        return len(joined) + len(left) + len(moved)
+
+    async def scan_loop(self):
+        while True:
+            try:
+                churn = await self.scan_once()
+                delay = self.next_interval(churn)
+            except Exception as e:
+                self.cycle_errors.inc()
+                logger.error(f"Scan cycle failed: {e}")
+                delay = RETRY_DELAY
+            self._wake.clear()
+            try:
+                # A neighbor event cuts the sleep short
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _apply_events(self, events):
+        for event in events:
+            self.events.inc(kind=event.kind)
+        await self._db(self.scanner.handle_events, events)
+        self.interval = self.min_interval
+        self._wake.set()
+
+    async def watch_loop(self):
+        """Apply kernel neighbor events as they arrive and wake the scanner"""
+        loop = asyncio.get_running_loop()
+        while True:
+            watcher = NeighborWatcher(interface=self.scanner.interface, subnet=self.scanner.subnet)
+            ready = asyncio.Event()
+            try:
+                loop.add_reader(watcher.fileno(), ready.set)
+                # Subscribed first, then seeded from a full dump, so clients already
+                # connected are tracked and their disconnects are seen
+                events = watcher.reconcile()
+                next_reconcile = time.monotonic() + RECONCILE_INTERVAL
+                while True:
+                    if events:
+                        await self._apply_events(events)
+                    try:
+                        await asyncio.wait_for(ready.wait(), max(0.0, next_reconcile - time.monotonic()))
+                        ready.clear()
+                        events = watcher.read()
+                    except asyncio.TimeoutError:
+                        events = []
+                    if time.monotonic() >= next_reconcile:
+                        events += watcher.reconcile()
+                        next_reconcile = time.monotonic() + RECONCILE_INTERVAL
+            except OSError as e:
+                logger.error(f"Neighbor watcher failed: {e}")
+                await asyncio.sleep(RETRY_DELAY)
+            finally:
+                if watcher.sock is not None:
+                    loop.remove_reader(watcher.sock.fileno())
+                watcher.close()
+
+    async def stats_loop(self):
+        while True:
+            try:
+                await self._db(self.stats.collect)
+            except Exception as e:
+                logger.error(f"Station stats collection failed: {e}")
+            try:
+                deltas = await self._db(self.traffic.collect)
+                for upload, download in deltas.values():
+                    self.traffic_bytes.inc(upload, direction='upload')
+                    self.traffic_bytes.inc(download, direction='download')
+            except Exception as e:
+                logger.error(f"Traffic accounting failed: {e}")
+            await asyncio.sleep(self.stats_interval)
+
+    def _port_targets(self):
+        # Only clients present in the last cycle; offline ones would just time out
+        return snapshot_targets(dict(self.scanner.snapshot))
+
+    async def port_loop(self):
+        while True:
+            await asyncio.sleep(self.port_interval)
+            try:
+                started = time.perf_counter()
+                by_ip = await self._db(self._port_targets)
+                results, ttls = await asyncio.gather(self.port_scanner.scan(by_ip), observe_ttls(by_ip))
+                await self._db(save_results, results, by_ip)
+                await self._db(update_fingerprints, by_ip, ttls)
+                self.port_seconds.observe(time.perf_counter() - started)
+                self.open_ports.set(sum(len(result.open_ports) for result in results.values()))
+            except Exception as e:
+                logger.error(f"Port sweep failed: {e}")
+
+    async def run(self, metrics_host: Optional[str] = None, metrics_port: Optional[int] = None):
+        server = None
+        if metrics_port:
+            server = await serve_metrics(metrics_host or '127.0.0.1', metrics_port)
+
+        tasks = [self.scan_loop(), self.watch_loop()]
+        if self.stats:
+            tasks.append(self.stats_loop())
+        if self.port_interval:
+            tasks.append(self.port_loop())
+        logger.info(f"Scanner started on {self.scanner.interface} ({self.scanner.subnet})")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if server:
+                server.close()
+            self._db_executor.shutdown(wait=False)
@@ -0,0 +1,215 @@
+"""
+Per-access download shaping on the AP interface with tc.
+
+Every client with active paid access gets an HTB class capped at its
+plan's bandwidth (with fq_codel as the leaf qdisc). Packets reach the
+class through u32 hash tables keyed by destination address: the root
+table hashes on the third octet into one table per /24, which hashes on
+the fourth octet to the client's filter. Classification is two hash
+lookups per packet however many clients are shaped.
+
+Class and filter handles are derived from the client's offset in the
+subnet, so a client's entries can be replaced or deleted without listing
+anything. Changes are applied with one `tc -batch` call. Traffic that
+matches no client is left unshaped.
+"""
+import ipaddress
+import logging
+import os
+import re
+import subprocess
+import time
+from typing import Dict, Iterable, List, Optional
+from django.db import close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+from util.metrics import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+ROOT_HANDLE = 1
+FILTER_PRIO = 5
+# u32 hash table ids: the root table links to HT_OCTET3, which links to one
+# table per /24 at HT_OCTET4 + third octet
+HT_OCTET3 = 0x100
+HT_OCTET4 = 0x200
+NODE = 1
+
+RATE_UNITS = {'bit': 1e-3, 'kbit': 1, 'mbit': 1e3, 'gbit': 1e6}
+
+
+class ShapingError(Exception):
+    pass
+
+
+def parse_rate(text: str) -> Optional[int]:
+    """tc rate ('10Mbit', '512Kbit', '1Gbit') in kbit/s"""
+    match = re.fullmatch(r'([\d.]+)([KMG]?bit)', text.strip(), re.IGNORECASE)
+    if not match:
+        return None
+    return int(round(float(match.group(1)) * RATE_UNITS[match.group(2).lower()]))
+
+
+class Shaper:
+    """HTB classes and hashed u32 filters for one interface and subnet"""
+
+    def __init__(self, interface: str, subnet: str):
+        self.interface = interface
+        self.network = ipaddress.ip_network(subnet, strict=False)
+        if self.network.version != 4 or self.network.prefixlen < 16:
+            raise ShapingError(f"Shaping needs an IPv4 subnet of /16 or smaller, not {subnet}")
+        self._ready = False
+
+    def tc(self, lines: List[str], check: bool = True) -> subprocess.CompletedProcess:
+        """Run tc commands as one batch (-force keeps going past errors)"""
+        cmd = ['tc', '-force', '-batch', '-']
+        if os.geteuid() != 0:
+            cmd = ['sudo', '-n'] + cmd
+        try:
+            result = subprocess.run(cmd, input='\n'.join(lines) + '\n', capture_output=True, text=True)
+        except FileNotFoundError as e:
+            raise ShapingError("tc not found") from e
+        if check and result.returncode != 0:
+            raise ShapingError(f"tc batch failed: {result.stderr.strip()}")
+        return result
+
+    def show(self, *args: str) -> str:
+        return subprocess.run(['tc'] + list(args) + ['dev', self.interface],
+                              capture_output=True, text=True).stdout
+
+    def minor(self, ip: str) -> int:
+        """Class minor id: the address's offset in the subnet"""
+        address = ipaddress.ip_address(ip)
+        if address not in self.network:
+            raise ShapingError(f"{ip} is outside {self.network}")
+        offset = int(address) - int(self.network.network_address)
+        if not 0 < offset < 0xffff:
+            raise ShapingError(f"{ip} has no class id in {self.network}")
+        return offset
+
+    def ip_for_minor(self, minor: int) -> str:
+        return str(self.network.network_address + minor)
+
+    def _octet3_tables(self) -> List[int]:
+        first = int(self.network.network_address) >> 8 & 0xff
+        return list(range(first, first + max(1, self.network.num_addresses // 256)))
+
+    def setup(self):
+        """Root qdisc and hash tables, created once and kept across restarts"""
+        if f"htb {ROOT_HANDLE}:" in self.show('qdisc', 'show'):
+            self._ready = True
+            return
+        dev = f"dev {self.interface}"
+        u32 = f"parent {ROOT_HANDLE}: prio {FILTER_PRIO} protocol ip"
+        lines = [
+            f"qdisc replace {dev} root handle {ROOT_HANDLE}: htb default 0",
+            f"filter add {dev} {u32} u32",
+            f"filter add {dev} {u32} handle {HT_OCTET3:x}: u32 divisor 256",
+        ]
+        for octet in self._octet3_tables():
+            lines.append(f"filter add {dev} {u32} handle {HT_OCTET4 + octet:x}: u32 divisor 256")
+            lines.append(f"filter add {dev} {u32} u32 ht {HT_OCTET3:x}:{octet:x}: "
+                         f"match ip dst {self.network} hashkey mask 0x000000ff at 16 link {HT_OCTET4 + octet:x}:")
+        lines.append(f"filter add {dev} {u32} u32 ht 800:: "
+                     f"match ip dst {self.network} hashkey mask 0x0000ff00 at 16 link {HT_OCTET3:x}:")
+        self.tc(lines)
+        self._ready = True
+        logger.info(f"Shaping set up on {self.interface} for {self.network}")
+
+    def ensure(self):
+        if not self._ready:
+            self.setup()
+
+    def _filter_handle(self, ip: str) -> str:
+        octets = ipaddress.ip_address(ip).packed
+        return f"{HT_OCTET4 + octets[2]:x}:{octets[3]:x}:{NODE:x}"
+
+    def shape_lines(self, ip: str, rate_kbit: int) -> List[str]:
+        dev = f"dev {self.interface}"
+        classid = f"{ROOT_HANDLE}:{self.minor(ip):x}"
+        handle = self._filter_handle(ip)
+        return [
+            f"class replace {dev} parent {ROOT_HANDLE}: classid {classid} htb rate {rate_kbit}kbit ceil {rate_kbit}kbit",
+            f"qdisc replace {dev} parent {classid} fq_codel",
+            f"filter replace {dev} parent {ROOT_HANDLE}: prio {FILTER_PRIO} protocol ip handle {handle} "
+            f"u32 ht {handle.rsplit(':', 1)[0]}: match ip dst {ip}/32 flowid {classid}",
+        ]
+
+    def unshape_lines(self, ip: str) -> List[str]:
+        dev = f"dev {self.interface}"
+        return [
+            f"filter del {dev} parent {ROOT_HANDLE}: prio {FILTER_PRIO} protocol ip handle {self._filter_handle(ip)} u32",
+            f"class del {dev} classid {ROOT_HANDLE}:{self.minor(ip):x}",
+        ]
+
+    def update(self, shape: Dict[str, int], unshape: Iterable[str] = ()):
+        """Shape {ip: kbit/s} and drop the classes of `unshape` in one batch"""
+        self.ensure()
+        lines = []
+        for ip in unshape:
+            lines += self.unshape_lines(ip)
+        for ip, rate in shape.items():
+            lines += self.shape_lines(ip, rate)
+        if lines:
+            self.tc(lines)
+
+    def installed(self) -> Dict[str, int]:
+        """{ip: kbit/s} for the client classes present on the interface"""
+        classes = {}
+        for line in self.show('class', 'show').splitlines():
+            match = re.match(rf'class htb {ROOT_HANDLE}:([0-9a-f]+) .*?\brate (\S+)', line)
+            if match:
+                rate = parse_rate(match.group(2))
+                if rate is not None:
+                    classes[self.ip_for_minor(int(match.group(1), 16))] = rate
+        return classes
+
+    def teardown(self):
+        self.tc([f"qdisc del dev {self.interface} root"], check=False)
+        self._ready = False
+
+
+class ShapingReconciler:
+    """Keep one class per active access, changing only what differs"""
+
+    def __init__(self, shaper: Shaper, metrics: MetricsRegistry = registry):
+        self.shaper = shaper
+        self.changes = metrics.counter('nethub_shaping_changes_total', 'Shaping classes changed', ['kind'])
+        self.classes = metrics.gauge('nethub_shaping_classes', 'Shaped clients on the AP interface')
+        self.seconds = metrics.histogram('nethub_shaping_apply_seconds', 'Time to apply a shaping diff')
+
+    def desired(self) -> Dict[str, int]:
+        """{ip: kbit/s} from active access and the devices' current addresses"""
+        from devices.models import Device
+        from payments.models import InternetAccess
+
+        limits = {
+            row['mac_address'].lower(): row['rate']
+            for row in InternetAccess.objects.filter(status='active', end_time__gt=timezone.now())
+            .exclude(mac_address=None).values('mac_address').annotate(rate=Max('bandwidth_limit'))
+        }
+        wanted = {}
+        for mac, ip in Device.objects.filter(is_authenticated=True).values_list('mac_address', 'ip_address'):
+            rate = limits.get(mac.lower())
+            if rate and ipaddress.ip_address(ip) in self.shaper.network:
+                wanted[ip] = rate * 1000
+        return wanted
+
+    def run_once(self):
+        close_old_connections()
+        self.shaper.ensure()
+        installed = self.shaper.installed()
+        wanted = self.desired()
+        shape = {ip: rate for ip, rate in wanted.items() if installed.get(ip) != rate}
+        unshape = [ip for ip in installed if ip not in wanted]
+        if shape or unshape:
+            started = time.perf_counter()
+            self.shaper.update(shape, unshape)
+            self.seconds.observe(time.perf_counter() - started)
+            added = sum(1 for ip in shape if ip not in installed)
+            self.changes.inc(added, kind='added')
+            self.changes.inc(len(shape) - added, kind='changed')
+            self.changes.inc(len(unshape), kind='removed')
+            logger.info(f"Shaping: {added} added, {len(shape) - added} changed, {len(unshape)} removed")
+        self.classes.set(len(wanted))
+        return shape, unshape
@@ -0,0 +1,83 @@
+"""
+Per-station wireless statistics.
+
+One station dump per interval gives rx/tx bytes, packets, signal, bitrate
+and inactive time for every associated client. Counters are cumulative
+per association, so each collection stores the delta against the previous
+reading as a DeviceSample; the first reading of a station in this process
+only sets the baseline, so a restart never stores a whole association's
+counters as one interval. Device byte totals come from the kernel
+counters in util.accounting, which also see wired and non-station traffic.
+"""
+import logging
+import subprocess
+from typing import Dict, List, Optional
+from devices.models import Device, DeviceSample
+from hotspotmanager.ap_utils.stations import StationStats, station_dump
+
+logger = logging.getLogger(__name__)
+
+# Seconds between collections in the scanner loop
+STATS_INTERVAL = 30
+
+COUNTERS = ('rx_bytes', 'tx_bytes', 'rx_packets', 'tx_packets')
+
+
+class StationStatsCollector:
+    """Turn successive station dumps into compact per-device samples"""
+
+    def __init__(self, interface: str):
+        self.interface = interface
+        self._previous: Dict[str, StationStats] = {}
+
+    def read(self) -> List[StationStats]:
+        try:
+            return station_dump(self.interface)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            logger.debug(f"Station dump on {self.interface} failed: {e}")
+            return []
+
+    def delta(self, station: StationStats) -> Optional[Dict[str, int]]:
+        """Counter increase since the last reading of this station, None without one"""
+        previous = self._previous.get(station.mac)
+        if previous is None:
+            return None
+        deltas = {}
+        for counter in COUNTERS:
+            current = getattr(station, counter)
+            before = getattr(previous, counter)
+            # A lower value means the station re-associated and counters restarted
+            deltas[counter] = current - before if current >= before else current
+        return deltas
+
+    def collect(self, stations: Optional[List[StationStats]] = None) -> List[DeviceSample]:
+        """Sample every station and store the deltas"""
+        if stations is None:
+            stations = self.read()
+        current = {station.mac: station for station in stations}
+        devices = Device.objects.in_bulk(list(current))
+
+        samples = []
+        for mac, station in current.items():
+            device = devices.get(mac)
+            if device is None:
+                # Not known to the scanner yet; picked up on the next round
+                continue
+            deltas = self.delta(station)
+            if deltas is None:
+                continue
+            samples.append(DeviceSample(
+                device=device,
+                signal=station.signal,
+                tx_bitrate=station.tx_bitrate,
+                rx_bitrate=station.rx_bitrate,
+                inactive_ms=station.inactive_ms,
+                **deltas,
+            ))
+
+        if samples:
+            DeviceSample.objects.bulk_create(samples)
+
+        self._previous = current
+        logger.debug(f"Stored {len(samples)} station samples from {self.interface}")
+        return samples
@@ -1,3 +1,79 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
+from django.test import SimpleTestCase
+from util.oui import (INDEX_FILE, OuiIndex, UNKNOWN, parse_manuf, parse_registry, parse_registry_csv,
+                      parse_registry_text, write_index)
 
-# Create your tests here.
+REGISTRY_CSV = """Registry,Assignment,Organization Name,Organization Address
+MA-L,B827EB,Raspberry Pi Foundation,Mitchell Wood House Caldecote GB
+MA-M,70B3D5F,Example Large Block Ltd,Somewhere
+MA-S,70B3D5F2A,Example Small Block Ltd,Somewhere
+IAB,0050C2D70,Example IAB GmbH,Somewhere
+"""
+
+REGISTRY_TEXT = """OUI/MA-L                                                    Organization
+company_id                                                  Organization
+
+F4-0F-24   (hex)\t\tApple, Inc.
+F40F24     (base 16)\t\tApple, Inc.
+\t\t\t\t1 Infinite Loop
+
+8C-1F-64                      (hex)                         Example MA-S Co.
+ABC000-ABCFFF                 (base 16)                     Example MA-S Co.
+
+8C-1F-65                      (hex)                         Example MA-M Co.
+100000-1FFFFF                 (base 16)                     Example MA-M Co.
+"""
+
+MANUF = """# Wireshark manuf
+DC:A6:32\tRaspberr\tRaspberry Pi Trading Ltd
+00:1B:C5:00:10:00/36\tOpenRBco\tOpenRB.com, Direct SIA
+00:55:DA:50:00:00/28\tNanjingS\tNanjing Simon Info Tech Co., Ltd.
+01:00:5E:00:00:00/25\tIPv4mcast
+"""
+
+
+class OuiIndexTests(SimpleTestCase):
+    def build(self, entries) -> OuiIndex:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "oui.idx"
+        write_index(path, entries)
+        index = OuiIndex(path)
+        self.addCleanup(index.close)
+        return index
+
+    def test_csv_covers_all_block_sizes(self):
+        index = self.build(parse_registry_csv(REGISTRY_CSV))
+        self.assertEqual(index.lookup('B8:27:EB:12:34:56'), 'Raspberry Pi Foundation')
+        self.assertEqual(index.lookup('70:B3:D5:F1:00:00'), 'Example Large Block Ltd')
+        # The MA-S block inside the MA-M block wins: longest prefix first
+        self.assertEqual(index.lookup('70:B3:D5:F2:A0:01'), 'Example Small Block Ltd')
+        self.assertEqual(index.lookup('00:50:C2:D7:00:01'), 'Example IAB GmbH')
+        self.assertEqual(index.lookup('00:00:00:00:00:01'), UNKNOWN)
+
+    def test_ieee_text_dump(self):
+        rows = parse_registry_text(REGISTRY_TEXT)
+        self.assertEqual(sorted(bits for bits, _, _ in rows), [24, 28, 36])
+        index = self.build(rows)
+        self.assertEqual(index.lookup('F4:0F:24:00:00:01'), 'Apple, Inc.')
+        self.assertEqual(index.lookup('8C:1F:64:AB:C1:23'), 'Example MA-S Co.')
+        self.assertEqual(index.lookup('8C:1F:65:1A:BC:DE'), 'Example MA-M Co.')
+
+    def test_manuf_file(self):
+        rows = parse_manuf(MANUF)
+        self.assertEqual(len(rows), 3)
+        index = self.build(parse_registry(MANUF))
+        self.assertEqual(index.lookup('DC:A6:32:00:00:01'), 'Raspberry Pi Trading Ltd')
+        self.assertEqual(index.lookup('00:1B:C5:00:10:FF'), 'OpenRB.com, Direct SIA')
+        self.assertEqual(index.lookup('00:55:DA:5A:BC:DE'), 'Nanjing Simon Info Tech Co., Ltd.')
+
+    def test_packaged_index_has_every_block_size(self):
+        index = OuiIndex(INDEX_FILE)
+        self.addCleanup(index.close)
+        self.assertGreater(len(index), 40000)
+        self.assertEqual(index.lookup('B8:27:EB:00:00:01'), 'Raspberry Pi Foundation')
+        self.assertEqual(index.lookup('F4:0F:24:00:00:01'), 'Apple, Inc.')
+        self.assertNotEqual(index.lookup('8C:F5:A3:00:00:01'), UNKNOWN)  # Samsung
+        self.assertNotEqual(index.lookup('00:55:DA:50:00:01'), UNKNOWN)  # MA-M
+        self.assertEqual(index.lookup('00:1B:C5:00:10:05'), 'OpenRB.com, Direct SIA')  # MA-S
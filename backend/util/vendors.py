@@ -0,0 +1,193 @@
+"""
+Local-first MAC vendor resolution.
+
+A lookup never waits on the network: it answers from the packaged OUI
+index or from the persistent cache of earlier online lookups, and
+otherwise returns UNKNOWN and queues the prefix for enrichment. One
+background thread per process works through the queue at a bounded rate
+and records every answer, including "not found", in the cache file, so
+each prefix is fetched at most once across restarts and processes.
+
+Locally administered (randomized) and multicast addresses have no vendor
+and are never queued.
+"""
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from django.conf import settings
+from util.oui import UNKNOWN, mac_to_int, oui_index
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = settings.BASE_DIR / "run/vendor_cache.json"
+LOOKUP_URL = "https://api.macvendors.com/{prefix}"
+# Seconds between online lookups (the free API allows about one per second)
+MIN_INTERVAL = 1.5
+REQUEST_TIMEOUT = 5
+# Pause after a failed or rate-limited request before the prefix is retried
+RETRY_DELAY = 60
+MAX_PENDING = 1024
+
+
+class VendorCache:
+    """Prefix -> vendor map persisted as JSON; '' records a prefix the API does not know"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self._entries: Dict[str, str] = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self) -> Dict[str, str]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return {str(k): str(v) for k, v in data.items()} if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def refresh(self):
+        """Pick up entries another process wrote since the last read"""
+        stamp = self._stat()
+        if stamp != self._stamp:
+            entries = self._read()
+            with self._lock:
+                self._entries, self._stamp = entries, stamp
+
+    def get(self, prefix: str) -> Optional[str]:
+        self.refresh()
+        return self._entries.get(prefix)
+
+    def __contains__(self, prefix: str) -> bool:
+        return self.get(prefix) is not None
+
+    def put(self, prefix: str, vendor: str):
+        """Merge one entry into the file under an exclusive lock"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self._read()
+            entries[prefix] = vendor
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(entries, f, sort_keys=True)
+            os.replace(tmp, self.path)
+        with self._lock:
+            self._entries, self._stamp = entries, self._stat()
+
+
+class VendorResolver:
+    """Answer from local data now, enrich unknown prefixes in the background"""
+
+    def __init__(self, cache: VendorCache = None, url: str = LOOKUP_URL, min_interval: float = MIN_INTERVAL,
+                 enrich: bool = True):
+        self.cache = cache or VendorCache()
+        self.url = url
+        self.min_interval = min_interval
+        self.enrich = enrich
+        self._queue: "queue.Queue[str]" = queue.Queue(MAX_PENDING)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._session = requests.Session()
+
+    @staticmethod
+    def prefix(mac: str) -> Optional[str]:
+        """Upper-case OUI of a globally administered unicast MAC, else None"""
+        try:
+            value = mac_to_int(mac)
+        except ValueError:
+            return None
+        first_octet = value >> 40
+        if first_octet & 0x03:
+            # Multicast or locally administered: no registered vendor
+            return None
+        return f"{value >> 24:06X}"
+
+    def lookup(self, mac: str) -> str:
+        if not mac:
+            return UNKNOWN
+        vendor = oui_index.lookup(mac, default=None)
+        if vendor:
+            return vendor
+        prefix = self.prefix(mac)
+        if prefix is None:
+            return UNKNOWN
+        cached = self.cache.get(prefix)
+        if cached is not None:
+            return cached or UNKNOWN
+        self.submit(prefix)
+        return UNKNOWN
+
+    def submit(self, prefix: str):
+        if not self.enrich:
+            return
+        with self._lock:
+            if prefix in self._pending:
+                return
+            try:
+                self._queue.put_nowait(prefix)
+            except queue.Full:
+                return
+            self._pending.add(prefix)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='vendor-enrichment', daemon=True)
+                self._thread.start()
+
+    def fetch(self, prefix: str) -> Optional[str]:
+        """Vendor from the online API; '' when unknown there, None to retry later"""
+        try:
+            response = self._session.get(self.url.format(prefix=prefix), timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            logger.debug(f"Vendor lookup for {prefix} failed: {e}")
+            return None
+        if response.status_code == 200:
+            return response.text.strip()
+        if response.status_code == 404:
+            return ''
+        logger.debug(f"Vendor lookup for {prefix} returned HTTP {response.status_code}")
+        return None
+
+    def _run(self):
+        while True:
+            prefix = self._queue.get()
+            retry = False
+            try:
+                if prefix in self.cache:
+                    continue
+                vendor = self.fetch(prefix)
+                if vendor is None:
+                    time.sleep(RETRY_DELAY)
+                    retry = True
+                    continue
+                self.cache.put(prefix, vendor)
+                logger.info(f"Vendor for {prefix}: {vendor or 'not registered'}")
+                time.sleep(self.min_interval)
+            except Exception as e:
+                logger.error(f"Vendor enrichment of {prefix} failed: {e}")
+            finally:
+                self._queue.task_done()
+                with self._lock:
+                    if retry:
+                        try:
+                            self._queue.put_nowait(prefix)
+                        except queue.Full:
+                            retry = False
+                    if not retry:
+                        self._pending.discard(prefix)
+
+
+vendors = VendorResolver(enrich=settings.VENDOR_ENRICHMENT)